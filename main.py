@@ -150,13 +150,9 @@ class AndroidMainApp(App):
                 pass
 
 if __name__ == '__main__':
-    # 确保中文显示正常
-    try:
-        import matplotlib.pyplot as plt
-        plt.rcParams["font.family"] = ["SimHei", "WenQuanYi Micro Hei", "Heiti TC", "Arial"]
-        plt.rcParams['axes.unicode_minus'] = False
-    except ImportError:
-        print("警告: matplotlib模块未找到，图表显示可能会有问题")
-    
+    # 打包后的程序中，批量生成工资条的子进程从这里进入
+    import multiprocessing
+    multiprocessing.freeze_support()
+    # matplotlib的中文字体在第一次打开图表时由salary_calculator.load_pyplot设置
     # 运行应用
     AndroidMainApp().run()
\ No newline at end of file
@@ -27,6 +27,16 @@ warnings.filterwarnings("ignore", category=Warning, message="iCCP: known incorre
 # 导入公共工具模块
 try:
     from utils.common_utils import DatabaseManager, Validator, generate_emp_id, get_network_time, logger
+    from utils.log_config import setup_logging
+    from utils.db_migrations import run_migrations, SALARY_MIGRATIONS
+    from utils.report_engine import ReportEngine
+    from utils.background_worker import BackgroundWorker
+    from utils.paged_tree import PagedTreeModel, like_pattern
+    from utils.lazy_tabs import LazyTabs
+    from utils.db_backup import ChunkStore, RetentionPolicy, create_backup, restore_snapshot, restore_backup
+    from utils.excel_export import (export_workbook, payroll_sheet, attendance_sheet, revenue_sheets,
+                                    yearly_report_sheet)
+    from utils.payslip import generate_payslips, PAYSLIP_DIR
 except ImportError:
     # 降级处理，使用基本功能
     print("警告: 无法导入common_utils模块")
@@ -35,6 +45,8 @@ except ImportError:
     import logging
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
+    def setup_logging():
+        pass
     
     # 创建基本的类和函数作为备用
     class DatabaseManager:
@@ -46,6 +58,9 @@ except ImportError:
     def get_network_time():
         from datetime import datetime
         return datetime.now()
+    SALARY_MIGRATIONS = []
+    def run_migrations(db_manager, component, migrations):
+        return False, "无法导入数据库迁移模块"
 
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
@@ -58,26 +73,42 @@ except ImportError:
 import datetime
 import os
 import calendar
-import shutil
+import bisect
 from tkinter import scrolledtext
-from openpyxl import Workbook
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
 import tempfile
 import threading
-import requests
+import io
 import json
+import base64
 import sqlite3
 
-# 设置matplotlib中文字体 - 优化字体列表顺序，确保Windows系统能找到
-plt.rcParams["font.family"] = ["Microsoft YaHei", "SimHei", "KaiTi", "FangSong", "YouYuan", "Heiti TC", "WenQuanYi Micro Hei", "Arial"]
-plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+# matplotlib、openpyxl、reportlab 导入较慢，不在启动时导入，
+# 分别在第一次打开图表、导出Excel、生成PDF时才导入，缩短显示登录窗口前的等待
+_pyplot = None
+_chart_font_size = None
+# 报表图表的分辨率，以及画布大小改变后等待多久（毫秒）再重新渲染
+CHART_DPI = 100
+CHART_RESIZE_DELAY = 300
+
+def load_pyplot():
+    """导入matplotlib.pyplot并设置中文字体，只在第一次调用时执行"""
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib.pyplot as plt
+        # 设置matplotlib中文字体 - 优化字体列表顺序，确保Windows系统能找到
+        plt.rcParams["font.family"] = ["Microsoft YaHei", "SimHei", "KaiTi", "FangSong", "YouYuan", "Heiti TC", "WenQuanYi Micro Hei", "Arial"]
+        plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+        if _chart_font_size is not None:
+            plt.rcParams["font.size"] = _chart_font_size
+        _pyplot = plt
+    return _pyplot
+
+def set_chart_font_size(font_size):
+    """设置图表字体大小，matplotlib尚未导入时在导入后生效"""
+    global _chart_font_size
+    _chart_font_size = font_size
+    if _pyplot is not None:
+        _pyplot.rcParams["font.size"] = font_size
 
 class User:
     def __init__(self, username, password, role):
@@ -121,6 +152,10 @@ class SalaryCalculator:
     def __init__(self, db_path='salary_system.db'):
         self.db_path = db_path
         self.db_manager = DatabaseManager(db_path)
+        self._tax_brackets = None  # 内存中的税率表缓存
+        self.backup_retention = RetentionPolicy()  # 备份保留策略，每次备份后清理过期备份
+        self.backup_store = ChunkStore()  # 按内容去重的备份块存储
+        self.migration_error = None  # 数据库迁移失败的说明，由界面提示用户
         self.init_database()
         self.current_user = None  # 当前登录用户
 
@@ -153,45 +188,77 @@ class SalaryCalculator:
         """检查当前用户是否为管理员"""
         return self.current_user and self.current_user.role == 'admin'
 
-    def backup_database(self):
-        """备份数据库"""
+    def backup_database(self, progress=None):
+        """在线备份数据库到块存储（只写入变化的块），可在后台线程调用
+
+        progress(已复制页数, 总页数) 在复制过程中调用
+        """
         logger.info("开始数据库备份操作")
         if not self.is_admin():
             logger.warning(f"非管理员用户 {self.current_user.username if self.current_user else '未知用户'} 尝试执行备份操作")
             return False, "只有管理员才能执行备份操作"
         
         try:
-            # 确保备份目录存在
-            backup_dir = 'backups'
-            if not os.path.exists(backup_dir):
-                os.makedirs(backup_dir)
-                logger.info(f"创建备份目录: {backup_dir}")
-            
-            # 生成备份文件名
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_file = os.path.join(backup_dir, f'salary_system_{timestamp}.db')
-            
-            # 复制数据库文件
-            shutil.copy2(self.db_path, backup_file)
-            logger.info(f"数据库文件复制完成: {backup_file}")
-            
-            # 获取备份文件大小
-            file_size = os.path.getsize(backup_file)
-            
-            # 记录备份信息到数据库
-            self.db_manager.execute_query(
-                "INSERT INTO backups (backup_time, file_path, size, created_by) VALUES (?, ?, ?, ?)",
-                (datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), backup_file, file_size, self.current_user.username)
-            )
+            # 清单登记完成前不允许清理块
+            with self.backup_store.lock:
+                manifest, db_size, written = create_backup(self.db_path, self.backup_store, progress=progress)
+                
+                # 记录备份信息到数据库
+                self.db_manager.execute_query(
+                    "INSERT INTO backups (backup_time, file_path, size, created_by, manifest) VALUES (?, ?, ?, ?, ?)",
+                    (datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.backup_store.root, db_size,
+                     self.current_user.username, manifest)
+                )
             
-            logger.info(f"数据库备份成功: {backup_file} (大小: {file_size} 字节)")
-            return True, f"数据库备份成功：{backup_file}"
+            logger.info(f"数据库备份成功 (数据库大小: {db_size} 字节，新增备份数据: {written} 字节)")
+            self.prune_backups()
+            return True, f"数据库备份成功，新增备份数据 {round(written / 1024, 2)} KB"
         except Exception as e:
             logger.error(f"备份失败: {str(e)}")
             return False, f"备份失败：{str(e)}"
 
+    def _remove_backup(self, backup_id, file_path, manifest):
+        """删除一条备份记录；旧的单文件备份同时删除文件，块由collect_backup_chunks统一清理"""
+        if manifest is None:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                logger.info(f"删除备份文件成功: {file_path}")
+            else:
+                logger.warning(f"备份文件不存在: {file_path}")
+        self.db_manager.execute_query("DELETE FROM backups WHERE id=?", (backup_id,))
+
+    def collect_backup_chunks(self):
+        """删除不再被任何备份引用的块"""
+        with self.backup_store.lock:
+            manifests = self.db_manager.execute_query(
+                "SELECT manifest FROM backups WHERE manifest IS NOT NULL",
+                fetch_all=True
+            ) or []
+            return self.backup_store.collect_garbage([row[0] for row in manifests])
+
+    def prune_backups(self):
+        """按保留策略删除过期的备份，返回删除的数量"""
+        backups = self.db_manager.execute_query(
+            "SELECT id, backup_time, file_path, manifest FROM backups",
+            fetch_all=True
+        ) or []
+        expired = set(self.backup_retention.expired([(row[0], row[1]) for row in backups]))
+        removed = 0
+        for backup_id, backup_time, file_path, manifest in backups:
+            if backup_id not in expired:
+                continue
+            try:
+                self._remove_backup(backup_id, file_path, manifest)
+                removed += 1
+            except Exception as e:
+                logger.error(f"删除过期备份失败: {backup_time}: {str(e)}")
+        if removed:
+            logger.info(f"已按保留策略删除 {removed} 个过期备份")
+            self.collect_backup_chunks()
+        return removed
+
     def restore_database(self, backup_id):
-        """从备份恢复数据库"""
+        """从备份恢复数据库，可在后台线程调用"""
         logger.info(f"开始数据库恢复操作，备份ID: {backup_id}")
         if not self.is_admin():
             logger.warning(f"非管理员用户 {self.current_user.username if self.current_user else '未知用户'} 尝试执行恢复操作")
@@ -200,7 +267,7 @@ class SalaryCalculator:
         try:
             # 获取备份信息
             result = self.db_manager.execute_query(
-                "SELECT file_path FROM backups WHERE id=?",
+                "SELECT backup_time, file_path, manifest FROM backups WHERE id=?",
                 (backup_id,),
                 fetch_one=True
             )
@@ -209,19 +276,35 @@ class SalaryCalculator:
                 logger.warning(f"找不到指定的备份记录，ID: {backup_id}")
                 return False, "找不到指定的备份记录"
             
-            backup_file = result[0]
-            logger.info(f"找到备份文件: {backup_file}")
+            backup_time, backup_file, manifest = result
+            logger.info(f"找到备份: {backup_time}")
             
-            # 检查备份文件是否存在
-            if not os.path.exists(backup_file):
-                logger.error(f"备份文件不存在：{backup_file}")
-                return False, f"备份文件不存在：{backup_file}"
+            # 备份记录描述的是现有的备份数据，恢复后保持不变
+            backup_rows = self.db_manager.execute_query(
+                "SELECT id, backup_time, file_path, size, created_by, manifest FROM backups",
+                fetch_all=True
+            ) or []
             
-            # 复制备份文件到当前数据库
-            shutil.copy2(backup_file, self.db_path)
-            logger.info(f"数据库恢复成功：{backup_file}")
+            with self.backup_store.lock:
+                if manifest:
+                    restore_snapshot(manifest, self.backup_store, self.db_path)
+                else:
+                    restore_backup(backup_file, self.db_path)
+                
+                # 旧备份的表结构可能不是最新的，先迁移再写回备份记录
+                migrated, migration_message = run_migrations(self.db_manager, 'salary', SALARY_MIGRATIONS)
+                with self.db_manager.transaction() as conn:
+                    conn.execute("DELETE FROM backups")
+                    conn.executemany(
+                        "INSERT INTO backups (id, backup_time, file_path, size, created_by, manifest) VALUES (?, ?, ?, ?, ?, ?)",
+                        backup_rows
+                    )
+            self._tax_brackets = None
+            logger.info(f"数据库恢复成功：{backup_time}")
             
-            return True, f"数据库恢复成功：{backup_file}"
+            if not migrated:
+                return False, f"数据库已恢复到 {backup_time} 的备份，但{migration_message}"
+            return True, f"数据库已恢复到 {backup_time} 的备份"
         except Exception as e:
             logger.error(f"恢复失败：{str(e)}")
             return False, f"恢复失败：{str(e)}"
@@ -246,7 +329,7 @@ class SalaryCalculator:
         try:
             # 获取备份信息
             result = self.db_manager.execute_query(
-                "SELECT file_path FROM backups WHERE id=?",
+                "SELECT file_path, manifest FROM backups WHERE id=?",
                 (backup_id,),
                 fetch_one=True
             )
@@ -255,21 +338,8 @@ class SalaryCalculator:
                 logger.warning(f"找不到指定的备份记录，ID: {backup_id}")
                 return False, "找不到指定的备份记录"
             
-            backup_file = result[0]
-            logger.info(f"找到备份文件: {backup_file}")
-            
-            # 检查备份文件是否存在并删除
-            if os.path.exists(backup_file):
-                os.remove(backup_file)
-                logger.info(f"删除备份文件成功: {backup_file}")
-            else:
-                logger.warning(f"备份文件不存在: {backup_file}")
-            
-            # 从数据库中删除记录
-            self.db_manager.execute_query(
-                "DELETE FROM backups WHERE id=?",
-                (backup_id,)
-            )
+            self._remove_backup(backup_id, *result)
+            self.collect_backup_chunks()
             
             logger.info(f"删除备份记录成功，备份ID: {backup_id}")
             return True, "备份删除成功"
@@ -566,6 +636,12 @@ class SalaryCalculator:
         
     def init_database(self):
         """初始化数据库"""
+        # 启动时网络时间通常还没有同步，建表、初始数据和迁移不受本地时间写保护的限制
+        with self.db_manager.schema_setup():
+            self._create_tables()
+
+    def _create_tables(self):
+        """创建数据表、写入默认税率和管理员账号并执行结构迁移"""
         logger.info("初始化数据库...")
         
         # 创建备份记录表
@@ -698,6 +774,10 @@ class SalaryCalculator:
                 "INSERT INTO users (username, password, role, created_at) VALUES (?, ?, ?, ?)",
                 ('admin', 'admin123', 'admin', datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
             )
+        
+        # 执行结构迁移（补充字段、索引），已执行过的版本会跳过
+        success, message = run_migrations(self.db_manager, 'salary', SALARY_MIGRATIONS)
+        self.migration_error = None if success else message
     
     def add_employee(self, employee):
         try:
@@ -724,13 +804,6 @@ class SalaryCalculator:
             if result and result[0] > 0:
                 return False, "员工姓名已存在！"
             
-            # 检查员工表是否有contact字段，如果没有则添加
-            result = self.db_manager.execute_query("PRAGMA table_info(employees)", fetch_all=True)
-            if result:
-                columns = [column[1] for column in result]
-                if 'contact' not in columns:
-                    self.db_manager.execute_query("ALTER TABLE employees ADD COLUMN contact TEXT")
-            
             # 添加调试信息
             logger.info(f"准备添加员工: {employee.emp_id} - {employee.name}")
             logger.info(f"员工数据: {employee}")
@@ -773,13 +846,21 @@ class SalaryCalculator:
                 return False, "离职日期格式不正确（YYYY-MM-DD）！"
             
             # 更新员工数据
-            result = self.db_manager.execute_query(
-                """UPDATE employees 
-                SET name=?, department=?, position=?, base_salary=?, hire_date=?, status=?, leave_date=? 
-                WHERE emp_id=?""",
-                (employee.name, employee.department, employee.position, employee.base_salary,
-                 employee.hire_date, employee.status, employee.leave_date, employee.emp_id)
-            )
+            with self.db_manager.transaction() as conn:
+                result = self.db_manager.execute_query(
+                    """UPDATE employees 
+                    SET name=?, department=?, position=?, base_salary=?, hire_date=?, status=?, leave_date=? 
+                    WHERE emp_id=?""",
+                    (employee.name, employee.department, employee.position, employee.base_salary,
+                     employee.hire_date, employee.status, employee.leave_date, employee.emp_id)
+                )
+                # 基本工资变化后，未发放的工资记录需要重算
+                conn.execute(
+                    """INSERT OR IGNORE INTO salary_dirty (emp_id, month)
+                    SELECT emp_id, month FROM salaries
+                    WHERE emp_id=? AND status IS NOT 'paid' AND base_salary != ?""",
+                    (employee.emp_id, float(employee.base_salary))
+                )
             
             return result is not None
         except Exception as e:
@@ -856,33 +937,74 @@ class SalaryCalculator:
                 logger.warning(f"无效的考勤状态: {attendance.status}")
                 return False
             
-            # 检查是否已存在该员工当天的考勤记录
-            existing = self.db_manager.execute_query(
-                "SELECT id FROM attendance WHERE emp_id=? AND date=?",
-                (attendance.emp_id, attendance.date),
-                fetch_one=True
-            )
-            
-            if existing:
-                # 更新已有记录
-                result = self.db_manager.execute_query(
-                    """UPDATE attendance 
-                    SET status=?, note=? 
-                    WHERE id=?""",
-                    (attendance.status, attendance.note, existing[0])
-                )
-            else:
-                # 添加新记录
-                result = self.db_manager.execute_query(
-                    "INSERT INTO attendance (emp_id, date, status, note) VALUES (?, ?, ?, ?)",
-                    (attendance.emp_id, attendance.date, attendance.status, attendance.note)
+            with self.db_manager.transaction() as conn:
+                # 检查是否已存在该员工当天的考勤记录
+                existing = self.db_manager.execute_query(
+                    "SELECT id FROM attendance WHERE emp_id=? AND date=?",
+                    (attendance.emp_id, attendance.date),
+                    fetch_one=True
                 )
+                
+                if existing:
+                    # 更新已有记录
+                    result = self.db_manager.execute_query(
+                        """UPDATE attendance 
+                        SET status=?, note=? 
+                        WHERE id=?""",
+                        (attendance.status, attendance.note, existing[0])
+                    )
+                else:
+                    # 添加新记录
+                    result = self.db_manager.execute_query(
+                        "INSERT INTO attendance (emp_id, date, status, note) VALUES (?, ?, ?, ?)",
+                        (attendance.emp_id, attendance.date, attendance.status, attendance.note)
+                    )
+                
+                # 当月工资的扣款随考勤变化
+                self._mark_salaries_dirty(conn, [(attendance.emp_id, attendance.date[:7])])
             
             return result is not None
         except Exception as e:
             logger.error(f"添加考勤异常: {str(e)}")
             return False
     
+    def bulk_set_attendance(self, date, status, emp_ids, note=''):
+        """批量设置多名员工同一天的考勤，已有记录则更新状态和备注
+
+        所有员工在一个事务中写入，返回 {emp_id: 是否成功}
+        """
+        results = {emp_id: False for emp_id in emp_ids}
+        if not Validator.is_valid_date(date):
+            logger.warning(f"无效的日期格式: {date}")
+            return results
+        if status not in ['present', 'absent', 'leave', 'late']:
+            logger.warning(f"无效的考勤状态: {status}")
+            return results
+        
+        valid_ids = []
+        for emp_id in results:
+            if Validator.is_valid_emp_id(emp_id):
+                valid_ids.append(emp_id)
+            else:
+                logger.warning(f"无效的员工ID格式: {emp_id}")
+        if not valid_ids:
+            return results
+        
+        try:
+            with self.db_manager.transaction() as conn:
+                conn.executemany(
+                    """INSERT INTO attendance (emp_id, date, status, note) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(emp_id, date) DO UPDATE SET status=excluded.status, note=excluded.note""",
+                    [(emp_id, date, status, note) for emp_id in valid_ids]
+                )
+                self._mark_salaries_dirty(conn, [(emp_id, date[:7]) for emp_id in valid_ids])
+            for emp_id in valid_ids:
+                results[emp_id] = True
+            logger.info(f"批量设置考勤: {date} {status} 共{len(valid_ids)}人")
+        except Exception as e:
+            logger.error(f"批量设置考勤异常: {str(e)}")
+        return results
+    
     def delete_attendance(self, emp_id, date):
         """删除指定员工在指定日期的考勤记录"""
         try:
@@ -906,10 +1028,12 @@ class SalaryCalculator:
                 return False
 
             # 删除记录
-            result = self.db_manager.execute_query(
-                "DELETE FROM attendance WHERE id=?",
-                (existing[0],)
-            )
+            with self.db_manager.transaction() as conn:
+                result = self.db_manager.execute_query(
+                    "DELETE FROM attendance WHERE id=?",
+                    (existing[0],)
+                )
+                self._mark_salaries_dirty(conn, [(emp_id, date[:7])])
 
             if result:
                 logger.info(f"已删除员工 {emp_id} 在 {date} 的考勤记录")
@@ -921,27 +1045,157 @@ class SalaryCalculator:
             logger.error(f"删除考勤记录异常: {str(e)}")
             return False
 
+    def _mark_salaries_dirty(self, conn, keys, unpaid_only=True):
+        """将 (emp_id, month) 对应的工资记录标记为待重算，没有工资记录的忽略
+
+        考勤等间接变化只影响未发放的工资；直接修改奖金、扣款时传入unpaid_only=False
+        """
+        paid_filter = " AND status IS NOT 'paid'" if unpaid_only else ""
+        conn.executemany(
+            f"""INSERT OR IGNORE INTO salary_dirty (emp_id, month)
+            SELECT emp_id, month FROM salaries WHERE emp_id=? AND month=?{paid_filter}""",
+            keys
+        )
+
+    def recompute_dirty_salaries(self, month=None):
+        """批量重算被标记为待重算的工资记录
+
+        未发放的记录基本工资取员工当前基本工资，非手工扣款按当月缺勤和请假次数重新计算；
+        已发放的记录保留原基本工资和扣款，只按新的奖金、扣款重算最终工资。
+        所有记录在一个事务中更新。month为None时处理所有月份，返回重算的记录数。
+        """
+        month_filter = " AND d.month=?" if month else ""
+        params = (month,) if month else ()
+        # 刷新工资表时每次都会调用，没有待重算的记录时只读一次，不开启写事务
+        pending = self.db_manager.execute_query(
+            f"SELECT 1 FROM salary_dirty d WHERE 1=1{month_filter} LIMIT 1", params, fetch_one=True)
+        if not pending:
+            return 0
+        try:
+            with self.db_manager.transaction() as conn:
+                rows = conn.execute(
+                    f"""SELECT d.emp_id, d.month,
+                               CASE WHEN s.status = 'paid' THEN s.base_salary
+                                    ELSE COALESCE(e.base_salary, s.base_salary) END,
+                               s.bonus, s.deduction, s.deduction_manual OR s.status = 'paid'
+                    FROM salary_dirty d
+                    JOIN salaries s ON s.emp_id = d.emp_id AND s.month = d.month
+                    LEFT JOIN employees e ON e.emp_id = d.emp_id
+                    WHERE 1=1{month_filter}""",
+                    params
+                ).fetchall()
+                
+                if rows:
+                    # 每个涉及的月份只查询一次考勤汇总
+                    summaries = {m: self.get_attendance_summary(m) for m in {row[1] for row in rows}}
+                    
+                    details = []
+                    for emp_id, m, base_salary, bonus, deduction, keep_deduction in rows:
+                        base_salary = float(base_salary) if base_salary else 0.0
+                        bonus = float(bonus) if bonus is not None else 0
+                        if keep_deduction:
+                            deduction = float(deduction) if deduction is not None else 0
+                        else:
+                            absent_days, leave_days = summaries[m].get(emp_id, (0, 0))
+                            deduction = (absent_days + leave_days) * 50
+                        details.append((emp_id, m, base_salary, bonus, deduction))
+                    
+                    taxes = self.calculate_tax_batch([base + bonus - deduction for _, _, base, bonus, deduction in details])
+                    conn.executemany(
+                        "UPDATE salaries SET base_salary=?, deduction=?, final_salary=? WHERE emp_id=? AND month=?",
+                        [(base, deduction, round(base + bonus - deduction - tax, 2), emp_id, m)
+                         for (emp_id, m, base, bonus, deduction), tax in zip(details, taxes)]
+                    )
+                    conn.executemany(
+                        "DELETE FROM salary_dirty WHERE emp_id=? AND month=?",
+                        [(emp_id, m) for emp_id, m, _, _, _ in details]
+                    )
+                
+                # 工资记录已被删除的标记直接清除
+                conn.execute(
+                    """DELETE FROM salary_dirty WHERE NOT EXISTS
+                    (SELECT 1 FROM salaries s WHERE s.emp_id = salary_dirty.emp_id AND s.month = salary_dirty.month)"""
+                )
+            if rows:
+                logger.info(f"已重算 {len(rows)} 条工资记录")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"重算工资记录失败: {str(e)}")
+            return 0
+
+    def _load_tax_brackets(self):
+        """将税率表加载到内存，供二分查找使用
+
+        所有区间的起止点把工资分成若干段，每段适用的区间预先算好；
+        区间有重叠时与原来的查询一致，取覆盖该段的id最小的区间。
+        """
+        rows = self.db_manager.execute_query(
+            "SELECT min_salary, max_salary, rate, deduction FROM tax_rates ORDER BY id",
+            fetch_all=True
+        ) or []
+        brackets = [tuple(float(value) for value in row) for row in rows]
+        starts = sorted(set(b[0] for b in brackets) | set(b[1] for b in brackets))
+        # 每段 [starts[k], starts[k+1]) 内覆盖的区间相同，用段起点判断即可
+        winners = [next((b for b in brackets if b[0] <= start < b[1]), None) for start in starts]
+        self._tax_brackets = (starts, winners)
+        return self._tax_brackets
+
+    def invalidate_tax_brackets(self):
+        """税率表变更后清除内存中的缓存"""
+        self._tax_brackets = None
+
+    def _lookup_tax(self, salary, brackets):
+        """在已加载的税率表中计算个人所得税"""
+        starts, winners = brackets
+        # 找到salary所在的段
+        i = bisect.bisect_right(starts, salary) - 1
+        if i < 0 or winners[i] is None:
+            return 0
+        min_salary, _, rate, deduction = winners[i]
+        # 正确的个人所得税计算方式：(应纳税所得额 - 起征点) * 税率 - 速算扣除数
+        # 这里min_salary就是该区间的起征点
+        tax = (salary - min_salary) * rate - deduction
+        return round(max(tax, 0), 2)  # 确保税金不为负数并保留两位小数
+
     def calculate_tax(self, salary):
         """计算个人所得税"""
         if not Validator.is_valid_salary(salary):
             logger.warning(f"无效的工资数据: {salary}")
             return 0
         
-        # 查询适用的税率
+        brackets = self._tax_brackets or self._load_tax_brackets()
+        return self._lookup_tax(float(salary), brackets)
+
+    def calculate_tax_batch(self, incomes):
+        """批量计算个人所得税，返回与incomes顺序一致的税额列表"""
+        brackets = self._tax_brackets or self._load_tax_brackets()
+        taxes = []
+        for salary in incomes:
+            if not Validator.is_valid_salary(salary):
+                logger.warning(f"无效的工资数据: {salary}")
+                taxes.append(0)
+            else:
+                taxes.append(self._lookup_tax(float(salary), brackets))
+        return taxes
+
+    def add_tax_rate(self, min_salary, max_salary, rate, deduction):
+        """添加税率区间"""
         result = self.db_manager.execute_query(
-            "SELECT rate, deduction, min_salary FROM tax_rates WHERE min_salary <= ? AND max_salary > ?",
-            (salary, salary),
-            fetch_one=True
+            "INSERT INTO tax_rates (min_salary, max_salary, rate, deduction) VALUES (?, ?, ?, ?)",
+            (min_salary, max_salary, rate, deduction)
         )
-        
-        if not result:
-            return 0
-        
-        rate, deduction, min_salary = result
-        # 正确的个人所得税计算方式：(应纳税所得额 - 起征点) * 税率 - 速算扣除数
-        # 这里min_salary就是该区间的起征点
-        tax = (salary - min_salary) * rate - deduction
-        return round(max(tax, 0), 2)  # 确保税金不为负数并保留两位小数
+        self.invalidate_tax_brackets()
+        return result
+
+    def update_tax_rate(self, tax_id, min_salary, max_salary, rate, deduction):
+        """修改税率区间"""
+        result = self.db_manager.execute_query(
+            "UPDATE tax_rates SET min_salary=?, max_salary=?, rate=?, deduction=? WHERE id=?",
+            (min_salary, max_salary, rate, deduction, tax_id)
+        )
+        self.invalidate_tax_brackets()
+        return result
+
     def calculate_salary(self, emp_id, month):
         # 获取员工信息
         emp_row = self.db_manager.execute_query(
@@ -1049,54 +1303,75 @@ class SalaryCalculator:
     def update_employee_bonus(self, emp_id, month, new_bonus):
         """更新员工的奖金并重新计算相关工资数据"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 获取当前工资记录
-            cursor.execute(
-                "SELECT base_salary, deduction FROM salaries WHERE emp_id=? AND month=?",
-                (emp_id, month)
-            )
-            salary_data = cursor.fetchone()
-            
-            if not salary_data:
-                conn.close()
-                logger.warning(f"未找到员工 {emp_id} 在 {month} 月份的工资记录")
-                return False
-            
-            base_salary, deduction = salary_data
-            
-            # 重新计算个人所得税（基于新的应纳税所得额）
-            taxable_income = base_salary + new_bonus - deduction
-            tax = self.calculate_tax(taxable_income)
-            
-            # 重新计算最终工资
-            final_salary = base_salary + new_bonus - deduction - tax
-            final_salary = round(final_salary, 2)
-            
-            # 更新数据库
-            cursor.execute(
-                """UPDATE salaries 
-                SET bonus=?, final_salary=? 
-                WHERE emp_id=? AND month=?""",
-                (new_bonus, final_salary, emp_id, month)
-            )
-            
-            conn.commit()
-            conn.close()
+            with self.db_manager.transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE salaries SET bonus=? WHERE emp_id=? AND month=?",
+                    (new_bonus, emp_id, month)
+                )
+                if cursor.rowcount == 0:
+                    logger.warning(f"未找到员工 {emp_id} 在 {month} 月份的工资记录")
+                    return False
+                self._mark_salaries_dirty(conn, [(emp_id, month)], unpaid_only=False)
             
+            self.recompute_dirty_salaries(month)
             logger.info(f"已更新员工 {emp_id} 在 {month} 月份的奖金为: {new_bonus}")
             return True
         except Exception as e:
             logger.error(f"更新奖金失败: {str(e)}")
-            if 'conn' in locals():
-                conn.rollback()
-                conn.close()
             return False
     
-    # 修复缩进问题
+    def update_employee_deduction(self, emp_id, month, new_deduction):
+        """手工设置员工的扣款金额并重新计算最终工资，之后考勤变化不再覆盖该扣款"""
+        try:
+            with self.db_manager.transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE salaries SET deduction=?, deduction_manual=1 WHERE emp_id=? AND month=?",
+                    (new_deduction, emp_id, month)
+                )
+                if cursor.rowcount == 0:
+                    logger.warning(f"未找到员工 {emp_id} 在 {month} 月份的工资记录")
+                    return False
+                self._mark_salaries_dirty(conn, [(emp_id, month)], unpaid_only=False)
+            
+            self.recompute_dirty_salaries(month)
+            logger.info(f"已更新员工 {emp_id} 在 {month} 月份的扣款为: {new_deduction}")
+            return True
+        except Exception as e:
+            logger.error(f"更新扣款失败: {str(e)}")
+            return False
+    
+    def _month_range(self, month):
+        """返回月份的起止日期字符串 (YYYY-MM-01, YYYY-MM-DD)"""
+        year, month_num = map(int, month.split('-'))
+        days_in_month = calendar.monthrange(year, month_num)[1]
+        return f"{year}-{month_num:02d}-01", f"{year}-{month_num:02d}-{days_in_month}"
+
+    def get_attendance_summary(self, month):
+        """按员工汇总指定月份的缺勤和请假次数
+
+        返回 {emp_id: (absent_days, leave_days)}
+        """
+        start_date, end_date = self._month_range(month)
+        rows = self.db_manager.execute_query(
+            """SELECT emp_id,
+                      SUM(CASE WHEN status='absent' THEN 1 ELSE 0 END),
+                      SUM(CASE WHEN status='leave' THEN 1 ELSE 0 END)
+               FROM attendance
+               WHERE date BETWEEN ? AND ?
+               GROUP BY emp_id""",
+            (start_date, end_date),
+            fetch_all=True
+        ) or []
+        return {row[0]: (row[1] or 0, row[2] or 0) for row in rows}
+
     def generate_salary_sheet(self, month):
-        """生成指定月份的工资表"""
+        """生成指定月份的工资表
+
+        批量读取在职员工、当月考勤汇总和已有工资记录，在内存中计算工资，
+        新记录通过一次executemany在同一事务中写入。已有记录中被标记为待重算的先批量重算。
+        """
+        self.recompute_dirty_salaries(month)
+        
         # 获取所有在职员工
         employees = self.get_all_employees('active')
         
@@ -1104,49 +1379,195 @@ class SalaryCalculator:
             logger.warning("没有找到在职员工")
             return []
         
+        # 当月已有的工资记录（同一员工存在多条时取最早的一条）
+        existing_rows = self.db_manager.execute_query(
+            "SELECT emp_id, base_salary, bonus, deduction, final_salary, status, payment_date FROM salaries WHERE month=? ORDER BY id",
+            (month,),
+            fetch_all=True
+        ) or []
+        existing_salaries = {}
+        for row in existing_rows:
+            existing_salaries.setdefault(row[0], row[1:])
+        
+        # 当月考勤汇总
+        attendance_summary = self.get_attendance_summary(month)
+        
         salary_sheet = []
+        taxable_incomes = []
         
-        # 遍历所有员工
         for employee in employees:
-            # 首先检查该员工该月份是否已有工资记录
-            existing_salary = self.db_manager.execute_query(
-                "SELECT base_salary, bonus, deduction, final_salary FROM salaries WHERE emp_id=? AND month=?",
-                (employee.emp_id, month),
-                fetch_one=True
-            )
+            existing_salary = existing_salaries.get(employee.emp_id)
             
             if existing_salary:
                 # 如果已有记录，则直接使用
-                base_salary, bonus, deduction, final_salary = existing_salary
+                base_salary, bonus, deduction, final_salary, status, payment_date = existing_salary
                 salary_detail = {
                     'emp_id': employee.emp_id,
                     'name': employee.name,
                     'base_salary': float(base_salary),
                     'bonus': float(bonus) if bonus is not None else 0,
                     'deduction': float(deduction) if deduction is not None else 0,
-                    'final_salary': float(final_salary)
+                    'final_salary': float(final_salary),
+                    'status': status or 'unpaid',
+                    'payment_date': payment_date
                 }
-                # 计算应纳税额（即使数据库中没有存储）
-                taxable_income = base_salary + bonus - deduction
-                salary_detail['tax'] = self.calculate_tax(taxable_income)
             else:
-                # 如果没有记录，则计算工资
-                salary_detail = self.calculate_salary(employee.emp_id, month)
-                
-                if salary_detail:
-                    # 保存到数据库
-                    # 注意：salaries表没有tax列，最终工资已经扣除了个税
-                    self.db_manager.execute_query(
-                        "INSERT INTO salaries (emp_id, month, base_salary, bonus, deduction, final_salary, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (salary_detail['emp_id'], month, salary_detail['base_salary'], 
-                         salary_detail['bonus'], salary_detail['deduction'], 
-                         salary_detail['final_salary'], 'unpaid')
-                    )
+                # 如果没有记录，则计算工资：奖金默认为0，扣款按缺席和请假累计次数每次50元
+                absent_days, leave_days = attendance_summary.get(employee.emp_id, (0, 0))
+                salary_detail = {
+                    'emp_id': employee.emp_id,
+                    'name': employee.name,
+                    'base_salary': float(employee.base_salary) if employee.base_salary else 0.0,
+                    'bonus': 0,
+                    'deduction': (absent_days + leave_days) * 50,
+                    'final_salary': None,
+                    'status': 'unpaid',
+                    'payment_date': None
+                }
             
-            if salary_detail:
-                salary_sheet.append(salary_detail)
+            salary_sheet.append(salary_detail)
+            # 应纳税所得额：基本工资+奖金-扣款
+            taxable_incomes.append(salary_detail['base_salary'] + salary_detail['bonus'] - salary_detail['deduction'])
+        
+        # 批量计算个人所得税
+        new_rows = []
+        for salary_detail, tax in zip(salary_sheet, self.calculate_tax_batch(taxable_incomes)):
+            salary_detail['tax'] = tax
+            if salary_detail['final_salary'] is None:
+                salary_detail['final_salary'] = round(
+                    salary_detail['base_salary'] + salary_detail['bonus'] - salary_detail['deduction'] - tax, 2)
+                # 注意：salaries表没有tax列，最终工资已经扣除了个税
+                new_rows.append((salary_detail['emp_id'], month, salary_detail['base_salary'],
+                                 salary_detail['bonus'], salary_detail['deduction'],
+                                 salary_detail['final_salary'], 'unpaid'))
+        
+        # 新生成的工资记录一次性写入
+        if new_rows:
+            self.db_manager.execute_many(
+                "INSERT INTO salaries (emp_id, month, base_salary, bonus, deduction, final_salary, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                new_rows
+            )
         
         return salary_sheet
+
+    def iter_salary_sheet(self, month, batch_size=500):
+        """逐条读取指定月份在职员工的工资记录（含个税和员工信息），不把整个月的工资表放在内存中
+
+        还没有工资记录的员工先按generate_salary_sheet生成。顺序与generate_salary_sheet一致。
+        """
+        missing = self.db_manager.execute_query(
+            """SELECT COUNT(*) FROM employees e
+               WHERE e.status='active' AND NOT EXISTS
+                     (SELECT 1 FROM salaries s WHERE s.emp_id = e.emp_id AND s.month = ?)""",
+            (month,),
+            fetch_one=True
+        )
+        if missing and missing[0]:
+            self.generate_salary_sheet(month)
+        else:
+            self.recompute_dirty_salaries(month)
+
+        conn = self.db_manager.pool.acquire()
+        try:
+            cursor = conn.execute(
+                """SELECT e.emp_id, e.name, e.department, e.position, e.hire_date,
+                          s.base_salary, s.bonus, s.deduction, s.final_salary, s.status, s.payment_date
+                   FROM employees e
+                   JOIN salaries s ON s.emp_id = e.emp_id AND s.month = ?
+                   WHERE e.status='active'
+                   ORDER BY e.rowid""",
+                (month,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch = []
+                for emp_id, name, department, position, hire_date, base_salary, bonus, deduction, final_salary, status, payment_date in rows:
+                    batch.append({
+                        'emp_id': emp_id,
+                        'name': name,
+                        'department': department or '',
+                        'position': position or '',
+                        'hire_date': hire_date or '',
+                        'base_salary': float(base_salary) if base_salary else 0.0,
+                        'bonus': float(bonus) if bonus is not None else 0,
+                        'deduction': float(deduction) if deduction is not None else 0,
+                        'final_salary': float(final_salary) if final_salary is not None else 0.0,
+                        'status': status or 'unpaid',
+                        'payment_date': payment_date
+                    })
+                # 个人所得税不保存在工资记录中，按批计算：应纳税所得额 = 基本工资+奖金-扣款
+                taxes = self.calculate_tax_batch([d['base_salary'] + d['bonus'] - d['deduction'] for d in batch])
+                for salary_detail, tax in zip(batch, taxes):
+                    salary_detail['tax'] = tax
+                    yield salary_detail
+        finally:
+            conn.close()
+
+    def count_salary_sheet(self):
+        """工资表的员工数（在职员工），与iter_salary_sheet逐条返回的记录数相同"""
+        row = self.db_manager.execute_query(
+            "SELECT COUNT(*) FROM employees WHERE status='active'", fetch_one=True)
+        return row[0] if row else 0
+
+    def set_payment_status(self, month, emp_ids=None, status='paid', payment_date=None):
+        """批量设置指定月份工资的发放状态
+        
+        参数:
+            month: 月份 (YYYY-MM)
+            emp_ids: 员工ID列表，为None时设置该月份的全部工资记录
+            status: 'paid' 或 'unpaid'
+            payment_date: 发放日期，标记已发放时默认为今天；标记未发放时清空
+        
+        返回实际发生变化的记录列表 [(emp_id, status, payment_date), ...]，失败返回None
+        """
+        # 检查是否为管理员
+        if not self.is_admin():
+            logger.warning(f"非管理员用户 {self.current_user.username if self.current_user else '未知用户'} 尝试批量设置工资发放状态")
+            return None
+        if status not in ('paid', 'unpaid'):
+            logger.warning(f"无效的工资发放状态: {status}")
+            return None
+        
+        if status == 'paid':
+            payment_date = payment_date or datetime.datetime.now().strftime('%Y-%m-%d')
+        else:
+            payment_date = None
+        
+        # 只更新状态或发放日期确实不同的记录
+        condition = "month=? AND (status IS NOT ? OR payment_date IS NOT ?)"
+        if emp_ids is None:
+            batches = [((month, status, payment_date), "")]
+        else:
+            emp_ids = list(emp_ids)
+            # 分批拼接IN条件，避免超过SQLite参数个数限制
+            batches = []
+            for i in range(0, len(emp_ids), 500):
+                chunk = emp_ids[i:i + 500]
+                batches.append(((month, status, payment_date, *chunk),
+                                f" AND emp_id IN ({','.join('?' * len(chunk))})"))
+        
+        changed = []
+        try:
+            with self.db_manager.transaction() as conn:
+                for params, emp_filter in batches:
+                    rows = conn.execute(
+                        f"SELECT emp_id FROM salaries WHERE {condition}{emp_filter}", params
+                    ).fetchall()
+                    if not rows:
+                        continue
+                    conn.execute(
+                        f"UPDATE salaries SET status=?, payment_date=? WHERE {condition}{emp_filter}",
+                        (status, payment_date) + params
+                    )
+                    changed.extend((row[0], status, payment_date) for row in rows)
+            logger.info(f"已将 {month} 月份 {len(changed)} 条工资记录设置为 {status}")
+            return changed
+        except Exception as e:
+            logger.error(f"批量设置工资发放状态失败: {str(e)}")
+            return None
+    
     def mark_salary_paid(self, emp_id, month):
         # 检查是否为管理员
         if not self.is_admin():
@@ -1241,6 +1662,8 @@ class LoginWindow:
         
         # 初始化计算器
         self.calculator = SalaryCalculator()
+        if self.calculator.migration_error:
+            messagebox.showerror("数据库升级失败", f"{self.calculator.migration_error}\n请联系管理员处理后再使用。")
     
     def initialize_fonts(self):
         """初始化字体配置"""
@@ -1442,7 +1865,8 @@ def get_screen_adaptation():
     global _screen_adaptation
     return _screen_adaptation
 
-def main():
+def create_login_window():
+    """创建根窗口和登录界面，返回 (根窗口, 登录界面)"""
     # 创建登录窗口
     login_root = tk.Tk()
     login_root.title("工资计算系统 - 登录")
@@ -1471,6 +1895,13 @@ def main():
     
     # 启动登录窗口
     login_window = LoginWindow(login_root, on_login_success)
+    return login_root, login_window
+
+def main():
+    setup_logging()
+    # 启动后台网络时间同步，第一次同步成功前禁止写数据库
+    get_network_time()
+    login_root, login_window = create_login_window()
     login_root.mainloop()
 
 class AdaptiveDialog(tk.Toplevel):
@@ -1680,6 +2111,9 @@ class SalaryCalculatorApp:
         self.calculator = calculator
         self.root.title("工资表计算系统")
         
+        # 后台任务执行器（报表查询、图表渲染等耗时操作）
+        self.worker = BackgroundWorker(self.root)
+        
         # 获取全局屏幕适配实例
         self.screen_adapt = get_screen_adaptation()
         
@@ -1734,6 +2168,9 @@ class SalaryCalculatorApp:
         pad_size = self.screen_adapt.get_padding('small') if self.screen_adapt.is_mobile else 5
         self.notebook.pack(fill="both", expand=True, padx=pad_size, pady=pad_size)
         
+        # 各标签页先以空Frame占位，第一次选中时才构建并加载数据
+        self.tabs = LazyTabs(self.notebook)
+        
         # 创建各个标签页
         self.employee_frame = ttk.Frame(self.notebook)
         self.attendance_frame = ttk.Frame(self.notebook)
@@ -1769,26 +2206,26 @@ class SalaryCalculatorApp:
             self.notebook.hide(self.backup_restore_frame)
             self.notebook.hide(self.tax_rate_frame)
         else:
-            # 管理员初始化用户管理、备份恢复和税率管理页面
-            self.init_user_management_frame()
-            self.init_backup_restore_frame()
-            self.init_tax_rate_frame()
+            # 管理员的用户管理、备份恢复和税率管理页面
+            self.tabs.register(self.user_management_frame, self.init_user_management_frame, refresh=self.refresh_user_list)
+            self.tabs.register(self.backup_restore_frame, self.init_backup_restore_frame, refresh=self.refresh_backup_list)
+            self.tabs.register(self.tax_rate_frame, self.init_tax_rate_frame)
             
             # 初始化进销存管理模块
             from inventory_manager import InventoryManager
-            self.inventory_manager = InventoryManager(self.calculator.db_path, self.root, self.notebook, self.user_role, self.calculator.current_user)
+            self.inventory_manager = InventoryManager(self.calculator.db_path, self.root, self.notebook, self.user_role, self.calculator.current_user, lazy_tabs=self.tabs, worker=self.worker)
         
-        # 初始化各个页面
-        self.init_employee_frame()
-        self.init_attendance_frame()
-        self.init_salary_frame()
-        self.init_revenue_frame()
+        # 登记各个页面，切换到工资、收入、利润页面时重新计算
+        self.tabs.register(self.employee_frame, self.init_employee_frame, refresh=self.refresh_employee_list)
+        self.tabs.register(self.attendance_frame, self.init_attendance_frame)
+        self.tabs.register(self.salary_frame, self.init_salary_frame, refresh=self.generate_salary_sheet, refresh_after_build=True)
+        self.tabs.register(self.revenue_frame, self.init_revenue_frame, refresh=self.refresh_revenue_list, refresh_after_build=True)
         
         # 初始化支出管理
         from expense_manager import ExpenseManager
-        self.expense_manager = ExpenseManager(self.calculator.db_path, self.root, self.notebook, self.user_role)
+        self.expense_manager = ExpenseManager(self.calculator.db_path, self.root, self.notebook, self.user_role, lazy_tabs=self.tabs)
         
-        self.init_profit_frame()
+        self.tabs.register(self.profit_frame, self.init_profit_frame, refresh=self.calculate_and_display_profit, refresh_after_build=True)
         
         # 绑定标签页切换事件
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
@@ -1807,20 +2244,30 @@ class SalaryCalculatorApp:
         self.root.bind("<Configure>", self.on_window_resize)
         # 初始化屏幕适配
         self.adjust_ui_for_screen_size()
+        
+        # 构建当前选中的（第一个）标签页
+        self.on_tab_changed()
     
     def setup_auto_backup(self):
-        """设置自动备份任务，每天19:00执行"""
+        """设置自动备份任务，每天19:40在后台执行"""
         def auto_backup():
             """自动备份函数"""
             logger.info("执行自动备份")
-            success, msg = self.calculator.backup_database()
+            # 上一次自动备份还没有完成时跳过本次
+            self.worker.submit("auto_backup", lambda task: self.calculator.backup_database(),
+                               on_success=backup_done, replace=False)
+            
+            # 设置下一天的备份
+            self.setup_auto_backup()
+        
+        def backup_done(result):
+            success, msg = result
             if success:
                 logger.info(f"自动备份成功: {msg}")
+                if self.tabs.is_built(self.backup_restore_frame):
+                    self.refresh_backup_list()
             else:
                 logger.error(f"自动备份失败: {msg}")
-            
-            # 设置下一天的备份
-            self.setup_auto_backup()
         
         # 获取当前时间
         now = datetime.datetime.now()
@@ -1828,17 +2275,15 @@ class SalaryCalculatorApp:
         # 设置目标时间为今天19:40
         target = now.replace(hour=19, minute=40, second=0, microsecond=0)
         
-        # 如果今天19:00已经过了，则设置为明天19:00
+        # 如果今天19:40已经过了，则设置为明天19:40
         if now > target:
             target += datetime.timedelta(days=1)
         
         # 计算时间差
         delta = target - now
         
-        # 设置定时器
-        self.backup_timer = threading.Timer(delta.total_seconds(), auto_backup)
-        self.backup_timer.daemon = True  # 设置为守护线程，主程序结束时自动终止
-        self.backup_timer.start()
+        # 设置定时器，到时在主线程提交后台备份任务
+        self.backup_timer = self.root.after(int(delta.total_seconds() * 1000), auto_backup)
         logger.info(f"已设置自动备份，下次备份时间: {target}")
         
     def initialize_fonts(self):
@@ -1905,7 +2350,7 @@ class SalaryCalculatorApp:
         font_size = self.screen_adapt.get_font_size(width)
         
         # 为matplotlib设置字体大小
-        plt.rcParams["font.size"] = font_size
+        set_chart_font_size(font_size)
         
         # 根据屏幕适配获取边距
         if self.screen_adapt.is_mobile:
@@ -1932,25 +2377,9 @@ class SalaryCalculatorApp:
         # 强制刷新UI
         self.root.update_idletasks()
     
-    def on_tab_changed(self, event):
-        # 当切换到员工管理标签页时，刷新员工列表
-        if self.notebook.select() == str(self.employee_frame):
-            self.refresh_employee_list()
-        # 当切换到工资管理标签页时，刷新工资表
-        elif self.notebook.select() == str(self.salary_frame):
-            self.generate_salary_sheet()
-        # 当切换到收入管理标签页时，刷新收入列表
-        elif self.notebook.select() == str(self.revenue_frame):
-            self.refresh_revenue_list()
-        # 当切换到利润计算标签页时，刷新利润数据
-        elif self.notebook.select() == str(self.profit_frame):
-            self.calculate_and_display_profit()
-        # 当切换到用户管理标签页时，刷新用户列表
-        elif self.notebook.select() == str(self.user_management_frame):
-            self.refresh_user_list()
-        # 当切换到备份恢复标签页时，刷新备份列表
-        elif self.notebook.select() == str(self.backup_restore_frame):
-            self.refresh_backup_list()
+    def on_tab_changed(self, event=None):
+        """切换标签页：第一次选中时构建页面，之后按页面需要刷新数据"""
+        self.tabs.on_tab_changed(event)
     
     def init_tax_rate_frame(self):
         # 创建主框架
@@ -2076,10 +2505,7 @@ class SalaryCalculatorApp:
                     return
                 
                 # 保存到数据库
-                result = self.calculator.db_manager.execute_query(
-                    "INSERT INTO tax_rates (min_salary, max_salary, rate, deduction) VALUES (?, ?, ?, ?)",
-                    (min_salary, max_salary, rate, deduction)
-                )
+                result = self.calculator.add_tax_rate(min_salary, max_salary, rate, deduction)
                 
                 if not result:
                     messagebox.showerror("错误", "添加税率失败，数据库操作未成功！")
@@ -2172,10 +2598,7 @@ class SalaryCalculatorApp:
                     return
                 
                 # 更新数据库
-                result = self.calculator.db_manager.execute_query(
-                    "UPDATE tax_rates SET min_salary=?, max_salary=?, rate=?, deduction=? WHERE id=?",
-                    (new_min_salary, new_max_salary, new_rate, new_deduction, tax_id)
-                )
+                result = self.calculator.update_tax_rate(tax_id, new_min_salary, new_max_salary, new_rate, new_deduction)
                 
                 if not result:
                     messagebox.showerror("错误", "更新税率失败，数据库操作未成功！")
@@ -2257,14 +2680,26 @@ class SalaryCalculatorApp:
             self.backup_tree.insert("", tk.END, values=(backup_id, backup_time, file_path, size_kb))
     
     def create_backup(self):
-        # 创建备份
-        success, msg = self.calculator.backup_database()
+        # 在后台创建备份，复制过程中界面可以继续操作；上一次备份完成前不能再次备份
+        task = self.worker.submit("backup", lambda task: self.calculator.backup_database(),
+                                  on_success=self._on_backup_done, on_error=self._on_backup_error, replace=False)
+        if task is None:
+            messagebox.showinfo("提示", "数据库正在备份，请等待完成后再试！")
+            return
+        self.status_var.set("正在备份数据库...")
+    
+    def _on_backup_done(self, result):
+        success, msg = result
+        self.status_var.set(f"当前用户: {self.calculator.current_user.username} ({self.user_role})")
         if success:
             messagebox.showinfo("成功", msg)
             self.refresh_backup_list()
         else:
             messagebox.showerror("错误", msg)
     
+    def _on_backup_error(self, error):
+        self._on_backup_done((False, f"操作失败：{str(error)}"))
+    
     def restore_from_backup(self):
         # 获取选中的备份
         selected_item = self.backup_tree.selection()
@@ -2278,7 +2713,23 @@ class SalaryCalculatorApp:
         
         # 确认恢复
         if messagebox.askyesno("确认", "确定要恢复选中的备份吗？这将覆盖当前数据库！"):
-            success, msg = self.calculator.restore_database(backup_id)
+            task = self.worker.submit("restore", lambda task: self.calculator.restore_database(backup_id),
+                                      on_success=self._on_restore_done, on_error=self._on_backup_error,
+                                      replace=False)
+            if task is None:
+                messagebox.showinfo("提示", "正在恢复数据库，请等待完成后再试！")
+                return
+            self.status_var.set("正在恢复数据库...")
+    
+    def _on_restore_done(self, result):
+        success, msg = result
+        if success and hasattr(self, 'inventory_manager'):
+            # 补齐旧备份中缺少的进销存表结构
+            self.inventory_manager.init_database()
+        self._on_backup_done(result)
+        if success:
+            # 重新加载当前页面的数据
+            self.on_tab_changed()
     
     def delete_backup(self):
         # 获取选中的备份
@@ -2537,6 +2988,8 @@ class SalaryCalculatorApp:
         # 添加垂直滚动条
         v_scrollbar = ttk.Scrollbar(tree_container, orient="vertical", command=self.employee_tree.yview)
         self.employee_tree.configure(yscroll=v_scrollbar.set)
+        # 分页加载，滚动到底部时取下一页
+        self.employee_model = PagedTreeModel(self.employee_tree, self.calculator.db_manager, scrollbar=v_scrollbar)
         
         # 添加水平滚动条 - 适配手机屏幕：增加水平滚动功能
         h_scrollbar = ttk.Scrollbar(tree_container, orient="horizontal", command=self.employee_tree.xview)
@@ -2554,13 +3007,6 @@ class SalaryCalculatorApp:
         self.refresh_employee_list()
     
     def refresh_employee_list(self):
-        logger.info("======= 开始刷新员工列表 =======")
-        # 清空Treeview
-        logger.info(f"当前Treeview中有 {len(self.employee_tree.get_children())} 条记录，开始清空...")
-        for item in self.employee_tree.get_children():
-            self.employee_tree.delete(item)
-        logger.info("Treeview清空完成")
-        
         # 确保employee_status_var的值是有效的
         valid_statuses = ["在职", "离职", "全部"]
         current_status = self.employee_status_var.get()
@@ -2571,8 +3017,6 @@ class SalaryCalculatorApp:
         else:
             status = current_status
         
-        logger.info(f"刷新员工列表，状态查询: {status}")
-        
         # 中文状态值映射到英文
         status_map = {
             "全部": "all",
@@ -2582,60 +3026,42 @@ class SalaryCalculatorApp:
         
         # 转换为英文状态值
         status = status_map[status]
-        logger.info(f"英文状态值: {status}")
         
-        # 获取员工列表（带状态查询）
-        if status == "all":
-            logger.info("获取所有员工...")
-            employees = self.calculator.get_all_employees()
-            logger.info(f"获取到所有 {len(employees)} 名员工数据")
-        else:
-            logger.info(f"获取状态为 '{status}' 的员工...")
-            employees = self.calculator.get_all_employees(status)
-            logger.info(f"获取到状态为 '{status}' 的 {len(employees)} 名员工数据")
+        query = "SELECT emp_id, name, department, position, base_salary, hire_date, status, leave_date FROM employees"
+        params = ()
+        if status != "all":
+            query += " WHERE status=?"
+            params = (status,)
+        
+        def row_factory(row):
+            emp_id, name, department, position, base_salary, hire_date, emp_status, leave_date = row
+            status_text = "在职" if emp_status == "active" else "离职"
+            return None, (emp_id, name, department, position, base_salary, hire_date, status_text, leave_date or ""), ()
+        
+        # 分页加载员工列表，在职/离职人数由SQL统计
+        total_count, = self.employee_model.load(
+            query, params,
+            key="emp_id",
+            row_factory=row_factory,
+            sort_columns={column: column for column in self.employee_tree["columns"]}
+        )
+        counts = self.calculator.db_manager.execute_query(
+            f"""SELECT SUM(status='active'), SUM(status!='active'),
+                       SUM(status='inactive' AND (leave_date IS NULL OR leave_date=''))
+                FROM ({query})""",
+            params,
+            fetch_one=True
+        ) or (0, 0, 0)
+        active_count, inactive_count, missing_leave_date = [count or 0 for count in counts]
         
-        # 添加到Treeview
-        added_count = 0
-        active_count = 0
-        inactive_count = 0
-        logger.info("开始添加员工到Treeview...")
-        # 强制刷新UI，确保数据正确显示
-        self.employee_tree.update_idletasks()
-        
-        for emp in employees:
-            # 详细记录每个员工的状态信息
-            logger.info(f"处理员工: {emp.emp_id} - {emp.name}, 状态: {emp.status}")
-            status_text = "在职" if emp.status == "active" else "离职"
-            
-            # 统计状态
-            if emp.status == "active":
-                active_count += 1
-            else:
-                inactive_count += 1
-            
-            # 数据校验：如果状态为离职但没有离职日期，记录警告
-            if emp.status == 'inactive' and not emp.leave_date:
-                logger.warning(f"员工 {emp.emp_id} - {emp.name} 状态为离职，但没有离职日期！")
-            
-            # 添加到Treeview
-            self.employee_tree.insert("", tk.END,
-                values=(emp.emp_id, emp.name, emp.department, emp.position, emp.base_salary,
-                        emp.hire_date, status_text, emp.leave_date or ""))
-            added_count += 1
-            # 添加一条记录后就更新UI，确保显示及时更新
-            self.employee_tree.update_idletasks()
-        
-        logger.info(f"Treeview添加完成，共添加 {added_count} 条记录")
-        logger.info(f"其中在职员工: {active_count} 人，离职员工: {inactive_count} 人")
-        # 最后再强制刷新一次UI
-        self.employee_tree.update_idletasks()
-        self.employee_frame.update_idletasks()
-        self.root.update_idletasks()
+        logger.info(f"员工列表刷新完成（{status}），共 {total_count} 名员工，其中在职 {active_count} 人，离职 {inactive_count} 人")
+        # 数据校验：状态为离职但没有离职日期
+        if missing_leave_date:
+            logger.warning(f"有 {missing_leave_date} 名员工状态为离职，但没有离职日期！")
         
-        if not employees:
+        if not total_count:
             logger.warning("没有找到员工数据")
             messagebox.showinfo("提示", "当前没有找到员工数据\n请检查数据库或查询条件")
-        logger.info("======= 员工列表刷新完成 =======")
     
     def add_employee(self):
         logger.info("======= 开始添加员工 =======")
@@ -2777,8 +3203,8 @@ class SalaryCalculatorApp:
                     dialog.destroy()
                     logger.info("开始刷新员工列表...")
                     self.refresh_employee_list()
-                    # 同时刷新考勤列表
-                    if hasattr(self, 'attendance_frame'):
+                    # 同时刷新考勤列表（尚未打开的页面在第一次打开时加载）
+                    if self.tabs.is_built(self.attendance_frame):
                         logger.info("刷新考勤列表...")
                         self.refresh_attendance_list()
                 else:
@@ -2908,12 +3334,12 @@ class SalaryCalculatorApp:
                     messagebox.showinfo("成功", "员工信息更新成功！")
                     dialog.destroy()
                     self.refresh_employee_list()
-                    # 刷新其他相关表格
-                    if hasattr(self, 'attendance_frame'):
+                    # 刷新其他已打开页面的表格
+                    if self.tabs.is_built(self.attendance_frame):
                         self.refresh_attendance_list()
-                    if hasattr(self, 'salary_frame'):
+                    if self.tabs.is_built(self.salary_frame):
                         self.generate_salary_sheet()
-                    if hasattr(self, 'revenue_frame'):
+                    if self.tabs.is_built(self.revenue_frame):
                         self.refresh_revenue_list()
                 else:
                     messagebox.showerror("错误", "员工信息更新失败！")
@@ -3066,6 +3492,7 @@ class SalaryCalculatorApp:
         ttk.Button(btn_frame1, text="批量设置出勤", command=self.batch_set_attendance, width=15).pack(side="left", padx=2)
         ttk.Button(btn_frame1, text="删除考勤记录", command=self.delete_attendance_record, width=15).pack(side="left", padx=2)
         ttk.Button(btn_frame1, text="刷新考勤", command=self.refresh_attendance_list, width=10).pack(side="left", padx=2)
+        ttk.Button(btn_frame1, text="导出月度考勤", command=self.export_attendance, width=12).pack(side="left", padx=2)
         
         # 搜索框
         search_frame = ttk.Frame(control_frame)
@@ -3139,6 +3566,8 @@ class SalaryCalculatorApp:
         # 添加垂直滚动条
         v_scrollbar = ttk.Scrollbar(tree_container, orient="vertical", command=self.attendance_tree.yview)
         self.attendance_tree.configure(yscroll=v_scrollbar.set)
+        # 分页加载，滚动到底部时取下一页
+        self.attendance_model = PagedTreeModel(self.attendance_tree, self.calculator.db_manager, scrollbar=v_scrollbar)
         
         # 添加水平滚动条 - 适配手机屏幕：增加水平滚动功能
         h_scrollbar = ttk.Scrollbar(tree_container, orient="horizontal", command=self.attendance_tree.xview)
@@ -3173,12 +3602,23 @@ class SalaryCalculatorApp:
                                 great_grandchild['values'] = dept_values
                                 break
                 
+    def export_attendance(self):
+        """导出所选日期所在月份的考勤汇总"""
+        date = self.attendance_date_var.get()
+        try:
+            datetime.datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("错误", "日期格式必须是 YYYY-MM-DD！")
+            return
+        
+        month = date[:7]
+        filename = f"{month}考勤表.xlsx"
+        self.run_export("export_attendance", filename,
+                        lambda: [attendance_sheet(self.calculator.db_manager, month)],
+                        f"考勤表已导出至 {filename}！", "导出考勤失败")
+    
     def refresh_attendance_list(self):
         try:
-            # 清空Treeview
-            for item in self.attendance_tree.get_children():
-                self.attendance_tree.delete(item)
-
             # 确保attendance_date_var已初始化
             if not hasattr(self, 'attendance_date_var'):
                 self.attendance_date_var = tk.StringVar(value=get_network_time().date().strftime('%Y-%m-%d'))
@@ -3204,138 +3644,6 @@ class SalaryCalculatorApp:
                 self.attendance_search_var = tk.StringVar()
             search_text = self.attendance_search_var.get().lower().strip()
 
-            # 获取所有在职员工
-            employees = self.calculator.get_all_employees('active')
-            
-            # 确保员工列表中没有重复记录
-            unique_employees = {emp.emp_id: emp for emp in employees}.values()
-            employees = list(unique_employees)
-            
-            # 添加日志记录
-            logger.info(f"获取到 {len(employees)} 名在职员工")
-            
-            # 添加错误处理和日志记录
-            if not employees:
-                messagebox.showinfo("提示", "当前没有在职员工记录。\n请检查数据库中是否存在状态为'active'的员工。")
-                # 初始化统计变量（如果不存在）
-                if not hasattr(self, 'total_count_var'):
-                    self.total_count_var = tk.StringVar()
-                if not hasattr(self, 'present_count_var'):
-                    self.present_count_var = tk.StringVar()
-                if not hasattr(self, 'absent_count_var'):
-                    self.absent_count_var = tk.StringVar()
-                if not hasattr(self, 'leave_count_var'):
-                    self.leave_count_var = tk.StringVar()
-                if not hasattr(self, 'unrecorded_count_var'):
-                    self.unrecorded_count_var = tk.StringVar()
-                # 重置统计信息
-                self.total_count_var.set(f"总人数: 0")
-                self.present_count_var.set(f"出勤: 0")
-                self.absent_count_var.set(f"缺勤: 0")
-                self.leave_count_var.set(f"请假: 0")
-                self.unrecorded_count_var.set(f"未记录: 0")
-                return
-
-            # 查询部门
-            if dept_filter != "all":
-                filtered_employees = [emp for emp in employees if emp.department == dept_filter]
-                if not filtered_employees:
-                    messagebox.showinfo("提示", f"所选部门 '{dept_filter}' 中没有在职员工。")
-                    # 初始化统计变量（如果不存在）
-                    if not hasattr(self, 'total_count_var'):
-                        self.total_count_var = tk.StringVar()
-                    # 重置统计信息
-                    self.total_count_var.set(f"总人数: 0")
-                    return
-                else:
-                    employees = filtered_employees
-
-            # 使用DatabaseManager获取考勤记录
-
-            # 初始化统计计数器
-            total_count = 0
-            present_count = 0
-            absent_count = 0
-            leave_count = 0
-            unrecorded_count = 0
-
-            # 批量获取所有员工的考勤记录以提高性能
-            attendance_records = {}
-            try:
-                if employees:
-                    emp_ids = [emp.emp_id for emp in employees]
-                    placeholders = ', '.join(['?' for _ in emp_ids])
-                    query = f"SELECT emp_id, status, note FROM attendance WHERE emp_id IN ({placeholders}) AND date=?"
-                    params = emp_ids + [date]
-                    logger.info(f"执行考勤查询: {query}")
-                    logger.info(f"查询参数: {params}")
-                    results = self.calculator.db_manager.execute_query(query, params, fetch_all=True)
-                if results:
-                    logger.info(f"获取到 {len(results)} 条考勤记录")
-                    for row in results:
-                        try:
-                            emp_id, status, note = row
-                            attendance_records[emp_id] = (status, note)
-                        except ValueError as ve:
-                            logger.error(f"解析考勤记录失败: {row}, 错误: {str(ve)}")
-            except Exception as e:
-                logger.error(f"批量获取考勤记录失败: {str(e)}")
-                messagebox.showerror("错误", f"获取考勤数据失败: {str(e)}")
-                return
-            
-            # 添加到Treeview
-            for emp in employees:
-                # 获取考勤记录
-                record = attendance_records.get(emp.emp_id)
-
-                total_count += 1
-
-                if record:
-                    try:
-                        status, note = record
-                    except ValueError:
-                        # 如果解包失败，默认值
-                        status = record[0]
-                        note = record[1] if len(record) > 1 else ""
-
-                    # 转换状态为中文
-                    status_text = {
-                        "present": "出勤",
-                        "absent": "缺勤",
-                        "leave": "请假"
-                    }.get(status, "")
-
-                    # 更新统计数据
-                    if status == "present":
-                        present_count += 1
-                    elif status == "absent":
-                        absent_count += 1
-                    elif status == "leave":
-                        leave_count += 1
-                else:
-                    # 如果没有记录，显示未记录
-                    status_text = "未记录"
-                    note = ""
-                    unrecorded_count += 1
-
-                # 状态查询
-                if status_filter != "all" and status_text != status_filter:
-                    continue
-
-                # 搜索查询
-                if search_text and not (
-                    search_text in emp.emp_id.lower() or 
-                    search_text in emp.name.lower() or 
-                    search_text in emp.department.lower() or 
-                    search_text in emp.position.lower() or
-                    search_text in status_text.lower() or
-                    search_text in (note.lower() if note else "")
-                ):
-                    continue
-
-                self.attendance_tree.insert("", "end",
-                    values=(emp.emp_id, emp.name, emp.department, emp.position, status_text, note))
-
             # 初始化统计变量（如果不存在）
             if not hasattr(self, 'total_count_var'):
                 self.total_count_var = tk.StringVar()
@@ -3347,7 +3655,33 @@ class SalaryCalculatorApp:
                 self.leave_count_var = tk.StringVar()
             if not hasattr(self, 'unrecorded_count_var'):
                 self.unrecorded_count_var = tk.StringVar()
-            
+
+            # 在职员工（可按部门查询）及其当天的考勤
+            params = [date]
+            dept_condition = ""
+            if dept_filter != "all":
+                dept_condition = " AND e.department=?"
+                params.append(dept_filter)
+            base_query = f"""SELECT e.emp_id AS emp_id, e.name AS name, e.department AS department, e.position AS position,
+                       CASE WHEN a.id IS NULL THEN '未记录'
+                            WHEN a.status='present' THEN '出勤'
+                            WHEN a.status='absent' THEN '缺勤'
+                            WHEN a.status='leave' THEN '请假'
+                            ELSE '' END AS status,
+                       IFNULL(a.note, '') AS note
+                FROM employees e
+                LEFT JOIN attendance a ON a.emp_id = e.emp_id AND a.date = ?
+                WHERE e.status='active'{dept_condition}"""
+
+            # 统计信息（不受状态和搜索条件影响）
+            stats = self.calculator.db_manager.execute_query(
+                f"""SELECT COUNT(*), SUM(status='出勤'), SUM(status='缺勤'), SUM(status='请假'), SUM(status='未记录')
+                    FROM ({base_query})""",
+                params,
+                fetch_one=True
+            ) or (0, 0, 0, 0, 0)
+            total_count, present_count, absent_count, leave_count, unrecorded_count = [count or 0 for count in stats]
+
             # 更新统计信息显示
             self.total_count_var.set(f"总人数: {total_count}")
             self.present_count_var.set(f"出勤: {present_count}")
@@ -3355,6 +3689,36 @@ class SalaryCalculatorApp:
             self.leave_count_var.set(f"请假: {leave_count}")
             self.unrecorded_count_var.set(f"未记录: {unrecorded_count}")
 
+            if not total_count:
+                children = self.attendance_tree.get_children()
+                if children:
+                    self.attendance_tree.delete(*children)
+                if dept_filter != "all":
+                    messagebox.showinfo("提示", f"所选部门 '{dept_filter}' 中没有在职员工。")
+                else:
+                    messagebox.showinfo("提示", "当前没有在职员工记录。\n请检查数据库中是否存在状态为'active'的员工。")
+                return
+
+            # 状态和搜索条件
+            conditions = []
+            if status_filter != "all":
+                conditions.append("status=?")
+                params.append(status_filter)
+            if search_text:
+                columns = ("emp_id", "name", "department", "position", "status", "note")
+                conditions.append("(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ")")
+                params.extend([like_pattern(search_text)] * len(columns))
+            query = f"SELECT * FROM ({base_query})"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+
+            # 分页加载考勤列表
+            self.attendance_model.load(
+                query, params,
+                key="emp_id",
+                sort_columns={column: column for column in self.attendance_tree["columns"]}
+            )
+
         except Exception as e:
             messagebox.showerror("错误", f"刷新考勤列表失败：{str(e)}")
     
@@ -3527,16 +3891,18 @@ class SalaryCalculatorApp:
                 employees = self.calculator.get_all_employees('active')
                 
                 # 批量设置考勤
-                for emp in employees:
-                    attendance = Attendance(
-                        emp_id=emp.emp_id,
-                        date=date,
-                        status=status,
-                        note=f"批量设置 [操作人: {current_username}]"
-                    )
-                    self.calculator.add_attendance(attendance)
+                results = self.calculator.bulk_set_attendance(
+                    date,
+                    status,
+                    [emp.emp_id for emp in employees],
+                    note=f"批量设置 [操作人: {current_username}]"
+                )
+                success_count = sum(1 for ok in results.values() if ok)
                 
-                messagebox.showinfo("成功", f"已为{len(employees)}名员工批量设置考勤！")
+                if employees and success_count == 0:
+                    messagebox.showerror("错误", "批量设置失败，请检查日期和考勤状态！")
+                    return
+                messagebox.showinfo("成功", f"已为{success_count}名员工批量设置考勤！")
                 dialog.destroy()
                 self.refresh_attendance_list()
             except Exception as e:
@@ -3589,6 +3955,7 @@ class SalaryCalculatorApp:
         
         ttk.Button(btn_frame3, text="导出Excel", command=self.export_to_excel, width=12).pack(side="left", padx=2)
         ttk.Button(btn_frame3, text="打印个人工资表", command=self.print_individual_salary_sheet, width=12).pack(side="left", padx=2)
+        ttk.Button(btn_frame3, text="批量生成工资条", command=self.batch_generate_payslips, width=12).pack(side="left", padx=2)
         
         # 管理员可见的删除按钮
         if self.user_role == 'admin':
@@ -3734,51 +4101,7 @@ class SalaryCalculatorApp:
     
     def update_employee_deduction(self, emp_id, month, new_deduction):
         """更新员工的扣款金额并重新计算最终工资"""
-        try:
-            conn = sqlite3.connect(self.calculator.db_path)
-            cursor = conn.cursor()
-            
-            # 获取当前工资记录
-            cursor.execute(
-                "SELECT base_salary, bonus FROM salaries WHERE emp_id=? AND month=?",
-                (emp_id, month)
-            )
-            salary_data = cursor.fetchone()
-            
-            if not salary_data:
-                conn.close()
-                logger.warning(f"未找到员工 {emp_id} 在 {month} 月份的工资记录")
-                return False
-            
-            base_salary, bonus = salary_data
-            
-            # 重新计算个人所得税（基于新的应纳税所得额）
-            taxable_income = base_salary + bonus - new_deduction
-            tax = self.calculator.calculate_tax(taxable_income)
-            
-            # 重新计算最终工资
-            final_salary = base_salary + bonus - new_deduction - tax
-            final_salary = round(final_salary, 2)
-            
-            # 更新数据库
-            cursor.execute(
-                """UPDATE salaries 
-                SET deduction=?, final_salary=? 
-                WHERE emp_id=? AND month=?""",
-                (new_deduction, final_salary, emp_id, month)
-            )
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"已更新员工 {emp_id} 在 {month} 月份的扣款为: {new_deduction}")
-            return True
-        except Exception as e:
-            logger.error(f"更新扣款失败: {str(e)}")
-            if 'conn' in locals():
-                conn.rollback()
-                conn.close()
-            return False
+        return self.calculator.update_employee_deduction(emp_id, month, new_deduction)
     
     def delete_employee_id(self):
         """删除选中的员工ID（仅管理员有权限）"""
@@ -3845,15 +4168,9 @@ class SalaryCalculatorApp:
             total_bonus = 0
             total_deduction = 0
             for salary in salary_sheet:
-                # 获取发放状态
-                result = self.calculator.db_manager.execute_query(
-                    "SELECT status, payment_date FROM salaries WHERE emp_id=? AND month=?",
-                    (salary['emp_id'], month),
-                    fetch_one=True
-                )
-                
-                status = result[0] if result else "unpaid"
-                payment_date = result[1] if result and result[1] else ""
+                # 发放状态随工资表一起返回
+                status = salary.get('status', 'unpaid')
+                payment_date = salary.get('payment_date') or ""
                 
                 # 转换状态为中文
                 status_text = "已发放" if status == "paid" else "未发放"
@@ -4172,24 +4489,36 @@ class SalaryCalculatorApp:
         # 确认批量标记发放
         if messagebox.askyesno("确认", f"确定要批量标记{month}月份所有员工的工资为已发放吗？"):
             try:
-                # 获取工资表中的员工ID
-                emp_ids = []
+                # 工资表中显示的员工ID与对应行
+                rows_by_emp = {}
                 for item in self.salary_tree.get_children():
                     emp_id = self.salary_tree.item(item)["values"][0]
                     if emp_id:  # 跳过总计行
-                        emp_ids.append(emp_id)
+                        rows_by_emp[str(emp_id)] = item
                 
-                # 批量标记发放
-                success_count = 0
-                for emp_id in emp_ids:
-                    if self.calculator.mark_salary_paid(emp_id, month):
-                        success_count += 1
+                # 一次性更新所有员工的发放状态
+                changed = self.calculator.set_payment_status(month, list(rows_by_emp), status='paid')
+                if changed is None:
+                    messagebox.showerror("错误", "批量标记发放失败，请重试！")
+                    return
                 
-                messagebox.showinfo("成功", f"已成功标记{success_count}名员工的工资为已发放！")
-                self.generate_salary_sheet()
+                # 只更新发生变化的行
+                self.patch_salary_rows(rows_by_emp, changed)
+                messagebox.showinfo("成功", f"已成功标记{len(changed)}名员工的工资为已发放！")
             except Exception as e:
                 messagebox.showerror("错误", f"批量标记发放失败：{str(e)}")
     
+    def patch_salary_rows(self, rows_by_emp, changed):
+        """按set_payment_status返回的变化记录就地更新工资表中的状态和发放日期"""
+        for emp_id, status, payment_date in changed:
+            item = rows_by_emp.get(emp_id)
+            if not item:
+                continue
+            values = list(self.salary_tree.item(item)["values"])
+            values[7] = "已发放" if status == "paid" else "未发放"
+            values[8] = payment_date or ""
+            self.salary_tree.item(item, values=values)
+    
     def mark_unpaid(self):
         # 获取选中的工资记录
         selected_item = self.salary_tree.selection()
@@ -4237,21 +4566,22 @@ class SalaryCalculatorApp:
         # 确认批量取消标记发放
         if messagebox.askyesno("确认", f"确定要批量取消标记{month}月份所有员工的工资发放状态吗？"):
             try:
-                # 获取工资表中的员工ID
-                emp_ids = []
+                # 工资表中显示的员工ID与对应行
+                rows_by_emp = {}
                 for item in self.salary_tree.get_children():
                     emp_id = self.salary_tree.item(item)["values"][0]
                     if emp_id:  # 跳过总计行
-                        emp_ids.append(emp_id)
+                        rows_by_emp[str(emp_id)] = item
                 
-                # 批量取消标记发放
-                success_count = 0
-                for emp_id in emp_ids:
-                    if self.calculator.mark_salary_unpaid(emp_id, month):
-                        success_count += 1
+                # 一次性更新所有员工的发放状态
+                changed = self.calculator.set_payment_status(month, list(rows_by_emp), status='unpaid')
+                if changed is None:
+                    messagebox.showerror("错误", "批量取消标记发放失败，请重试！")
+                    return
                 
-                messagebox.showinfo("成功", f"已成功取消标记{success_count}名员工的工资发放状态！")
-                self.generate_salary_sheet()
+                # 只更新发生变化的行
+                self.patch_salary_rows(rows_by_emp, changed)
+                messagebox.showinfo("成功", f"已成功取消标记{len(changed)}名员工的工资发放状态！")
             except Exception as e:
                 messagebox.showerror("错误", f"批量取消标记发放失败：{str(e)}")
     
@@ -4268,36 +4598,75 @@ class SalaryCalculatorApp:
             messagebox.showerror("错误", "月份格式必须是 YYYY-MM！")
             return
         
+        # 直接从数据库读取当月工资记录流式写入，不依赖列表中已显示的内容
+        filename = f"{month}工资表.xlsx"
+        self.run_export("export_salary", filename,
+                        lambda: [payroll_sheet(self.calculator, month)],
+                        f"工资表已导出至 {filename}！", "导出Excel失败")
+    
+    def run_export(self, key, filename, build_sheets, success_msg, error_prefix):
+        """在后台线程生成工作表并写入Excel，状态栏显示已写入的行数
+
+        build_sheets() 在后台线程调用，返回Sheet列表
+        """
+        def work(task, progress):
+            return export_workbook(filename, build_sheets(), task=task, progress=progress)
+        
+        self.run_with_progress(key, f"正在导出 {filename}", "行", work, success_msg, error_prefix)
+    
+    def run_with_progress(self, key, label, unit, work, success_msg, error_prefix):
+        """在后台线程执行work(task, progress)，状态栏显示进度，完成后提示结果
+
+        progress(已完成数, 总数) 由后台线程调用，总数未知时为None
+        """
+        state = {'done': 0, 'total': None}
+        
+        def on_success(result):
+            self.status_var.set(f"当前用户: {self.calculator.current_user.username} ({self.user_role})")
+            messagebox.showinfo("成功", success_msg)
+        
+        def on_error(error):
+            self.status_var.set(f"当前用户: {self.calculator.current_user.username} ({self.user_role})")
+            messagebox.showerror("错误", f"{error_prefix}：{str(error)}")
+        
+        task = self.worker.submit(key, work, lambda done, total: state.update(done=done, total=total),
+                                  on_success=on_success, on_error=on_error)
+        if task is None:
+            return
+        
+        def show_progress():
+            # 进度由后台线程写入，这里在主线程定时读取显示
+            if not self.worker.is_pending(task):
+                return
+            done, total = state['done'], state['total']
+            if total:
+                self.status_var.set(f"{label}：{min(done, total)}/{total} {unit}")
+            else:
+                self.status_var.set(f"{label}：已完成 {done} {unit}")
+            self.root.after(200, show_progress)
+        
+        show_progress()
+    
+    def batch_generate_payslips(self):
+        """生成当前月份全部在职员工的工资条PDF"""
+        month = self.salary_month_var.get()
         try:
-            # 创建Excel工作簿
-            wb = Workbook()
-            ws = wb.active
-            ws.title = f"{month}工资表"
-            
-            # 添加表头
-            headers = ["员工ID", "姓名", "基本工资", "奖金", "扣款", "个人所得税", "实发工资", "状态", "发放日期"]
-            ws.append(headers)
-            
-            # 添加数据
-            total_salary = 0
-            total_tax = 0
-            for item in self.salary_tree.get_children():
-                values = self.salary_tree.item(item)["values"]
-                ws.append(values)
-                if values[0]:  # 不是总计行
-                    total_salary += values[6] if isinstance(values[6], (int, float)) else 0
-                    total_tax += values[5] if isinstance(values[5], (int, float)) else 0
-            
-            # 添加总计
-            ws.append(["", "总计", "", "", "", total_tax, total_salary, "", ""])
-            
-            # 保存文件
-            filename = f"{month}工资表.xlsx"
-            wb.save(filename)
-            
-            messagebox.showinfo("成功", f"工资表已导出至 {filename}！")
-        except Exception as e:
-            messagebox.showerror("错误", f"导出Excel失败：{str(e)}")
+            year, month_num = map(int, month.split('-'))
+            if month_num < 1 or month_num > 12:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "月份格式必须是 YYYY-MM！")
+            return
+        
+        merge = messagebox.askyesnocancel("批量生成工资条", f"是否把{month}全部员工的工资条合并为一个PDF文件？\n选择“否”为每名员工单独生成一个文件。")
+        if merge is None:
+            return
+        
+        out_dir = os.path.join(PAYSLIP_DIR, month)
+        self.run_with_progress(
+            "payslips", f"正在生成{month}工资条", "人",
+            lambda task, progress: generate_payslips(self.calculator, month, merge=merge, progress=progress, task=task),
+            f"{month}工资条已生成，保存在 {out_dir}", "生成工资条失败")
     
     def init_report_frame(self):
         # 创建主框架
@@ -4327,6 +4696,8 @@ class SalaryCalculatorApp:
                                        values=["salary", "revenue", "profit", "attendance"], 
                                        state="readonly", width=10)
         report_type_combo.pack(side=LEFT, padx=5)
+        # 切换报表类型时直接刷新图表，未完成的旧图表任务会被取消
+        report_type_combo.bind("<<ComboboxSelected>>", lambda event: self.update_charts())
         
         # 导出按钮
         ttk.Button(control_frame, text="导出报表", command=self.export_report).pack(side=LEFT, padx=5)
@@ -4342,10 +4713,18 @@ class SalaryCalculatorApp:
         top_frame = ttk.LabelFrame(charts_frame, text="趋势图")
         top_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
         
+        # 后台线程渲染时使用的中文字体等设置
+        load_pyplot()
+        
+        # 趋势图、分布图、对比图三个画布，显示后台线程渲染好的图片
+        self.report_canvases = []
+        # 最近一次显示的图片（Tk图片需要保留引用）和渲染时的画布大小
+        self._chart_images = []
+        self._chart_sizes = None
+        self._chart_resize_job = None
+        
         # 创建趋势图
-        self.fig1, self.ax1 = plt.subplots(figsize=(10, 4), dpi=100)
-        self.canvas1 = FigureCanvasTkAgg(self.fig1, master=top_frame)
-        self.canvas1.get_tk_widget().pack(fill=BOTH, expand=True)
+        self._add_report_canvas(top_frame, 1000, 400)
         
         # 下方图表
         bottom_frame = ttk.Frame(charts_frame)
@@ -4356,18 +4735,42 @@ class SalaryCalculatorApp:
         left_bottom_frame.pack(side=LEFT, fill=BOTH, expand=True, padx=5, pady=5)
         
         # 创建分布图
-        self.fig2, self.ax2 = plt.subplots(figsize=(6, 4), dpi=100)
-        self.canvas2 = FigureCanvasTkAgg(self.fig2, master=left_bottom_frame)
-        self.canvas2.get_tk_widget().pack(fill=BOTH, expand=True)
+        self._add_report_canvas(left_bottom_frame, 600, 400)
         
         # 右侧图表
         right_bottom_frame = ttk.LabelFrame(bottom_frame, text="对比图表")
         right_bottom_frame.pack(side=RIGHT, fill=BOTH, expand=True, padx=5, pady=5)
         
         # 创建对比图
-        self.fig3, self.ax3 = plt.subplots(figsize=(6, 4), dpi=100)
-        self.canvas3 = FigureCanvasTkAgg(self.fig3, master=right_bottom_frame)
-        self.canvas3.get_tk_widget().pack(fill=BOTH, expand=True)
+        self._add_report_canvas(right_bottom_frame, 600, 400)
+    
+    def _add_report_canvas(self, master, width, height):
+        """添加一个显示报表图片的画布，大小改变后重新渲染图表"""
+        canvas = tk.Canvas(master, width=width, height=height, highlightthickness=0, background="white")
+        canvas.pack(fill=BOTH, expand=True)
+        canvas.bind("<Configure>", self._on_report_canvas_resize)
+        self.report_canvases.append(canvas)
+    
+    def _report_canvas_sizes(self):
+        """各画布当前的像素大小，尚未显示时取创建时设置的大小"""
+        sizes = []
+        for canvas in self.report_canvases:
+            width, height = canvas.winfo_width(), canvas.winfo_height()
+            if width <= 1 or height <= 1:
+                width, height = int(canvas.cget("width")), int(canvas.cget("height"))
+            sizes.append((width, height))
+        return sizes
+    
+    def _on_report_canvas_resize(self, event=None):
+        """画布大小改变时，停顿一段时间后按新大小重新渲染已显示的图表"""
+        if self._chart_resize_job is not None:
+            self.root.after_cancel(self._chart_resize_job)
+        self._chart_resize_job = self.root.after(CHART_RESIZE_DELAY, self._rerender_resized_charts)
+    
+    def _rerender_resized_charts(self):
+        self._chart_resize_job = None
+        if self._chart_sizes is not None and self._chart_sizes != self._report_canvas_sizes():
+            self.update_charts()
     
     def update_charts(self):
         # 获取年份和报表类型
@@ -4380,145 +4783,123 @@ class SalaryCalculatorApp:
             messagebox.showerror("错误", "请输入有效的年份！")
             return
         
-        try:
-            # 连接数据库
-            conn = sqlite3.connect(self.calculator.db_path)
-            
-            # 清空所有图表
-            self.ax1.clear()
-            self.ax2.clear()
-            self.ax3.clear()
-            
-            if report_type == "salary":
-                # 工资报表
-                # 更新月度工资总额趋势图
-                self.update_salary_trend_chart(conn, year)
-                # 更新部门工资分布图表
-                self.update_department_salary_chart(conn, year)
-                # 更新员工工资对比图表
-                self.update_employee_salary_comparison_chart(conn, year)
-            elif report_type == "revenue":
-                # 收入报表
-                # 更新月度收入趋势图
-                self.update_revenue_trend_chart(conn, year)
-                # 更新部门收入分布图表
-                self.update_department_revenue_chart(conn, year)
-                # 更新收入来源对比图表
-                self.update_revenue_source_chart(conn, year)
-            elif report_type == "profit":
-                # 利润报表
-                # 更新月度利润趋势图
-                self.update_profit_trend_chart(conn, year)
-                # 更新利润构成图表
-                self.update_profit_composition_chart(conn, year)
-                # 更新同比环比分析图表
-                self.update_profit_analysis_chart(conn, year)
-            elif report_type == "attendance":
-                # 考勤报表
-                # 更新月度出勤率趋势图
-                self.update_attendance_trend_chart(conn, year)
-                # 更新部门出勤分布图表
-                self.update_department_attendance_chart(conn, year)
-                # 更新员工出勤对比图表
-                self.update_employee_attendance_chart(conn, year)
-            
-            # 绘制所有图表
-            self.fig1.tight_layout()
-            self.canvas1.draw()
-            self.fig2.tight_layout()
-            self.canvas2.draw()
-            self.fig3.tight_layout()
-            self.canvas3.draw()
-            
-            conn.close()
-        except Exception as e:
-            messagebox.showerror("错误", f"更新图表失败：{str(e)}")
+        # 查询和渲染在后台线程执行，界面线程只负责把渲染好的图片显示到画布上
+        # 年份或报表类型改变后再次刷新时，尚未完成的旧任务会被取消
+        # 图形按画布当前的大小渲染，画布大小只能在界面线程读取
+        sizes = self._report_canvas_sizes()
+        self.worker.submit(
+            "charts", self._render_charts, report_type, year, sizes,
+            on_success=self._blit_charts,
+            on_error=lambda e: messagebox.showerror("错误", f"更新图表失败：{str(e)}")
+        )
     
-    def update_salary_trend_chart(self, conn, year):
-        # 获取月度工资数据
-        months = []
-        totals = []
-        
-        for month in range(1, 13):
-            month_str = f"{year}-{month:02d}"
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT SUM(final_salary) FROM salaries 
-                WHERE month=? AND status='paid'""",
-                (month_str,)
-            )
-            total = cursor.fetchone()[0] or 0
-            months.append(f"{month}月")
-            totals.append(total)
+    def _render_charts(self, task, report_type, year, sizes):
+        """后台线程：取出全年报表数据，画到新建的图形上并渲染为PNG图片
+        
+        sizes为各画布的像素大小 [(宽, 高), ...]；这里不接触Tk控件
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        
+        # 一次性取出全年报表数据
+        report = ReportEngine(self.calculator.db_manager).yearly_report(report_type, year)
+        task.check_cancelled()
+        
+        figures = [Figure(figsize=(width / CHART_DPI, height / CHART_DPI), dpi=CHART_DPI) for width, height in sizes]
+        ax1, ax2, ax3 = [fig.add_subplot(111) for fig in figures]
+        
+        if report_type == "salary":
+            # 工资报表
+            # 更新月度工资总额趋势图
+            self.update_salary_trend_chart(ax1, report, year)
+            # 更新部门工资分布图表
+            self.update_department_salary_chart(ax2, report, year)
+            # 更新员工工资对比图表
+            self.update_employee_salary_comparison_chart(ax3, report, year)
+        elif report_type == "revenue":
+            # 收入报表
+            # 更新月度收入趋势图
+            self.update_revenue_trend_chart(ax1, report, year)
+            # 更新部门收入分布图表
+            self.update_department_revenue_chart(ax2, report, year)
+            # 更新收入来源对比图表
+            self.update_revenue_source_chart(ax3, report, year)
+        elif report_type == "profit":
+            # 利润报表
+            # 更新月度利润趋势图
+            self.update_profit_trend_chart(ax1, report, year)
+            # 更新利润构成图表
+            self.update_profit_composition_chart(ax2, report, year)
+            # 更新同比环比分析图表
+            self.update_profit_analysis_chart(ax3, report, year)
+        elif report_type == "attendance":
+            # 考勤报表
+            # 更新月度出勤率趋势图
+            self.update_attendance_trend_chart(ax1, report, year)
+            # 更新部门出勤分布图表
+            self.update_department_attendance_chart(ax2, report, year)
+            # 更新员工出勤对比图表
+            self.update_employee_attendance_chart(ax3, report, year)
+        
+        # 用各自的Agg画布渲染为PNG，界面线程只需解码显示
+        images = []
+        for fig in figures:
+            task.check_cancelled()
+            fig.tight_layout()
+            # 明确使用Agg画布，不依赖matplotlib当前的后端
+            FigureCanvasAgg(fig)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png")
+            images.append(buffer.getvalue())
+        return images, sizes
+    
+    def _blit_charts(self, result):
+        """主线程：显示后台渲染好的图片"""
+        images, sizes = result
+        self._chart_images = []
+        for canvas, png in zip(self.report_canvases, images):
+            image = tk.PhotoImage(master=canvas, data=base64.b64encode(png).decode("ascii"))
+            canvas.delete("all")
+            canvas.create_image(0, 0, anchor="nw", image=image)
+            self._chart_images.append(image)
+        self._chart_sizes = sizes
+        # 渲染期间画布大小改变时，按新大小再渲染一次
+        if sizes != self._report_canvas_sizes():
+            self._on_report_canvas_resize()
+    
+    def update_salary_trend_chart(self, ax, report, year):
+        # 月度工资数据
+        months = [f"{month}月" for month in range(1, 13)]
+        totals = report['months']
         
         # 绘制柱状图
-        self.ax1.bar(months, totals)
-        self.ax1.set_title(f"{year}年月度工资总额趋势")
-        self.ax1.set_xlabel("月份")
-        self.ax1.set_ylabel("工资总额 (元)")
-        self.ax1.tick_params(axis='x', rotation=45)
+        ax.bar(months, totals)
+        ax.set_title(f"{year}年月度工资总额趋势")
+        ax.set_xlabel("月份")
+        ax.set_ylabel("工资总额 (元)")
+        ax.tick_params(axis='x', rotation=45)
         
         # 添加数据标签
         for i, v in enumerate(totals):
             if v > 0:
-                self.ax1.text(i, v, f"{v:.0f}", ha='center', va='bottom')
+                ax.text(i, v, f"{v:.0f}", ha='center', va='bottom')
     
-    def update_department_salary_chart(self, conn, year):
-        # 获取部门工资数据
-        departments = {}
-        
-        # 获取所有部门
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT department FROM employees")
-        dept_rows = cursor.fetchall()
-        
-        for dept_row in dept_rows:
-            dept = dept_row[0]
-            departments[dept] = 0
-        
-        # 计算各部门工资总额
-        for month in range(1, 13):
-            month_str = f"{year}-{month:02d}"
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT e.department, SUM(s.final_salary) 
-                FROM salaries s 
-                JOIN employees e ON s.emp_id = e.emp_id 
-                WHERE s.month=? AND s.status='paid' 
-                GROUP BY e.department""",
-                (month_str,)
-            )
-            dept_salary_rows = cursor.fetchall()
-            
-            for dept, salary in dept_salary_rows:
-                departments[dept] += salary or 0
-        
+    def update_department_salary_chart(self, ax, report, year):
         # 提取部门和对应的工资总额
-        dept_list = list(departments.keys())
-        salary_list = list(departments.values())
+        dept_list = list(report['departments'].keys())
+        salary_list = list(report['departments'].values())
         
         # 绘制饼图
-        self.ax2.pie(salary_list, labels=dept_list, autopct='%1.1f%%', startangle=90)
-        self.ax2.set_title(f"{year}年各部门工资分布")
-        self.ax2.axis('equal')  # 使饼图为正圆形
+        ax.pie(salary_list, labels=dept_list, autopct='%1.1f%%', startangle=90)
+        ax.set_title(f"{year}年各部门工资分布")
+        ax.axis('equal')  # 使饼图为正圆形
     
-    def update_employee_salary_comparison_chart(self, conn, year):
-        # 获取Top 10员工工资数据
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT e.name, SUM(s.final_salary) as total_salary 
-            FROM salaries s 
-            JOIN employees e ON s.emp_id = e.emp_id 
-            WHERE s.month LIKE ? AND s.status='paid' 
-            GROUP BY e.emp_id 
-            ORDER BY total_salary DESC 
-            LIMIT 10""",
-            (f"{year}%",)
-        )
-        employee_salary_rows = cursor.fetchall()
+    def update_employee_salary_comparison_chart(self, ax, report, year):
+        # Top 10员工工资数据
+        employee_salary_rows = report['top_employees']
         
         if not employee_salary_rows:
-            self.ax3.text(0.5, 0.5, "无数据", ha='center', va='center')
+            ax.text(0.5, 0.5, "无数据", ha='center', va='center')
             return
         
         # 提取员工姓名和工资
@@ -4526,96 +4907,39 @@ class SalaryCalculatorApp:
         salaries = [row[1] for row in employee_salary_rows]
         
         # 绘制条形图
-        self.ax3.barh(names, salaries)
-        self.ax3.set_title(f"{year}年工资Top 10员工")
-        self.ax3.set_xlabel("工资总额 (元)")
-        self.ax3.set_ylabel("员工姓名")
+        ax.barh(names, salaries)
+        ax.set_title(f"{year}年工资Top 10员工")
+        ax.set_xlabel("工资总额 (元)")
+        ax.set_ylabel("员工姓名")
     
-    def update_revenue_trend_chart(self, conn, year):
-        # 获取月度收入数据
-        months = []
-        totals = []
-        
-        for month in range(1, 13):
-            month_str = f"{year}-{month:02d}-01"
-            next_month = month + 1
-            next_year = year
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            next_month_str = f"{next_year}-{next_month:02d}-01"
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT SUM(amount) FROM revenue 
-                WHERE date >= ? AND date < ?""",
-                (month_str, next_month_str)
-            )
-            total = cursor.fetchone()[0] or 0
-            months.append(f"{month}月")
-            totals.append(total)
+    def update_revenue_trend_chart(self, ax, report, year):
+        # 月度收入数据
+        months = [f"{month}月" for month in range(1, 13)]
+        totals = report['months']
         
         # 绘制折线图
-        self.ax1.plot(months, totals, marker='o')
-        self.ax1.set_title(f"{year}年月度收入趋势")
-        self.ax1.set_xlabel("月份")
-        self.ax1.set_ylabel("收入总额 (元)")
-        self.ax1.tick_params(axis='x', rotation=45)
-        self.ax1.grid(True)
+        ax.plot(months, totals, marker='o')
+        ax.set_title(f"{year}年月度收入趋势")
+        ax.set_xlabel("月份")
+        ax.set_ylabel("收入总额 (元)")
+        ax.tick_params(axis='x', rotation=45)
+        ax.grid(True)
     
-    def update_department_revenue_chart(self, conn, year):
-        # 获取部门收入数据
-        departments = {}
-        
-        # 获取所有部门
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT department FROM employees")
-        dept_rows = cursor.fetchall()
-        
-        for dept_row in dept_rows:
-            dept = dept_row[0]
-            departments[dept] = 0
-        
-        # 计算各部门收入总额
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT e.department, SUM(r.amount) 
-            FROM revenue r 
-            JOIN employees e ON r.emp_id = e.emp_id 
-            WHERE r.date LIKE ? 
-            GROUP BY e.department""",
-            (f"{year}%",)
-        )
-        dept_revenue_rows = cursor.fetchall()
-        
-        for dept, revenue in dept_revenue_rows:
-            if dept in departments:
-                departments[dept] += revenue or 0
-        
+    def update_department_revenue_chart(self, ax, report, year):
         # 提取部门和对应的收入总额
-        dept_list = list(departments.keys())
-        revenue_list = list(departments.values())
+        dept_list = list(report['departments'].keys())
+        revenue_list = list(report['departments'].values())
         
         # 绘制饼图
-        self.ax2.pie(revenue_list, labels=dept_list, autopct='%1.1f%%', startangle=90)
-        self.ax2.set_title(f"{year}年各部门收入分布")
-        self.ax2.axis('equal')  # 使饼图为正圆形
+        ax.pie(revenue_list, labels=dept_list, autopct='%1.1f%%', startangle=90)
+        ax.set_title(f"{year}年各部门收入分布")
+        ax.axis('equal')  # 使饼图为正圆形
     
-    def update_revenue_source_chart(self, conn, year):
-        # 获取收入来源数据（按描述分类）
+    def update_revenue_source_chart(self, ax, report, year):
+        # 收入来源数据（按描述分类）
         sources = {}
-        
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT description, SUM(amount) 
-            FROM revenue 
-            WHERE date LIKE ? 
-            GROUP BY description""",
-            (f"{year}%",)
-        )
-        source_rows = cursor.fetchall()
-        
-        for desc, amount in source_rows:
+        for desc, amount in report['sources']:
+            desc = desc or ""
             source = desc[:10] + '...' if len(desc) > 10 else desc
             sources[source] = amount or 0
         
@@ -4624,73 +4948,30 @@ class SalaryCalculatorApp:
         amount_list = list(sources.values())
         
         # 绘制条形图
-        self.ax3.bar(source_list, amount_list)
-        self.ax3.set_title(f"{year}年收入来源分布")
-        self.ax3.set_xlabel("收入来源")
-        self.ax3.set_ylabel("收入金额 (元)")
-        self.ax3.tick_params(axis='x', rotation=45)
+        ax.bar(source_list, amount_list)
+        ax.set_title(f"{year}年收入来源分布")
+        ax.set_xlabel("收入来源")
+        ax.set_ylabel("收入金额 (元)")
+        ax.tick_params(axis='x', rotation=45)
     
-    def update_profit_trend_chart(self, conn, year):
-        # 获取月度利润数据
-        months = []
-        profits = []
-        
-        for month in range(1, 13):
-            month_str = f"{year}-{month:02d}-01"
-            next_month = month + 1
-            next_year = year
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            next_month_str = f"{next_year}-{next_month:02d}-01"
-            
-            # 计算收入
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT SUM(amount) FROM revenue 
-                WHERE date >= ? AND date < ?""",
-                (month_str, next_month_str)
-            )
-            revenue = cursor.fetchone()[0] or 0
-            
-            # 计算工资支出
-            cursor.execute(
-                """SELECT SUM(final_salary) FROM salaries 
-                WHERE payment_date >= ? AND payment_date < ?""",
-                (month_str, next_month_str)
-            )
-            salary = cursor.fetchone()[0] or 0
-            
-            # 利润 = 收入 - 工资支出
-            profit = revenue - salary
-            months.append(f"{month}月")
-            profits.append(profit)
+    def update_profit_trend_chart(self, ax, report, year):
+        # 月度利润数据：利润 = 收入 - 工资支出
+        months = [f"{month}月" for month in range(1, 13)]
+        profits = report['profit']
         
         # 绘制折线图
-        self.ax1.plot(months, profits, marker='o')
-        self.ax1.axhline(y=0, color='r', linestyle='-')
-        self.ax1.set_title(f"{year}年月度利润趋势")
-        self.ax1.set_xlabel("月份")
-        self.ax1.set_ylabel("利润 (元)")
-        self.ax1.tick_params(axis='x', rotation=45)
-        self.ax1.grid(True)
+        ax.plot(months, profits, marker='o')
+        ax.axhline(y=0, color='r', linestyle='-')
+        ax.set_title(f"{year}年月度利润趋势")
+        ax.set_xlabel("月份")
+        ax.set_ylabel("利润 (元)")
+        ax.tick_params(axis='x', rotation=45)
+        ax.grid(True)
     
-    def update_profit_composition_chart(self, conn, year):
-        # 获取年度总收入和总支出
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT SUM(amount) FROM revenue 
-            WHERE date LIKE ?""",
-            (f"{year}%",)
-        )
-        total_revenue = cursor.fetchone()[0] or 0
-        
-        cursor.execute(
-            """SELECT SUM(final_salary) FROM salaries 
-            WHERE payment_date LIKE ?""",
-            (f"{year}%",)
-        )
-        total_salary = cursor.fetchone()[0] or 0
+    def update_profit_composition_chart(self, ax, report, year):
+        # 年度总收入和总支出
+        total_revenue = report['revenue_total']
+        total_salary = report['salary_total']
         
         # 其他支出（假设为总收入的10%用于演示）
         other_expenses = total_revenue * 0.1
@@ -4704,67 +4985,32 @@ class SalaryCalculatorApp:
         colors = ['green', 'red', 'orange', 'blue']
         
         # 绘制堆叠柱状图
-        self.ax2.bar(labels, values, color=colors)
-        self.ax2.axhline(y=0, color='black', linestyle='-')
-        self.ax2.set_title(f"{year}年利润构成")
-        self.ax2.set_ylabel("金额 (元)")
+        ax.bar(labels, values, color=colors)
+        ax.axhline(y=0, color='black', linestyle='-')
+        ax.set_title(f"{year}年利润构成")
+        ax.set_ylabel("金额 (元)")
     
-    def update_profit_analysis_chart(self, conn, year):
+    def update_profit_analysis_chart(self, ax, report, year):
         # 同比分析（与去年对比）
         last_year = year - 1
         
-        # 获取今年收入
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT SUM(amount) FROM revenue 
-            WHERE date LIKE ?""",
-            (f"{year}%",)
-        )
-        this_year_revenue = cursor.fetchone()[0] or 0
-        
-        # 获取去年收入
-        cursor.execute(
-            """SELECT SUM(amount) FROM revenue 
-            WHERE date LIKE ?""",
-            (f"{last_year}%",)
-        )
-        last_year_revenue = cursor.fetchone()[0] or 0
-        
-        # 获取今年利润
-        cursor.execute(
-            """SELECT SUM(amount) - (SELECT SUM(final_salary) FROM salaries WHERE payment_date LIKE ?) 
-            FROM revenue 
-            WHERE date LIKE ?""",
-            (f"{year}%", f"{year}%",)
-        )
-        this_year_profit = cursor.fetchone()[0] or 0
-        
-        # 获取去年利润
-        cursor.execute(
-            """SELECT SUM(amount) - (SELECT SUM(final_salary) FROM salaries WHERE payment_date LIKE ?) 
-            FROM revenue 
-            WHERE date LIKE ?""",
-            (f"{last_year}%", f"{last_year}%",)
-        )
-        last_year_profit = cursor.fetchone()[0] or 0
-        
         # 数据准备
         labels = ['收入', '利润']
-        this_year_values = [this_year_revenue, this_year_profit]
-        last_year_values = [last_year_revenue, last_year_profit]
+        this_year_values = [report['revenue_total'], report['revenue_total'] - report['salary_total']]
+        last_year_values = [report['last_revenue_total'], report['last_revenue_total'] - report['last_salary_total']]
         
         # 绘制对比条形图
         x = range(len(labels))
         width = 0.35
         
-        self.ax3.bar([i - width/2 for i in x], last_year_values, width, label=f'{last_year}年')
-        self.ax3.bar([i + width/2 for i in x], this_year_values, width, label=f'{year}年')
+        ax.bar([i - width/2 for i in x], last_year_values, width, label=f'{last_year}年')
+        ax.bar([i + width/2 for i in x], this_year_values, width, label=f'{year}年')
         
-        self.ax3.set_title(f"{year}年与{last_year}年对比分析")
-        self.ax3.set_ylabel("金额 (元)")
-        self.ax3.set_xticks(x)
-        self.ax3.set_xticklabels(labels)
-        self.ax3.legend()
+        ax.set_title(f"{year}年与{last_year}年对比分析")
+        ax.set_ylabel("金额 (元)")
+        ax.set_xticks(x)
+        ax.set_xticklabels(labels)
+        ax.legend()
     
     def export_report(self):
         # 获取年份和报表类型
@@ -4777,166 +5023,12 @@ class SalaryCalculatorApp:
             messagebox.showerror("错误", "请输入有效的年份！")
             return
         
-        try:
-            # 创建Excel工作簿
-            wb = Workbook()
-            ws = wb.active
-            
-            # 连接数据库
-            conn = sqlite3.connect(self.calculator.db_path)
-            cursor = conn.cursor()
-            
-            if report_type == "salary":
-                # 工资报表
-                ws.title = f"{year}年工资报表"
-                
-                # 添加表头
-                ws.append(["月份", "工资总额", "部门分布", "备注"])
-                
-                # 添加月度工资数据
-                for month in range(1, 13):
-                    month_str = f"{year}-{month:02d}"
-                    cursor.execute(
-                        """SELECT SUM(final_salary) FROM salaries 
-                        WHERE month=? AND status='paid'""",
-                        (month_str,)
-                    )
-                    total = cursor.fetchone()[0] or 0
-                    
-                    # 获取部门分布
-                    cursor.execute(
-                        """SELECT e.department, SUM(s.final_salary) 
-                        FROM salaries s 
-                        JOIN employees e ON s.emp_id = e.emp_id 
-                        WHERE s.month=? AND s.status='paid' 
-                        GROUP BY e.department""",
-                        (month_str,)
-                    )
-                    dept_dist = cursor.fetchall()
-                    dept_str = ", ".join([f"{dept}: {salary:.2f}" for dept, salary in dept_dist])
-                    
-                    ws.append([f"{month}月", total, dept_str, ""])
-            elif report_type == "revenue":
-                # 收入报表
-                ws.title = f"{year}年收入报表"
-                
-                # 添加表头
-                ws.append(["月份", "收入总额", "部门分布", "备注"])
-                
-                # 添加月度收入数据
-                for month in range(1, 13):
-                    month_str = f"{year}-{month:02d}-01"
-                    next_month = month + 1
-                    next_year = year
-                    if next_month > 12:
-                        next_month = 1
-                        next_year += 1
-                    next_month_str = f"{next_year}-{next_month:02d}-01"
-                    
-                    cursor.execute(
-                        """SELECT SUM(amount) FROM revenue 
-                        WHERE date >= ? AND date < ?""",
-                        (month_str, next_month_str)
-                    )
-                    total = cursor.fetchone()[0] or 0
-                    
-                    # 获取部门分布
-                    cursor.execute(
-                        """SELECT e.department, SUM(r.amount) 
-                        FROM revenue r 
-                        JOIN employees e ON r.emp_id = e.emp_id 
-                        WHERE r.date >= ? AND r.date < ? 
-                        GROUP BY e.department""",
-                        (month_str, next_month_str)
-                    )
-                    dept_dist = cursor.fetchall()
-                    dept_str = ", ".join([f"{dept}: {amount:.2f}" for dept, amount in dept_dist])
-                    
-                    ws.append([f"{month}月", total, dept_str, ""])
-            elif report_type == "profit":
-                # 利润报表
-                ws.title = f"{year}年利润报表"
-                
-                # 添加表头
-                ws.append(["月份", "收入", "工资支出", "其他支出", "利润", "备注"])
-                
-                # 添加月度利润数据
-                for month in range(1, 13):
-                    month_str = f"{year}-{month:02d}-01"
-                    next_month = month + 1
-                    next_year = year
-                    if next_month > 12:
-                        next_month = 1
-                        next_year += 1
-                    next_month_str = f"{next_year}-{next_month:02d}-01"
-                    
-                    # 计算收入
-                    cursor.execute(
-                        """SELECT SUM(amount) FROM revenue 
-                        WHERE date >= ? AND date < ?""",
-                        (month_str, next_month_str)
-                    )
-                    revenue = cursor.fetchone()[0] or 0
-                    
-                    # 计算工资支出
-                    cursor.execute(
-                        """SELECT SUM(final_salary) FROM salaries 
-                        WHERE payment_date >= ? AND payment_date < ?""",
-                        (month_str, next_month_str)
-                    )
-                    salary = cursor.fetchone()[0] or 0
-                    
-                    # 其他支出（假设为收入的10%）
-                    other_expenses = revenue * 0.1
-                    
-                    # 计算利润
-                    profit = revenue - salary - other_expenses
-                    
-                    ws.append([f"{month}月", revenue, salary, other_expenses, profit, ""])
-            elif report_type == "attendance":
-                # 考勤报表
-                ws.title = f"{year}年考勤报表"
-                
-                # 添加表头
-                ws.append(["月份", "工作日总数", "员工总数", "出勤总天数", "出勤率", "备注"])
-                
-                # 添加月度考勤数据
-                for month in range(1, 13):
-                    month_str = f"{year}-{month:02d}"
-                    # 计算工作日总数
-                    _, days_in_month = calendar.monthrange(year, month)
-                    weekdays = 0
-                    for day in range(1, days_in_month + 1):
-                        date = datetime.date(year, month, day)
-                        if date.weekday() < 5:  # 0-4表示周一到周五
-                            weekdays += 1
-                    
-                    # 计算员工总数
-                    cursor.execute("SELECT COUNT(*) FROM employees WHERE status='active'")
-                    total_employees = cursor.fetchone()[0] or 0
-                    
-                    # 计算出勤总天数
-                    cursor.execute(
-                        """SELECT COUNT(*) FROM attendance 
-                        WHERE date LIKE ? AND status='present'""",
-                        (f"{month_str}%",)
-                    )
-                    present_days = cursor.fetchone()[0] or 0
-                    
-                    # 计算出勤率
-                    attendance_rate = (present_days / (total_employees * weekdays)) * 100 if (total_employees * weekdays) > 0 else 0
-                    
-                    ws.append([f"{month}月", weekdays, total_employees, present_days, f"{attendance_rate:.2f}%", ""])
-            
-            # 保存文件
-            filename = f"{year}_{report_type}_report.xlsx"
-            wb.save(filename)
-            
-            conn.close()
-            
-            messagebox.showinfo("成功", f"报表已导出至 {filename}！")
-        except Exception as e:
-            messagebox.showerror("错误", f"导出报表失败：{str(e)}")
+        # 与图表页共用同一份全年报表数据，查询和写入都在后台线程中进行
+        filename = f"{year}_{report_type}_report.xlsx"
+        self.run_export("export_report", filename,
+                        lambda: [yearly_report_sheet(
+                            ReportEngine(self.calculator.db_manager).yearly_report(report_type, year), report_type, year)],
+                        f"报表已导出至 {filename}！", "导出报表失败")
 
     def init_revenue_frame(self):
         # 创建主框架
@@ -4960,6 +5052,7 @@ class SalaryCalculatorApp:
         ttk.Button(btn_frame1, text="删除收入", command=self.delete_revenue_record, width=10).pack(side=LEFT, padx=2)
         ttk.Button(btn_frame1, text="打印发票", command=self.print_invoice, width=10).pack(side=LEFT, padx=2)
         ttk.Button(btn_frame1, text="刷新列表", command=self.refresh_revenue_list, width=10).pack(side=LEFT, padx=2)
+        ttk.Button(btn_frame1, text="导出Excel", command=self.export_revenue, width=10).pack(side=LEFT, padx=2)
         
         # 日期范围选择 - 适配手机屏幕：调整日期选择布局
         date_frame = ttk.Frame(control_frame)
@@ -5023,6 +5116,8 @@ class SalaryCalculatorApp:
         # 添加垂直滚动条
         v_scrollbar = ttk.Scrollbar(tree_container, orient="vertical", command=self.revenue_tree.yview)
         self.revenue_tree.configure(yscroll=v_scrollbar.set)
+        # 分页加载，滚动到底部时取下一页
+        self.revenue_model = PagedTreeModel(self.revenue_tree, self.calculator.db_manager, scrollbar=v_scrollbar)
         
         # 添加水平滚动条 - 适配手机屏幕：增加水平滚动功能
         h_scrollbar = ttk.Scrollbar(tree_container, orient="horizontal", command=self.revenue_tree.xview)
@@ -5037,10 +5132,6 @@ class SalaryCalculatorApp:
         self.revenue_tree.bind("<Double-1>", lambda event: self.edit_revenue())
     
     def refresh_revenue_list(self):
-        # 清空Treeview
-        for item in self.revenue_tree.get_children():
-            self.revenue_tree.delete(item)
-
         # 获取日期范围
         start_date = self.start_date_var.get()
         end_date = self.end_date_var.get()
@@ -5067,64 +5158,43 @@ class SalaryCalculatorApp:
             return
 
         if statistics_type == 'by_employee':
-            # 按员工ID统计总收入和记录数
+            # 重新设置列标题以适应员工统计模式
+            # 隐藏不需要的列，设置需要的列宽度，优化记录数列的显示
+            self.revenue_tree.heading("id", text="员工ID")
+            self.revenue_tree.column("id", width=80)
+            self.revenue_tree.heading("date", text="员工姓名")
+            self.revenue_tree.column("date", width=150)
+            self.revenue_tree.heading("emp_id", text="总收入")
+            self.revenue_tree.column("emp_id", width=100, anchor=E)
+            self.revenue_tree.heading("emp_name", text="记录数")
+            self.revenue_tree.column("emp_name", width=100, anchor=E)  # 增加列宽并右对齐
+            # 隐藏其他列
+            for col in ["amount", "description", "added_by"]:
+                self.revenue_tree.heading(col, text="")
+                self.revenue_tree.column(col, width=0)
+            
+            # 按员工ID统计总收入和记录数，总计行包括总金额和总记录数
             try:
-                # 确保记录数统计准确，使用COUNT(*)来计算
-                employee_revenue = self.calculator.db_manager.execute_query(
-                    """SELECT r.emp_id, e.name, SUM(r.amount) as total_amount, COUNT(*) as record_count 
+                totals = self.revenue_model.load(
+                    """SELECT r.emp_id AS emp_id, e.name AS name, SUM(r.amount) AS total_amount, COUNT(*) AS record_count 
                        FROM revenue r 
                        LEFT JOIN employees e ON r.emp_id = e.emp_id 
                        WHERE r.date BETWEEN ? AND ? 
-                       GROUP BY r.emp_id, e.name 
-                       ORDER BY total_amount DESC""",
+                       GROUP BY r.emp_id, e.name""",
                     (start_date, end_date),
-                    fetch_all=True
+                    order_by="total_amount DESC",
+                    key="emp_id",
+                    row_factory=lambda row: (None, (row[0] or "", row[1] or "", row[2], row[3], "", "", ""), ()),
+                    totals=(["SUM(total_amount)", "SUM(record_count)"],
+                            lambda t: ("总计", "", t[0] or 0, t[1] or 0, "", "", "")),
+                    sort_columns={"id": "emp_id", "date": "name", "emp_id": "total_amount", "emp_name": "record_count"}
                 )
             except Exception as e:
                 logger.error(f"按员工统计收入失败: {str(e)}")
                 messagebox.showerror("错误", f"获取收入数据失败: {str(e)}")
                 return
-
-            # 添加调试信息验证记录数
-            logger.info(f"按员工统计结果: {employee_revenue}")
-
-            # 添加到Treeview
-            total_amount = 0
-            total_records = 0  # 累计总记录数
-            if employee_revenue:
-                # 清空现有Treeview中的所有内容
-                for item in self.revenue_tree.get_children():
-                    self.revenue_tree.delete(item)
-                
-                # 重新设置列标题以适应员工统计模式
-                # 隐藏不需要的列，设置需要的列宽度，优化记录数列的显示
-                self.revenue_tree.heading("id", text="员工ID")
-                self.revenue_tree.column("id", width=80)
-                self.revenue_tree.heading("date", text="员工姓名")
-                self.revenue_tree.column("date", width=150)
-                self.revenue_tree.heading("emp_id", text="总收入")
-                self.revenue_tree.column("emp_id", width=100, anchor=E)
-                self.revenue_tree.heading("emp_name", text="记录数")
-                self.revenue_tree.column("emp_name", width=100, anchor=E)  # 增加列宽并右对齐
-                # 隐藏其他列
-                for col in ["amount", "description", "added_by"]:
-                    self.revenue_tree.heading(col, text="")
-                    self.revenue_tree.column(col, width=0)
-                
-                # 直接添加数据，不添加表头行
-                for record in employee_revenue:
-                    emp_id, emp_name, amount, record_count = record
-                    # 确保数据正确映射到调整后的列
-                    self.revenue_tree.insert("", tk.END,
-                        values=(emp_id or "", emp_name or "", amount, record_count, "", "", ""))
-                    total_amount += amount or 0
-                    total_records += record_count or 0  # 累加所有员工的记录数
-                
-                # 显示总计，包括总金额和总记录数
-                self.revenue_tree.insert("", tk.END,
-                    values=("总计", "", total_amount, total_records, "", "", ""))
-            else:
-                messagebox.showinfo("提示", f"在 {start_date} 至 {end_date} 期间没有找到收入记录。\n请检查日期范围或添加新的收入记录。")
+            
+            logger.info(f"按员工统计结果: {totals[-1]} 名员工，总收入 {totals[0] or 0}，记录数 {totals[1] or 0}")
         else:
             # 明细显示模式，但隐藏ID列
             # 设置列标题和宽度，隐藏ID列
@@ -5143,45 +5213,48 @@ class SalaryCalculatorApp:
             self.revenue_tree.heading("added_by", text="添加人")
             self.revenue_tree.column("added_by", width=100)
             
-            # 显示明细，包含ID字段用于删除和编辑操作
+            # 显示明细，包含ID字段用于删除和编辑操作（第一个值为ID，对应隐藏的ID列）
             try:
-                revenue_records = self.calculator.db_manager.execute_query(
-                    """SELECT r.id, r.date, r.emp_id, e.name, r.amount, r.description, r.added_by 
+                totals = self.revenue_model.load(
+                    """SELECT r.id AS id, r.date AS date, r.emp_id AS emp_id, e.name AS emp_name,
+                              r.amount AS amount, r.description AS description, r.added_by AS added_by 
                        FROM revenue r 
                        LEFT JOIN employees e ON r.emp_id = e.emp_id 
-                       WHERE r.date BETWEEN ? AND ? 
-                       ORDER BY r.date DESC""",
+                       WHERE r.date BETWEEN ? AND ?""",
                     (start_date, end_date),
-                    fetch_all=True
+                    order_by="date DESC",
+                    key="id",
+                    row_factory=lambda row: (None, (row[0], row[1], row[2] or "", row[3] or "", row[4], row[5], row[6]), ()),
+                    totals=(["SUM(amount)"], lambda t: ("", "总计", "", "", t[0] or 0, "", "")),
+                    sort_columns={column: column for column in self.revenue_tree["columns"]}
                 )
             except Exception as e:
                 logger.error(f"查询收入记录失败: {str(e)}")
                 messagebox.showerror("错误", f"获取收入数据失败: {str(e)}")
                 return
 
-            # 添加调试信息
-            logger.info(f"查询结果: {revenue_records}")
+            logger.info(f"查询到 {totals[-1]} 条收入记录")
 
-            # 添加调试信息
-            logger.info(f"查询到 {len(revenue_records)} 条收入记录")
-
-            # 添加到Treeview，包含ID但不显示
-            total_amount = 0
-            for record in revenue_records:
-                revenue_id, date, emp_id, emp_name, amount, description, added_by = record
-                # 第一个值为ID，对应隐藏的ID列
-                self.revenue_tree.insert("", tk.END,
-                    values=(revenue_id, date, emp_id or "", emp_name or "", amount, description, added_by))
-                total_amount += amount
-            
-            # 如果没有记录，显示提示信息
-            if not revenue_records:
-                messagebox.showinfo("提示", f"在 {start_date} 至 {end_date} 期间没有找到收入记录。\n请检查日期范围或添加新的收入记录。")
-
-            # 显示总计
-            self.revenue_tree.insert("", tk.END,
-                values=("", "总计", "", "", total_amount, "", ""))
+        # 如果没有记录，显示提示信息
+        if not totals[-1]:
+            messagebox.showinfo("提示", f"在 {start_date} 至 {end_date} 期间没有找到收入记录。\n请检查日期范围或添加新的收入记录。")
 
+    def export_revenue(self):
+        """导出日期范围内的收入明细和按员工统计"""
+        start_date = self.start_date_var.get()
+        end_date = self.end_date_var.get()
+        try:
+            datetime.datetime.strptime(start_date, '%Y-%m-%d')
+            datetime.datetime.strptime(end_date, '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("错误", "日期格式必须是 YYYY-MM-DD！")
+            return
+        
+        filename = f"{start_date}至{end_date}收入.xlsx"
+        self.run_export("export_revenue", filename,
+                        lambda: revenue_sheets(self.calculator.db_manager, start_date, end_date),
+                        f"收入记录已导出至 {filename}！", "导出收入记录失败")
+    
     def edit_revenue(self):
         # 获取选中的收入记录
         selected_item = self.revenue_tree.selection()
@@ -5645,6 +5718,9 @@ class SalaryCalculatorApp:
         chart_frame = ttk.LabelFrame(main_frame, text="收支图表")
         chart_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
         
+        plt = load_pyplot()
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
         # 适配手机屏幕：调整图表尺寸以适应小屏幕
         self.fig3, self.ax3 = plt.subplots(figsize=(5, 3), dpi=100)
         self.canvas3 = FigureCanvasTkAgg(self.fig3, master=chart_frame)
@@ -5878,6 +5954,8 @@ class SalaryCalculatorApp:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.attendance_tree.yview)
         self.attendance_tree.configure(yscroll=scrollbar.set)
+        # 分页加载，滚动到底部时取下一页
+        self.attendance_model = PagedTreeModel(self.attendance_tree, self.calculator.db_manager, scrollbar=scrollbar)
         
         # 布局Treeview和滚动条
         self.attendance_tree.pack(side=LEFT, fill=BOTH, expand=True)
@@ -0,0 +1,120 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 与程序运行时一致：项目根目录、src、utils 都可以直接导入
+for path in (ROOT, os.path.join(ROOT, 'src'), os.path.join(ROOT, 'utils')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from utils import common_utils  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def network_time(monkeypatch):
+    """测试中视为已同步网络时间，允许写数据库；数据库错误不弹出对话框"""
+    monkeypatch.setattr(common_utils, 'is_using_local_time', lambda: False)
+    for name in ('showerror', 'showwarning', 'showinfo'):
+        monkeypatch.setattr(common_utils.messagebox, name, lambda *args, **kwargs: None)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """临时数据库文件，工作目录切换到临时目录（备份、导出文件写在这里）"""
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'test.db')
+    yield path
+    common_utils.close_all_pools()
+
+
+@pytest.fixture
+def db_manager(db_path):
+    return common_utils.DatabaseManager(db_path)
+
+
+@pytest.fixture
+def calculator(db_path):
+    from salary_calculator import SalaryCalculator
+    return SalaryCalculator(db_path)
+
+
+# 启用结构迁移之前的进销存表（InventoryManager.init_database 创建的原始结构）
+LEGACY_INVENTORY_SCHEMA = """
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_code TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT,
+    unit TEXT,
+    purchase_price REAL,
+    selling_price REAL,
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE inventory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER,
+    quantity INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE purchases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER,
+    quantity INTEGER,
+    unit_price REAL,
+    total_amount REAL,
+    purchase_date TIMESTAMP,
+    supplier TEXT,
+    created_by TEXT
+);
+CREATE TABLE sales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER,
+    quantity INTEGER,
+    unit_price REAL,
+    total_amount REAL,
+    sale_date TIMESTAMP,
+    customer TEXT,
+    created_by TEXT
+);
+CREATE TABLE customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_code TEXT UNIQUE NOT NULL,
+    contact_person TEXT,
+    phone TEXT,
+    email TEXT,
+    address TEXT,
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+@pytest.fixture
+def legacy_inventory(db_path, db_manager):
+    """旧版本的进销存数据库，尚未执行迁移"""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_INVENTORY_SCHEMA)
+    conn.close()
+    return db_manager
+
+
+@pytest.fixture
+def migrate_inventory(legacy_inventory):
+    """执行进销存迁移，返回数据库管理器"""
+    from utils.db_migrations import run_migrations, INVENTORY_MIGRATIONS
+
+    def migrate():
+        success, message = run_migrations(legacy_inventory, 'inventory', INVENTORY_MIGRATIONS)
+        assert success, message
+        return legacy_inventory
+    return migrate
+
+
+@pytest.fixture
+def inventory_db(migrate_inventory):
+    """已迁移到最新结构的空进销存数据库"""
+    return migrate_inventory()
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from utils.background_worker import BackgroundWorker
+
+
+class FakeRoot:
+    """代替Tk根窗口，轮询由测试调用poll()执行"""
+    def __init__(self):
+        self.pending = []
+
+    def after(self, delay, func):
+        self.pending.append(func)
+
+
+@pytest.fixture
+def worker():
+    worker = BackgroundWorker(FakeRoot())
+    yield worker
+    worker.shutdown()
+
+
+def blocked_task(release, value):
+    def work(task):
+        release.wait(5)
+        return value
+    return work
+
+
+def finish(worker, *tasks):
+    """等待任务在线程池中完成，并在“主线程”处理回调"""
+    deadline = time.monotonic() + 5
+    while any(worker.is_pending(task) for task in tasks) and time.monotonic() < deadline:
+        time.sleep(0.01)
+        poll(worker)
+
+
+def poll(worker):
+    jobs, worker.root.pending = worker.root.pending, []
+    for job in jobs:
+        job()
+
+
+def test_task_without_replace_is_not_dropped(worker):
+    release = threading.Event()
+    results = []
+    first = worker.submit("backup", blocked_task(release, "first"), on_success=results.append, replace=False)
+
+    assert worker.submit("backup", blocked_task(release, "second"), on_success=results.append,
+                         replace=False) is None
+    release.set()
+    finish(worker, first)
+    assert results == ["first"]
+
+    second = worker.submit("backup", blocked_task(release, "second"), on_success=results.append, replace=False)
+    assert second is not None
+    finish(worker, second)
+    assert results == ["first", "second"]
+
+
+def test_replaced_task_result_is_dropped_and_logged(worker, caplog):
+    release = threading.Event()
+    results = []
+    first = worker.submit("charts", blocked_task(release, "first"), on_success=results.append)
+    with caplog.at_level(logging.INFO):
+        second = worker.submit("charts", blocked_task(release, "second"), on_success=results.append)
+    assert first.cancelled
+    assert "被新任务取代" in caplog.text
+
+    release.set()
+    finish(worker, second)
+    assert results == ["second"]
@@ -0,0 +1,167 @@
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+import salary_calculator
+from salary_calculator import Employee
+from utils.db_backup import load_manifest, RetentionPolicy
+
+EMP_ID = 'EMP20250101000001'
+
+
+@pytest.fixture
+def admin(calculator):
+    ok, message = calculator.add_employee(
+        Employee(EMP_ID, '张三', '技术部', '工程师', 4500, '2025-01-01', contact='13800138000'))
+    assert ok, message
+    calculator.login('admin', 'admin123')
+    return calculator
+
+
+def base_salary(calculator):
+    return calculator.db_manager.execute_query(
+        "SELECT base_salary FROM employees WHERE emp_id = ?", (EMP_ID,), fetch_one=True)[0]
+
+
+def set_base_salary(calculator, value):
+    calculator.db_manager.execute_query("UPDATE employees SET base_salary = ? WHERE emp_id = ?", (value, EMP_ID))
+
+
+def backup(calculator):
+    ok, message = calculator.backup_database()
+    assert ok, message
+    return calculator.db_manager.execute_query("SELECT MAX(id) FROM backups", fetch_one=True)[0]
+
+
+def manifest_chunks(calculator, backup_id):
+    manifest = calculator.db_manager.execute_query(
+        "SELECT manifest FROM backups WHERE id = ?", (backup_id,), fetch_one=True)[0]
+    return set(load_manifest(manifest)['chunks'])
+
+
+def backup_ids(calculator):
+    return [row[0] for row in calculator.db_manager.execute_query(
+        "SELECT id FROM backups ORDER BY id", fetch_all=True)]
+
+
+def test_restore_returns_to_snapshot_and_keeps_backup_list(admin):
+    first = backup(admin)
+    set_base_salary(admin, 9000)
+    second = backup(admin)
+    set_base_salary(admin, 12000)
+
+    ok, message = admin.restore_database(first)
+    assert ok, message
+    assert base_salary(admin) == 4500
+    # 恢复后仍能看到恢复点之后的备份，并能再恢复到那里
+    assert backup_ids(admin) == [first, second]
+    ok, message = admin.restore_database(second)
+    assert ok, message
+    assert base_salary(admin) == 9000
+
+
+def test_restore_invalidates_tax_cache(admin):
+    assert admin.calculate_tax(10000) == 0
+    first = backup(admin)
+    admin.db_manager.execute_query("UPDATE tax_rates SET deduction = 0")
+    admin.invalidate_tax_brackets()
+    assert admin.calculate_tax(10000) == 200
+
+    assert admin.restore_database(first)[0]
+    assert admin.calculate_tax(10000) == 0
+
+
+def test_unchanged_chunks_are_not_written_again(admin):
+    first = backup(admin)
+    set_base_salary(admin, 9000)
+    second = backup(admin)
+
+    # 只有修改过的页面所在的块是新写入的
+    added = manifest_chunks(admin, second) - manifest_chunks(admin, first)
+    assert 0 < len(added) < len(manifest_chunks(admin, second))
+    assert admin.backup_store.digests() == manifest_chunks(admin, first) | manifest_chunks(admin, second)
+
+
+def test_corrupt_chunk_leaves_database_unchanged(admin):
+    first = backup(admin)
+    set_base_salary(admin, 9000)
+    store = admin.backup_store
+    digest = sorted(store.digests())[0]
+    with open(store._path(digest), 'wb') as f:
+        f.write(b'broken')
+
+    ok, message = admin.restore_database(first)
+    assert not ok and "恢复失败" in message
+    assert base_salary(admin) == 9000
+    assert backup_ids(admin) == [first]
+
+
+def test_expired_backups_release_unshared_chunks(admin):
+    retention = admin.backup_retention
+    retention.keep_last, retention.keep_daily, retention.keep_weekly, retention.keep_monthly = 1, 0, 0, 0
+    backup(admin)
+    set_base_salary(admin, 9000)
+    latest = backup(admin)
+
+    # 过期备份独有的块被删除，与最新备份共用的块保留
+    assert backup_ids(admin) == [latest]
+    assert admin.backup_store.digests() == manifest_chunks(admin, latest)
+    set_base_salary(admin, 12000)
+    assert admin.restore_database(latest)[0]
+    assert base_salary(admin) == 9000
+
+
+def test_retention_keeps_newest_backup_within_same_second():
+    policy = RetentionPolicy(keep_last=1, keep_daily=1, keep_weekly=0, keep_monthly=0)
+    backups = [(1, '2025-01-01 08:00:00'), (2, '2025-01-01 08:00:00'), (3, '2024-12-31 08:00:00')]
+    assert policy.expired(backups) == [1, 3]
+
+
+def legacy_backup(calculator, path):
+    """旧版本的单文件压缩备份：表结构停留在工资迁移 v2"""
+    copy = path + '.tmp'
+    source = sqlite3.connect(calculator.db_path)
+    target = sqlite3.connect(copy)
+    source.backup(target)
+    source.close()
+    target.execute("DROP TABLE salary_dirty")
+    target.execute("DELETE FROM schema_version WHERE component = 'salary' AND version >= 3")
+    target.commit()
+    target.close()
+    with open(copy, 'rb') as src, gzip.open(path, 'wb') as dst:
+        dst.write(src.read())
+    os.remove(copy)
+    calculator.db_manager.execute_query(
+        "INSERT INTO backups (backup_time, file_path, size, created_by) VALUES ('2024-01-01 00:00:00', ?, 0, 'admin')",
+        (path,))
+    return calculator.db_manager.execute_query("SELECT MAX(id) FROM backups", fetch_one=True)[0]
+
+
+def test_legacy_backup_is_migrated_after_restore(admin, tmp_path):
+    backup_id = legacy_backup(admin, str(tmp_path / 'old.db.gz'))
+    set_base_salary(admin, 9000)
+
+    ok, message = admin.restore_database(backup_id)
+    assert ok, message
+    assert base_salary(admin) == 4500
+    assert admin.db_manager.execute_query(
+        "SELECT MAX(version) FROM schema_version WHERE component = 'salary'", fetch_one=True)[0] == 4
+    assert admin.db_manager.execute_query("SELECT COUNT(*) FROM salary_dirty", fetch_one=True) == (0,)
+
+
+def test_failed_migration_after_restore_is_reported(admin, monkeypatch):
+    first = backup(admin)
+    monkeypatch.setattr(salary_calculator, 'run_migrations', lambda *args: (False, "数据库升级失败"))
+
+    ok, message = admin.restore_database(first)
+    assert not ok
+    assert "已恢复到" in message and "数据库升级失败" in message
+
+
+def test_only_admin_can_back_up_and_restore(admin):
+    first = backup(admin)
+    admin.logout()
+    assert admin.backup_database() == (False, "只有管理员才能执行备份操作")
+    assert admin.restore_database(first) == (False, "只有管理员才能执行恢复操作")
@@ -0,0 +1,107 @@
+import gc
+import queue
+import sqlite3
+import threading
+
+import pytest
+
+from utils.common_utils import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2)
+    yield pool
+    pool.close_all()
+
+
+class Borrower:
+    """在单独线程中借出连接，按指令归还"""
+    def __init__(self, pool):
+        self.pool = pool
+        self.borrowed = queue.Queue()
+        self.release = threading.Event()
+        self.still_held = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.start()
+
+    def _run(self):
+        conn = self.pool.acquire()
+        self.borrowed.put(conn)
+        del conn
+        self.release.wait(5)
+        # 其他线程丢弃代理对象后，本线程仍然持有该连接，可以继续使用并正常归还
+        held = self.pool._local.conn
+        self.still_held = held is not None and held.execute("SELECT 1").fetchone() == (1,)
+        self.pool.release(held)
+
+    def finish(self):
+        self.release.set()
+        self.thread.join()
+
+
+def test_nested_acquire_reuses_connection(pool):
+    outer = pool.acquire()
+    inner = pool.acquire()
+    assert inner._conn is outer._conn
+    inner.close()
+    assert pool._idle.qsize() == 0
+    outer.close()
+    assert pool._idle.qsize() == 1
+
+
+def test_unclosed_connection_returned_when_collected_in_owner_thread(pool):
+    conn = pool.acquire()
+    del conn
+    gc.collect()
+    assert pool._idle.qsize() == 1
+    assert pool._local.conn is None
+
+
+def test_collected_in_other_thread_not_requeued(pool):
+    borrower = Borrower(pool)
+    conn = borrower.borrowed.get(timeout=5)
+    # 代理对象在本线程中被回收（如生成器被垃圾回收），不能把原线程正在使用的连接放回空闲队列
+    del conn
+    gc.collect()
+    assert pool._idle.qsize() == 0
+
+    borrower.finish()
+    assert borrower.still_held
+    assert pool._idle.qsize() == 1
+
+
+def test_close_in_other_thread_ignored(pool):
+    borrower = Borrower(pool)
+    conn = borrower.borrowed.get(timeout=5)
+    conn.close()
+    assert pool._idle.qsize() == 0
+
+    borrower.finish()
+    assert borrower.still_held
+    assert pool._idle.qsize() == 1
+
+
+@pytest.fixture
+def unreachable_db(tmp_path):
+    from utils.common_utils import DatabaseManager
+    manager = DatabaseManager(str(tmp_path / 'missing' / 'test.db'))
+    yield manager
+    manager.close()
+
+
+def test_connection_failure_raises_database_error(unreachable_db):
+    with pytest.raises(sqlite3.OperationalError):
+        unreachable_db.get_connection()
+    # 不抛出异常的接口仍然返回None
+    assert unreachable_db.execute_query("SELECT 1", fetch_one=True) is None
+    assert unreachable_db.execute_many("SELECT ?", [(1,)]) is None
+
+
+def test_pooled_callers_see_database_error(unreachable_db):
+    from utils.inventory_manager import InventoryManager
+    manager = InventoryManager.__new__(InventoryManager)
+    manager.db_manager = unreachable_db
+    # 原来get_connection返回None，调用方在None上取cursor()时抛出AttributeError
+    with pytest.raises(sqlite3.OperationalError):
+        manager.init_database()
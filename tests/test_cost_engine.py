@@ -0,0 +1,188 @@
+import sqlite3
+
+import pytest
+
+from utils import cost_engine
+from utils.stock_ledger import record_movement, PURCHASE, SALE, ADJUSTMENT, REVERSAL
+
+
+def add_product(db_manager, purchase_price, code='P001'):
+    with db_manager.transaction() as conn:
+        return conn.execute(
+            "INSERT INTO products (product_code, name, purchase_price, selling_price) VALUES (?, ?, ?, ?)",
+            (code, code, purchase_price, purchase_price * 2)
+        ).lastrowid
+
+
+# 与进销存界面中记录进货、销售、删除记录的步骤相同
+
+def purchase(db_manager, product_id, quantity, unit_price, date):
+    with db_manager.transaction() as conn:
+        purchase_id = conn.execute(
+            "INSERT INTO purchases (product_id, quantity, unit_price, total_amount, purchase_date) VALUES (?, ?, ?, ?, ?)",
+            (product_id, quantity, unit_price, quantity * unit_price, date)
+        ).lastrowid
+        record_movement(conn, product_id, quantity, PURCHASE, 'purchases', purchase_id)
+        cost_engine.update_costs(conn, [product_id])
+    return purchase_id
+
+
+def sale(db_manager, product_id, quantity, date):
+    with db_manager.transaction() as conn:
+        sale_id = conn.execute(
+            "INSERT INTO sales (product_id, quantity, unit_price, total_amount, sale_date) VALUES (?, ?, ?, ?, ?)",
+            (product_id, quantity, 100, quantity * 100, date)
+        ).lastrowid
+        record_movement(conn, product_id, -quantity, SALE, 'sales', sale_id)
+        cost_engine.update_costs(conn, [product_id])
+    return sale_id
+
+
+def delete_purchase(db_manager, purchase_id):
+    with db_manager.transaction() as conn:
+        product_id, quantity = conn.execute(
+            "SELECT product_id, quantity FROM purchases WHERE id = ?", (purchase_id,)).fetchone()
+        conn.execute("DELETE FROM purchases WHERE id = ?", (purchase_id,))
+        record_movement(conn, product_id, -quantity, REVERSAL, 'purchases', purchase_id)
+        cost_engine.update_costs(conn, [product_id])
+
+
+def sale_cost(db_manager, sale_id):
+    return db_manager.execute_query("SELECT cost FROM sales WHERE id = ?", (sale_id,), fetch_one=True)[0]
+
+
+@pytest.fixture(params=[cost_engine.FIFO, cost_engine.MOVING_AVERAGE])
+def method(request):
+    return request.param
+
+
+def opening_stock(migrate_inventory, db_path, quantity, purchase_price):
+    """旧版本中没有进货记录的库存，迁移后成为期初库存"""
+    conn = sqlite3.connect(db_path)
+    product_id = conn.execute(
+        "INSERT INTO products (product_code, name, purchase_price) VALUES ('P001', 'P001', ?)",
+        (purchase_price,)
+    ).lastrowid
+    conn.execute("INSERT INTO inventory (product_id, quantity) VALUES (?, ?)", (product_id, quantity))
+    conn.commit()
+    conn.close()
+    return migrate_inventory(), product_id
+
+
+@pytest.mark.parametrize("method, expected", [(cost_engine.FIFO, 50), (cost_engine.MOVING_AVERAGE, 75)])
+def test_opening_stock_is_the_first_lot(migrate_inventory, db_path, method, expected):
+    db_manager, product_id = opening_stock(migrate_inventory, db_path, 5, 10)
+    cost_engine.set_cost_method(db_manager, method)
+
+    purchase(db_manager, product_id, 5, 20, '2000-01-01')
+    sale_id = sale(db_manager, product_id, 5, '2000-01-02')
+    assert sale_cost(db_manager, sale_id) == expected
+
+
+def test_opening_stock_counts_only_unrecorded_quantity(migrate_inventory, db_path):
+    # 旧版本中进货10件、销售6件，库存表另有2件没有进货记录（共6件）
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        INSERT INTO products (id, product_code, name, purchase_price) VALUES (1, 'P001', 'P001', 3);
+        INSERT INTO purchases (product_id, quantity, unit_price, purchase_date) VALUES (1, 10, 2, '2024-01-01');
+        INSERT INTO sales (product_id, quantity, sale_date) VALUES (1, 6, '2024-01-02');
+        INSERT INTO inventory (product_id, quantity) VALUES (1, 6);
+    """)
+    conn.close()
+    db_manager = migrate_inventory()
+    # 先卖出的是没有进货记录的2件（单价3），再是进货批次剩下的4件（单价2）
+    assert sale_cost(db_manager, 1) == 2 * 3 + 4 * 2
+
+    # 迁移后的进货排在进货批次剩下的6件之后
+    purchase(db_manager, 1, 5, 4, '2024-01-03')
+    sale_id = sale(db_manager, 1, 5, '2024-01-04')
+    assert sale_cost(db_manager, sale_id) == 5 * 2
+    sale_id = sale(db_manager, 1, 4, '2024-01-05')
+    assert sale_cost(db_manager, sale_id) == 1 * 2 + 3 * 4
+
+
+def test_fallback_price_frozen_when_sale_recorded(inventory_db, method):
+    cost_engine.set_cost_method(inventory_db, method)
+    product_id = add_product(inventory_db, 9)
+    sale_id = sale(inventory_db, product_id, 3, '2024-01-01')
+    assert sale_cost(inventory_db, sale_id) == 27
+
+    # 修改产品进价后重新计算，已有销售的成本不变
+    with inventory_db.transaction() as conn:
+        conn.execute("UPDATE products SET purchase_price = 1 WHERE id = ?", (product_id,))
+        cost_engine.recost_all(conn)
+    assert sale_cost(inventory_db, sale_id) == 27
+    assert sale_cost(inventory_db, sale(inventory_db, product_id, 2, '2024-01-02')) == 2
+
+
+def test_fifo_consumes_oldest_lots(inventory_db):
+    product_id = add_product(inventory_db, 9)
+    purchase(inventory_db, product_id, 10, 2, '2024-01-01')
+    purchase(inventory_db, product_id, 10, 4, '2024-01-05')
+    first = sale(inventory_db, product_id, 5, '2024-01-02')
+    second = sale(inventory_db, product_id, 10, '2024-01-06')
+    third = sale(inventory_db, product_id, 10, '2024-01-07')
+    # 最后5件没有进货批次，按记录销售时的进价9计算
+    assert [sale_cost(inventory_db, s) for s in (first, second, third)] == [10, 30, 65]
+
+
+def test_moving_average(inventory_db):
+    cost_engine.set_cost_method(inventory_db, cost_engine.MOVING_AVERAGE)
+    product_id = add_product(inventory_db, 9)
+    purchase(inventory_db, product_id, 10, 2, '2024-01-01')
+    first = sale(inventory_db, product_id, 5, '2024-01-02')
+    purchase(inventory_db, product_id, 10, 4, '2024-01-05')
+    second = sale(inventory_db, product_id, 15, '2024-01-06')
+    assert sale_cost(inventory_db, first) == 10
+    # 结存5件单价2加进货10件单价4，平均单价10/3
+    assert sale_cost(inventory_db, second) == 50
+
+
+def test_backdated_purchase_recosts_later_sales(inventory_db):
+    product_id = add_product(inventory_db, 9)
+    purchase(inventory_db, product_id, 5, 4, '2024-01-05')
+    sale_id = sale(inventory_db, product_id, 5, '2024-01-06')
+    assert sale_cost(inventory_db, sale_id) == 20
+
+    purchase(inventory_db, product_id, 5, 1, '2024-01-01')
+    assert sale_cost(inventory_db, sale_id) == 5
+
+
+def test_deleted_purchase_recosts_sales(inventory_db):
+    product_id = add_product(inventory_db, 9)
+    purchase_id = purchase(inventory_db, product_id, 5, 1, '2024-01-01')
+    purchase(inventory_db, product_id, 5, 4, '2024-01-02')
+    sale_id = sale(inventory_db, product_id, 5, '2024-01-03')
+    assert sale_cost(inventory_db, sale_id) == 5
+
+    delete_purchase(inventory_db, purchase_id)
+    assert sale_cost(inventory_db, sale_id) == 20
+
+
+def test_stock_removal_consumes_lots(inventory_db):
+    product_id = add_product(inventory_db, 9)
+    purchase(inventory_db, product_id, 5, 2, '2000-01-01')
+    purchase(inventory_db, product_id, 5, 4, '2000-01-01')
+    # 删除库存时剩余数量作为调整记入流水（记录日期为当天），扣除最早的批次；再调整入库5件单价3
+    with inventory_db.transaction() as conn:
+        record_movement(conn, product_id, -5, ADJUSTMENT, note="删除库存")
+        cost_engine.update_costs(conn, [product_id])
+    with inventory_db.transaction() as conn:
+        record_movement(conn, product_id, 5, ADJUSTMENT, unit_cost=3)
+    sale_id = sale(inventory_db, product_id, 10, '2999-01-01')
+    assert sale_cost(inventory_db, sale_id) == 5 * 4 + 5 * 3
+
+
+def test_set_cost_method_recosts_all_sales(inventory_db):
+    product_id = add_product(inventory_db, 9)
+    purchase(inventory_db, product_id, 10, 2, '2024-01-01')
+    purchase(inventory_db, product_id, 10, 4, '2024-01-02')
+    sale_id = sale(inventory_db, product_id, 10, '2024-01-03')
+    assert sale_cost(inventory_db, sale_id) == 20
+
+    assert cost_engine.set_cost_method(inventory_db, cost_engine.MOVING_AVERAGE) == 1
+    assert sale_cost(inventory_db, sale_id) == 30
+    with inventory_db.transaction() as conn:
+        assert cost_engine.get_cost_method(conn) == cost_engine.MOVING_AVERAGE
+    with pytest.raises(ValueError):
+        cost_engine.set_cost_method(inventory_db, 'lifo')
@@ -0,0 +1,118 @@
+import sqlite3
+
+# 客户销售汇总由触发器维护，每一步之后都应与按销售记录汇总的结果一致
+RECOMPUTED = """
+    SELECT c.id, IFNULL(SUM(s.total_amount), 0), COUNT(s.id)
+    FROM customers c LEFT JOIN sales s ON s.customer_id = c.id
+    GROUP BY c.id ORDER BY c.id
+"""
+
+
+def totals(db_manager):
+    return db_manager.execute_query(
+        "SELECT customer_id, total_sales, sale_count FROM customer_sales_totals ORDER BY customer_id",
+        fetch_all=True)
+
+
+def assert_consistent(db_manager):
+    assert totals(db_manager) == db_manager.execute_query(RECOMPUTED, fetch_all=True)
+
+
+def add_customer(db_manager, code, contact):
+    with db_manager.transaction() as conn:
+        return conn.execute(
+            "INSERT INTO customers (customer_code, contact_person) VALUES (?, ?)", (code, contact)).lastrowid
+
+
+def add_sale(db_manager, customer, amount):
+    """与进销存界面添加销售记录相同：按名称关联已有客户"""
+    with db_manager.transaction() as conn:
+        return conn.execute(
+            """INSERT INTO sales (product_id, quantity, unit_price, total_amount, sale_date, customer, customer_id)
+               VALUES (1, 1, ?, ?, '2024-01-01', ?, (SELECT MIN(id) FROM customers WHERE contact_person = ?))""",
+            (amount, amount, customer, customer)
+        ).lastrowid
+
+
+def execute(db_manager, sql, params=()):
+    with db_manager.transaction() as conn:
+        conn.execute(sql, params)
+
+
+def test_migration_links_sales_by_contact_name(legacy_inventory, migrate_inventory, db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        INSERT INTO customers (id, customer_code, contact_person) VALUES (1, 'C001', '张三');
+        INSERT INTO customers (id, customer_code, contact_person) VALUES (2, 'C002', '张三');
+        INSERT INTO customers (id, customer_code, contact_person) VALUES (3, 'C003', '李四');
+        INSERT INTO sales (customer, total_amount) VALUES ('张三', 100);
+        INSERT INTO sales (customer, total_amount) VALUES ('张三', 50);
+        INSERT INTO sales (customer, total_amount) VALUES ('王五', 30);
+        INSERT INTO sales (customer, total_amount) VALUES ('', 20);
+    """)
+    conn.close()
+    db_manager = migrate_inventory()
+
+    # 同名客户关联最早的一个，没有对应客户的销售不关联
+    assert db_manager.execute_query("SELECT customer_id FROM sales ORDER BY id", fetch_all=True) == \
+        [(1,), (1,), (None,), (None,)]
+    assert totals(db_manager) == [(1, 150, 2), (2, 0, 0), (3, 0, 0)]
+
+
+def test_sales_changes_update_totals(inventory_db):
+    zhang = add_customer(inventory_db, 'C001', '张三')
+    li = add_customer(inventory_db, 'C002', '李四')
+    first = add_sale(inventory_db, '张三', 100)
+    add_sale(inventory_db, '张三', 40)
+    add_sale(inventory_db, '路人', 10)
+    assert totals(inventory_db) == [(zhang, 140, 2), (li, 0, 0)]
+
+    # 同一天相同产品的销售累加到已有记录
+    execute(inventory_db, "UPDATE sales SET quantity = 2, total_amount = 200 WHERE id = ?", (first,))
+    assert totals(inventory_db) == [(zhang, 240, 2), (li, 0, 0)]
+    assert_consistent(inventory_db)
+
+    execute(inventory_db, "UPDATE sales SET customer_id = ? WHERE id = ?", (li, first))
+    assert totals(inventory_db) == [(zhang, 40, 1), (li, 200, 1)]
+    assert_consistent(inventory_db)
+
+    execute(inventory_db, "DELETE FROM sales WHERE id = ?", (first,))
+    assert totals(inventory_db) == [(zhang, 40, 1), (li, 0, 0)]
+    assert_consistent(inventory_db)
+
+
+def test_customer_added_after_sale_gets_earlier_sales(inventory_db):
+    add_sale(inventory_db, '张三', 100)
+    add_sale(inventory_db, '张三', 20)
+    assert totals(inventory_db) == []
+
+    zhang = add_customer(inventory_db, 'C001', '张三')
+    assert totals(inventory_db) == [(zhang, 120, 2)]
+    # 之后添加的同名客户不会抢走已关联的销售
+    other = add_customer(inventory_db, 'C002', '张三')
+    assert totals(inventory_db) == [(zhang, 120, 2), (other, 0, 0)]
+    assert_consistent(inventory_db)
+
+
+def test_renamed_customer_gets_unlinked_sales(inventory_db):
+    customer = add_customer(inventory_db, 'C001', '张三')
+    add_sale(inventory_db, '张三', 100)
+    add_sale(inventory_db, '张老三', 30)
+
+    execute(inventory_db, "UPDATE customers SET contact_person = '张老三' WHERE id = ?", (customer,))
+    assert totals(inventory_db) == [(customer, 130, 2)]
+    assert_consistent(inventory_db)
+
+
+def test_deleted_customer_unlinks_sales(inventory_db):
+    zhang = add_customer(inventory_db, 'C001', '张三')
+    li = add_customer(inventory_db, 'C002', '李四')
+    add_sale(inventory_db, '张三', 100)
+    add_sale(inventory_db, '李四', 60)
+
+    execute(inventory_db, "DELETE FROM customers WHERE id = ?", (zhang,))
+    assert totals(inventory_db) == [(li, 60, 1)]
+    assert inventory_db.execute_query(
+        "SELECT COUNT(*) FROM sales WHERE customer_id IS NULL", fetch_one=True)[0] == 1
+    assert_consistent(inventory_db)
+
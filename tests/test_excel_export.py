@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from utils.background_worker import BackgroundTask, TaskCancelled
+from utils.excel_export import Sheet, iter_query, export_workbook, revenue_sheets
+
+openpyxl = pytest.importorskip('openpyxl')
+
+NUMBERS = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < ?) SELECT x FROM n"
+
+
+def export_in_thread(db_manager, filename, sheets, task=None):
+    """在另一个线程中导出，返回 (导出结果或异常, 导出结束时该线程是否仍持有连接池中的连接)"""
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = export_workbook(filename, sheets, task=task)
+        except Exception as e:
+            outcome['result'] = e
+        outcome['holding'] = getattr(db_manager.pool._local, 'conn', None) is not None
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    return outcome['result'], outcome['holding']
+
+
+def test_export_writes_all_rows(db_manager, tmp_path):
+    filename = str(tmp_path / 'numbers.xlsx')
+    sheets = [Sheet("数字", ["x"], iter_query(db_manager, NUMBERS, (450,)), 450)]
+    result, holding = export_in_thread(db_manager, filename, sheets)
+    assert result == 450
+    assert not holding
+    ws = openpyxl.load_workbook(filename).active
+    assert ws.max_row == 451
+
+
+def test_cancelled_export_releases_connections_in_worker_thread(calculator, tmp_path):
+    db_manager = calculator.db_manager
+    db_manager.execute_many(
+        "INSERT INTO revenue (date, emp_id, amount, description, added_by) VALUES (?, ?, ?, ?, ?)",
+        [('2025-01-01', f'EMP{i:014d}', 10, '', 'admin') for i in range(450)]
+    )
+    task = BackgroundTask("export")
+    task.cancel()
+    filename = str(tmp_path / 'revenue.xlsx')
+    sheets = revenue_sheets(db_manager, '2025-01-01', '2025-01-31')
+
+    result, holding = export_in_thread(db_manager, filename, sheets, task=task)
+    assert isinstance(result, TaskCancelled)
+    # 读取记录的生成器在导出线程中关闭，连接已归还，没有留下不完整的文件
+    assert not holding
+    assert all(sheet.rows.gi_frame is None for sheet in sheets)
+    assert not (tmp_path / 'revenue.xlsx').exists()
@@ -0,0 +1,97 @@
+import pytest
+
+from salary_calculator import User
+from utils import common_utils
+from utils.inventory_manager import InventoryManager
+from utils.stock_ledger import record_movement, PURCHASE, SALE
+
+
+class SelectedTree:
+    """代替Treeview，只提供删除操作用到的选中项"""
+    def __init__(self, iid, values=()):
+        self.iid = iid
+        self.values = values
+
+    def selection(self):
+        return (self.iid,)
+
+    def item(self, iid):
+        return {"values": self.values}
+
+
+@pytest.fixture
+def errors(monkeypatch):
+    shown = []
+    monkeypatch.setattr(common_utils.messagebox, 'askyesno', lambda *args, **kwargs: True)
+    monkeypatch.setattr(common_utils.messagebox, 'showerror', lambda title, message: shown.append(message))
+    return shown
+
+
+@pytest.fixture(params=[User('admin', 'admin123', 'admin'), None], ids=['user', 'no_user'])
+def manager(inventory_db, request):
+    manager = InventoryManager.__new__(InventoryManager)
+    manager.db_manager = inventory_db
+    manager.current_user = request.param
+    for name in ('refresh_purchase_list', 'refresh_sale_list', 'refresh_stock_list'):
+        setattr(manager, name, lambda: None)
+    return manager
+
+
+@pytest.fixture
+def product(inventory_db):
+    with inventory_db.transaction() as conn:
+        product_id = conn.execute(
+            "INSERT INTO products (product_code, name, purchase_price) VALUES ('P001', 'P001', 5)").lastrowid
+        purchase_id = conn.execute(
+            "INSERT INTO purchases (product_id, quantity, unit_price, purchase_date) VALUES (?, 10, 5, '2024-01-01')",
+            (product_id,)).lastrowid
+        record_movement(conn, product_id, 10, PURCHASE, 'purchases', purchase_id)
+        sale_id = conn.execute(
+            "INSERT INTO sales (product_id, quantity, unit_price, sale_date) VALUES (?, 4, 9, '2024-01-02')",
+            (product_id,)).lastrowid
+        record_movement(conn, product_id, -4, SALE, 'sales', sale_id)
+    return product_id, purchase_id, sale_id
+
+
+def last_movement(db_manager):
+    return db_manager.execute_query(
+        "SELECT quantity, created_by FROM stock_movements ORDER BY id DESC", fetch_one=True)
+
+
+def operator(manager):
+    return manager.current_user.username if manager.current_user else None
+
+
+def stock(db_manager, product_id):
+    row = db_manager.execute_query("SELECT quantity FROM inventory WHERE product_id = ?", (product_id,), fetch_one=True)
+    return row[0] if row else None
+
+
+def test_delete_purchase_records_operator(manager, product, errors):
+    product_id, purchase_id, _ = product
+    manager.purchase_tree = SelectedTree(purchase_id)
+    manager.delete_purchase_record()
+
+    assert errors == []
+    assert last_movement(manager.db_manager) == (-10, operator(manager))
+    assert stock(manager.db_manager, product_id) == -4
+
+
+def test_delete_sale_records_operator(manager, product, errors):
+    product_id, _, sale_id = product
+    manager.sale_tree = SelectedTree(sale_id)
+    manager.delete_sale_record()
+
+    assert errors == []
+    assert last_movement(manager.db_manager) == (4, operator(manager))
+    assert stock(manager.db_manager, product_id) == 10
+
+
+def test_delete_stock_records_operator(manager, product, errors):
+    product_id, _, _ = product
+    manager.stock_tree = SelectedTree(product_id, ('P001', 'P001'))
+    manager.delete_stock()
+
+    assert errors == []
+    assert last_movement(manager.db_manager) == (-6, operator(manager))
+    assert stock(manager.db_manager, product_id) is None
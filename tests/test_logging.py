@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_configure_logging(tmp_path):
+    # 批量生成工资条的子进程（spawn）只导入模块，不能各自打开日志文件
+    code = ("import logging, utils.common_utils, utils.payslip, utils.stock_ledger; "
+            "print(len(logging.getLogger().handlers))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT), timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '0'
+    assert not (tmp_path / 'salary_system.log').exists()
+
+
+def test_entry_point_configures_logging(tmp_path):
+    code = ("import sys, logging, utils.stock_ledger; "
+            "code = utils.stock_ledger.main(['--db', 'missing.db']); "
+            "logging.getLogger('salary_system').warning('entry'); sys.exit(code)")
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT), timeout=60)
+    assert result.returncode == 2, result.stderr
+    assert 'entry' in (tmp_path / 'salary_system.log').read_text(encoding='utf-8')
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from utils import common_utils
+from utils.db_migrations import run_migrations, get_schema_version, INVENTORY_MIGRATIONS, SALARY_MIGRATIONS
+
+
+@pytest.fixture
+def not_synced(monkeypatch):
+    """网络时间尚未同步（或同步失败），业务写操作被禁止"""
+    monkeypatch.setattr(common_utils, 'is_using_local_time', lambda: True)
+
+
+def applied_versions(db_manager, component):
+    rows = db_manager.execute_query(
+        "SELECT version FROM schema_version WHERE component=? ORDER BY version", (component,), fetch_all=True)
+    return [row[0] for row in rows]
+
+
+def test_inventory_migrations_run_without_network_time(legacy_inventory, not_synced):
+    success, message = run_migrations(legacy_inventory, 'inventory', INVENTORY_MIGRATIONS)
+    assert success, message
+    assert applied_versions(legacy_inventory, 'inventory') == [m[0] for m in INVENTORY_MIGRATIONS]
+    # 迁移之外的写操作仍然被禁止
+    with pytest.raises(sqlite3.OperationalError):
+        with legacy_inventory.transaction():
+            pass
+
+
+def test_migrations_are_applied_once(inventory_db):
+    success, message = run_migrations(inventory_db, 'inventory', INVENTORY_MIGRATIONS)
+    assert success
+    assert message == "数据库结构已是最新版本"
+    assert get_schema_version(inventory_db, 'inventory') == INVENTORY_MIGRATIONS[-1][0]
+
+
+def test_failed_migration_is_reported_and_rolled_back(db_manager):
+    def create_table(conn):
+        conn.execute("CREATE TABLE a (id INTEGER)")
+
+    def broken(conn):
+        conn.execute("CREATE TABLE b (id INTEGER)")
+        raise ValueError("数据不一致")
+
+    def never_run(conn):
+        conn.execute("CREATE TABLE c (id INTEGER)")
+
+    migrations = [(1, "建表a", create_table), (2, "建表b", broken), (3, "建表c", never_run)]
+    success, message = run_migrations(db_manager, 'test', migrations)
+    assert not success
+    assert "test v2 建表b" in message and "ValueError" in message and "数据不一致" in message
+
+    tables = {row[0] for row in db_manager.execute_query(
+        "SELECT name FROM sqlite_master WHERE type='table'", fetch_all=True)}
+    assert 'a' in tables and 'b' not in tables and 'c' not in tables
+    assert applied_versions(db_manager, 'test') == [1]
+
+
+def test_calculator_initialises_without_network_time(db_path, not_synced):
+    from salary_calculator import SalaryCalculator
+    calculator = SalaryCalculator(db_path)
+    assert calculator.migration_error is None
+    assert applied_versions(calculator.db_manager, 'salary') == [m[0] for m in SALARY_MIGRATIONS]
+    assert calculator.db_manager.execute_query("SELECT COUNT(*) FROM tax_rates", fetch_one=True)[0] == 8
+    assert calculator.login('admin', 'admin123') == (True, 'admin')
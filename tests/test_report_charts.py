@@ -0,0 +1,140 @@
+import base64
+import struct
+import threading
+
+import pytest
+
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+
+import salary_calculator  # noqa: E402
+from salary_calculator import SalaryCalculatorApp, Employee  # noqa: E402
+
+SIZES = [(1000, 400), (600, 400), (600, 400)]
+
+
+class RunningTask:
+    def check_cancelled(self):
+        pass
+
+
+def png_size(png):
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    return struct.unpack('>II', png[16:24])
+
+
+class FakeCanvas:
+    """代替tk.Canvas，记录显示的图片；size为当前的像素大小"""
+    def __init__(self, size):
+        self.size = size
+        self.items = []
+
+    def winfo_width(self):
+        return self.size[0]
+
+    def winfo_height(self):
+        return self.size[1]
+
+    def delete(self, tag):
+        self.items = []
+
+    def create_image(self, x, y, anchor, image):
+        self.items.append(image)
+
+
+class FakePhotoImage:
+    def __init__(self, master, data):
+        self.png = base64.b64decode(data)
+
+
+class FakeRoot:
+    """代替Tk根窗口，after只记录待执行的函数"""
+    def __init__(self):
+        self.jobs = {}
+
+    def after(self, delay, func):
+        job = len(self.jobs) + 1
+        self.jobs[job] = func
+        return job
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+
+@pytest.fixture
+def app(calculator, monkeypatch):
+    # 饼图需要至少一个部门有已发放工资
+    emp_id = 'EMP20250101000001'
+    ok, message = calculator.add_employee(
+        Employee(emp_id, '张三', '技术部', '工程师', 4500, '2025-01-01', contact='13800138000'))
+    assert ok, message
+    calculator.login('admin', 'admin123')
+    calculator.generate_salary_sheet('2025-09')
+    assert calculator.mark_salary_paid(emp_id, '2025-09')
+
+    monkeypatch.setattr(salary_calculator.tk, 'PhotoImage', FakePhotoImage)
+    app = SalaryCalculatorApp.__new__(SalaryCalculatorApp)
+    app.calculator = calculator
+    app.root = FakeRoot()
+    app.report_canvases = [FakeCanvas(size) for size in SIZES]
+    app._chart_images = []
+    app._chart_sizes = None
+    app._chart_resize_job = None
+    app.refreshes = 0
+
+    def update_charts():
+        app.refreshes += 1
+    app.update_charts = update_charts
+    return app
+
+
+@pytest.mark.parametrize("report_type", ["salary", "profit"])
+def test_render_produces_images_at_canvas_size(app, report_type):
+    images, sizes = app._render_charts(RunningTask(), report_type, 2025, SIZES)
+    assert sizes == SIZES
+    assert [png_size(png) for png in images] == SIZES
+    assert all(not canvas.items for canvas in app.report_canvases)
+
+
+def test_render_runs_off_the_ui_thread(app):
+    result = []
+    worker = threading.Thread(target=lambda: result.append(app._render_charts(RunningTask(), "salary", 2025, SIZES)))
+    worker.start()
+    worker.join()
+    assert [png_size(png) for png in result[0][0]] == SIZES
+
+
+def test_blit_shows_rendered_images(app):
+    images, sizes = app._render_charts(RunningTask(), "salary", 2025, SIZES)
+    app._blit_charts((images, sizes))
+
+    assert [[image.png for image in canvas.items] for canvas in app.report_canvases] == [[png] for png in images]
+    assert [image.png for image in app._chart_images] == images
+    assert app.root.jobs == {}
+
+
+def test_resize_rerenders_charts(app):
+    app._blit_charts(app._render_charts(RunningTask(), "salary", 2025, SIZES))
+    # 显示后趋势图画布被拉宽，多次改变大小只重新渲染一次
+    app.report_canvases[0].size = (1200, 400)
+    app._on_report_canvas_resize()
+    app._on_report_canvas_resize()
+    assert len(app.root.jobs) == 1
+    app.root.jobs.popitem()[1]()
+    assert app.refreshes == 1
+
+
+def test_resize_during_render_rerenders_after_blit(app):
+    result = app._render_charts(RunningTask(), "salary", 2025, SIZES)
+    app.report_canvases[1].size = (500, 300)
+    app._blit_charts(result)
+
+    app.root.jobs.popitem()[1]()
+    assert app.refreshes == 1
+
+
+def test_unchanged_size_does_not_rerender(app):
+    app._blit_charts(app._render_charts(RunningTask(), "salary", 2025, SIZES))
+    app._on_report_canvas_resize()
+    app.root.jobs.popitem()[1]()
+    assert app.refreshes == 0
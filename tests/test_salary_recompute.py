@@ -0,0 +1,84 @@
+import logging
+
+import pytest
+
+from salary_calculator import Employee, Attendance
+from utils import common_utils
+
+EMP_ID = 'EMP20250101000001'
+
+
+def salary_row(calculator, month):
+    return calculator.db_manager.execute_query(
+        "SELECT base_salary, bonus, deduction, final_salary, status FROM salaries WHERE emp_id=? AND month=?",
+        (EMP_ID, month),
+        fetch_one=True
+    )
+
+
+@pytest.fixture
+def employee(calculator):
+    ok, message = calculator.add_employee(
+        Employee(EMP_ID, '张三', '技术部', '工程师', 4500, '2025-01-01', contact='13800138000'))
+    assert ok, message
+    calculator.login('admin', 'admin123')
+    return calculator
+
+
+def raise_base_salary(calculator, base_salary):
+    assert calculator.update_employee(
+        Employee(EMP_ID, '张三', '技术部', '工程师', base_salary, '2025-01-01', contact='13800138000'))
+
+
+def test_paid_salary_keeps_base_after_bonus_edit(employee):
+    employee.generate_salary_sheet('2025-09')
+    assert employee.mark_salary_paid(EMP_ID, '2025-09')
+    raise_base_salary(employee, 9000)
+
+    assert employee.update_employee_bonus(EMP_ID, '2025-09', 500)
+    assert salary_row(employee, '2025-09') == (4500, 500, 0, 5000, 'paid')
+
+
+def test_paid_salary_keeps_base_after_deduction_edit(employee):
+    employee.generate_salary_sheet('2025-09')
+    assert employee.mark_salary_paid(EMP_ID, '2025-09')
+    raise_base_salary(employee, 9000)
+
+    assert employee.update_employee_deduction(EMP_ID, '2025-09', 200)
+    assert salary_row(employee, '2025-09') == (4500, 0, 200, 4300, 'paid')
+
+
+def test_paid_salary_keeps_deduction_after_bonus_edit(employee):
+    employee.generate_salary_sheet('2025-09')
+    assert employee.mark_salary_paid(EMP_ID, '2025-09')
+    # 发放后补录的缺勤不影响已发放工资的扣款
+    employee.add_attendance(Attendance(EMP_ID, '2025-09-10', 'absent'))
+
+    assert employee.update_employee_bonus(EMP_ID, '2025-09', 500)
+    assert salary_row(employee, '2025-09') == (4500, 500, 0, 5000, 'paid')
+
+
+def test_unpaid_salary_follows_base_and_attendance(employee):
+    employee.generate_salary_sheet('2025-10')
+    raise_base_salary(employee, 9000)
+    employee.add_attendance(Attendance(EMP_ID, '2025-10-10', 'absent'))
+
+    assert employee.recompute_dirty_salaries('2025-10') == 1
+    # 缺勤一天扣50，8950按默认税率表 (8950 - 8000) * 0.1 - 210 < 0，不扣个税
+    assert salary_row(employee, '2025-10') == (9000, 0, 50, 8950, 'unpaid')
+
+
+def test_clean_month_refresh_does_not_write(employee, monkeypatch, caplog):
+    employee.generate_salary_sheet('2025-10')
+    # 使用本地时间时禁止写入，没有待重算的记录时刷新工资表不应尝试写入
+    monkeypatch.setattr(common_utils, 'is_using_local_time', lambda: True)
+
+    with caplog.at_level(logging.ERROR):
+        assert employee.recompute_dirty_salaries('2025-10') == 0
+        assert [row['emp_id'] for row in employee.iter_salary_sheet('2025-10')] == [EMP_ID]
+    assert caplog.records == []
+
+
+def test_salary_sheet_count_matches_rows(employee):
+    assert employee.count_salary_sheet() == 1
+    assert len(list(employee.iter_salary_sheet('2025-11'))) == 1
@@ -0,0 +1,138 @@
+import sqlite3
+
+import pytest
+
+from utils import common_utils
+from utils import stock_ledger
+from utils.stock_ledger import (record_movement, check_consistency, rebuild_balances,
+                                PURCHASE, SALE, ADJUSTMENT, OPENING_NOTE)
+
+
+def add_product(db_manager, code='P001', purchase_price=5):
+    with db_manager.transaction() as conn:
+        return conn.execute(
+            "INSERT INTO products (product_code, name, purchase_price) VALUES (?, ?, ?)",
+            (code, code, purchase_price)
+        ).lastrowid
+
+
+def stock(db_manager, product_id):
+    rows = db_manager.execute_query(
+        "SELECT quantity FROM inventory WHERE product_id = ?", (product_id,), fetch_all=True)
+    return [row[0] for row in rows]
+
+
+def movements(db_manager, product_id):
+    return db_manager.execute_query(
+        "SELECT quantity, kind, note, unit_cost FROM stock_movements WHERE product_id = ? ORDER BY id",
+        (product_id,), fetch_all=True)
+
+
+def corrupt(db_path, sql):
+    """绕过流水直接修改库存表（旧版本程序或手工修改）"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def test_existing_stock_becomes_opening_movement(legacy_inventory, migrate_inventory, db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        INSERT INTO products (id, product_code, name, purchase_price) VALUES (1, 'P001', 'P001', 3);
+        INSERT INTO inventory (product_id, quantity) VALUES (1, 7);
+        INSERT INTO inventory (product_id, quantity) VALUES (1, 7);
+    """)
+    conn.close()
+    db_manager = migrate_inventory()
+
+    # 重复的库存记录只保留一条，期初库存没有被触发器重复计入
+    assert stock(db_manager, 1) == [7]
+    assert movements(db_manager, 1) == [(7, ADJUSTMENT, OPENING_NOTE, 3)]
+    assert check_consistency(db_manager) == []
+
+
+def test_movements_maintain_inventory(inventory_db):
+    product_id = add_product(inventory_db)
+    with inventory_db.transaction() as conn:
+        record_movement(conn, product_id, 10, PURCHASE, 'purchases', 1)
+        record_movement(conn, product_id, -4, SALE, 'sales', 1)
+        record_movement(conn, product_id, 0, SALE, 'sales', 2)
+    assert stock(inventory_db, product_id) == [6]
+    assert [row[0] for row in movements(inventory_db, product_id)] == [10, -4]
+
+
+def test_adjustment_records_purchase_price(inventory_db):
+    product_id = add_product(inventory_db, purchase_price=8)
+    with inventory_db.transaction() as conn:
+        record_movement(conn, product_id, 2, ADJUSTMENT)
+        record_movement(conn, product_id, 3, ADJUSTMENT, unit_cost=6)
+        record_movement(conn, product_id, 1, PURCHASE)
+    assert [row[3] for row in movements(inventory_db, product_id)] == [8, 6, None]
+
+
+def test_unknown_kind_rejected(inventory_db):
+    product_id = add_product(inventory_db)
+    with pytest.raises(ValueError):
+        with inventory_db.transaction() as conn:
+            record_movement(conn, product_id, 1, 'gift')
+    assert movements(inventory_db, product_id) == []
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("UPDATE stock_movements SET quantity = 100", "库存流水不能修改"),
+    ("DELETE FROM stock_movements", "库存流水不能删除"),
+])
+def test_movements_are_append_only(inventory_db, sql, message):
+    product_id = add_product(inventory_db)
+    with inventory_db.transaction() as conn:
+        record_movement(conn, product_id, 10, PURCHASE)
+    with pytest.raises(sqlite3.IntegrityError, match=message):
+        with inventory_db.transaction() as conn:
+            conn.execute(sql)
+    assert stock(inventory_db, product_id) == [10]
+    assert [row[0] for row in movements(inventory_db, product_id)] == [10]
+
+
+def test_rebuild_restores_ledger_balances(inventory_db, db_path):
+    changed = add_product(inventory_db, 'P001')
+    missing = add_product(inventory_db, 'P002')
+    untouched = add_product(inventory_db, 'P003')
+    with inventory_db.transaction() as conn:
+        for product_id in (changed, missing, untouched):
+            record_movement(conn, product_id, 5, PURCHASE)
+    corrupt(db_path, f"UPDATE inventory SET quantity = 9 WHERE product_id = {changed}")
+    corrupt(db_path, f"DELETE FROM inventory WHERE product_id = {missing}")
+
+    expected = [(changed, 9, 5), (missing, None, 5)]
+    assert check_consistency(inventory_db) == expected
+    assert rebuild_balances(inventory_db) == expected
+    assert check_consistency(inventory_db) == []
+    assert [stock(inventory_db, p) for p in (changed, missing, untouched)] == [[5], [5], [5]]
+
+
+@pytest.fixture
+def command_line(monkeypatch):
+    """在测试进程中运行命令行入口，不安装全局日志处理器"""
+    monkeypatch.setattr(stock_ledger, 'setup_logging', lambda: None)
+    return stock_ledger.main
+
+
+def test_command_line_check_and_rebuild(inventory_db, db_path, command_line, monkeypatch, capsys):
+    product_id = add_product(inventory_db)
+    with inventory_db.transaction() as conn:
+        record_movement(conn, product_id, 5, PURCHASE)
+    corrupt(db_path, "UPDATE inventory SET quantity = 2")
+    monkeypatch.setattr(common_utils.time_service, 'sync', lambda: True)
+
+    assert command_line(['--db', db_path]) == 1
+    assert f"产品 {product_id}: 库存 2，流水 5" in capsys.readouterr().out
+    assert command_line(['--db', db_path, '--rebuild']) == 0
+    assert command_line(['--db', db_path]) == 0
+    assert "库存与流水一致" in capsys.readouterr().out
+
+
+def test_rebuild_requires_network_time(inventory_db, db_path, command_line, monkeypatch, capsys):
+    monkeypatch.setattr(common_utils.time_service, 'sync', lambda: False)
+    assert command_line(['--db', db_path, '--rebuild']) == 1
+    assert "无法同步网络时间" in capsys.readouterr().out
@@ -0,0 +1,70 @@
+import pytest
+
+# 随程序发布的数据库中的税率表：第二档的上限是8000.1，与第三档重叠
+SHIPPED_TAX_RATES = [
+    (0, 5000, 0, 0),
+    (5000, 8000.1, 0.03, 0),
+    (8000, 17000, 0.1, 210),
+    (17000, 30000, 0.2, 1410),
+    (30000, 40000, 0.25, 2660),
+    (40000, 60000, 0.3, 4410),
+    (60000, 85000, 0.35, 7160),
+    (85000, float('inf'), 0.45, 15160),
+]
+
+
+def sql_tax(db_manager, salary):
+    """原来按SQL逐条查询的计算方式：取覆盖工资的第一条（id最小）区间"""
+    row = db_manager.execute_query(
+        "SELECT rate, deduction, min_salary FROM tax_rates WHERE min_salary <= ? AND max_salary > ? ORDER BY id",
+        (salary, salary),
+        fetch_one=True
+    )
+    if not row:
+        return 0
+    rate, deduction, min_salary = row
+    return round(max((salary - min_salary) * rate - deduction, 0), 2)
+
+
+@pytest.fixture
+def shipped_rates(calculator):
+    calculator.db_manager.execute_query("DELETE FROM tax_rates")
+    calculator.db_manager.execute_many(
+        "INSERT INTO tax_rates (min_salary, max_salary, rate, deduction) VALUES (?, ?, ?, ?)",
+        SHIPPED_TAX_RATES
+    )
+    calculator.invalidate_tax_brackets()
+    return calculator
+
+
+@pytest.mark.parametrize("salary, tax", [
+    (4999.99, 0),
+    (5000, 0),
+    (8000, 90),
+    (8000.05, 90),
+    (8000.1, 0),
+    (16999.99, 690),
+    (17000, 0),
+    (17000.01, 0),
+])
+def test_boundaries_use_lowest_id_bracket(shipped_rates, salary, tax):
+    assert shipped_rates.calculate_tax(salary) == tax
+
+
+def test_matches_sql_lookup(shipped_rates):
+    salaries = [i * 250 + offset for i in range(0, 480) for offset in (0, 0.05, 0.1)]
+    expected = [sql_tax(shipped_rates.db_manager, salary) for salary in salaries]
+    assert [shipped_rates.calculate_tax(salary) for salary in salaries] == expected
+    assert shipped_rates.calculate_tax_batch(salaries) == expected
+
+
+def test_default_rates_match_sql_lookup(calculator):
+    salaries = [0, 4999, 5000, 7999.99, 8000, 12000, 17000, 29999, 30000, 85000, 120000]
+    assert calculator.calculate_tax_batch(salaries) == [sql_tax(calculator.db_manager, s) for s in salaries]
+
+
+def test_cache_invalidated_after_rate_change(shipped_rates):
+    assert shipped_rates.calculate_tax(8000) == 90
+    row = shipped_rates.db_manager.execute_query("SELECT id FROM tax_rates WHERE min_salary = 5000", fetch_one=True)
+    shipped_rates.update_tax_rate(row[0], 5000, 8000, 0.03, 0)
+    assert shipped_rates.calculate_tax(8000) == 0
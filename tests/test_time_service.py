@@ -0,0 +1,147 @@
+import datetime
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from utils import common_utils
+from utils.common_utils import NetworkTimeService
+
+ntplib = pytest.importorskip('ntplib')
+
+# conftest把is_using_local_time替换为始终返回False，这里需要真实的判断
+is_using_local_time = common_utils.is_using_local_time
+
+
+class FakeNtpServer:
+    """本机UDP上的NTP应答程序，返回的时间比本机时钟快offset秒；silent时不应答"""
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.silent = False
+        self.requests = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.settimeout(0.1)
+        self.port = self._sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                data, addr = self._sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            self.requests += 1
+            if self.silent:
+                continue
+            request = ntplib.NTPPacket()
+            request.from_data(data)
+            now = ntplib.system_to_ntp_time(time.time() + self.offset)
+            response = ntplib.NTPPacket(version=3, mode=4, tx_timestamp=now)
+            response.stratum = 2
+            response.orig_timestamp = request.tx_timestamp
+            response.recv_timestamp = now
+            self._sock.sendto(response.to_data(), addr)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._sock.close()
+
+
+@pytest.fixture
+def ntp_server():
+    server = FakeNtpServer(offset=3600)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def service(ntp_server, monkeypatch):
+    service = NetworkTimeService(servers=['127.0.0.1'], port=ntp_server.port, timeout=0.5)
+    monkeypatch.setattr(common_utils, 'time_service', service)
+    monkeypatch.setattr(common_utils, 'is_using_local_time', is_using_local_time)
+    yield service
+    service.stop()
+
+
+def seconds_ahead(service):
+    return (service.now() - datetime.datetime.now()).total_seconds()
+
+
+def test_not_synced_until_first_success(service):
+    assert service.using_local_time
+    assert abs(seconds_ahead(service)) < 1
+
+
+def test_sync_applies_offset(service, ntp_server):
+    assert service.sync()
+    assert not service.using_local_time
+    assert seconds_ahead(service) == pytest.approx(3600, abs=1)
+    assert ntp_server.requests == 1
+
+
+def test_timeout_uses_local_time(service, ntp_server):
+    ntp_server.silent = True
+    assert not service.sync()
+    assert service.using_local_time
+    assert abs(seconds_ahead(service)) < 1
+
+
+def test_failed_resync_keeps_synced_offset(service, ntp_server):
+    assert service.sync()
+    ntp_server.silent = True
+    assert not service.sync()
+    assert not service.using_local_time
+    assert seconds_ahead(service) == pytest.approx(3600, abs=1)
+
+
+def test_background_thread_syncs(service):
+    service.start()
+    deadline = time.monotonic() + 5
+    while service.using_local_time and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not service.using_local_time
+
+
+def test_writes_allowed_only_after_sync(service, db_manager):
+    with db_manager.schema_setup():
+        assert db_manager.execute_query("CREATE TABLE t (value INTEGER)")
+        with db_manager.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+
+    assert db_manager.execute_query("INSERT INTO t VALUES (2)") is None
+    assert db_manager.execute_many("INSERT INTO t VALUES (?)", [(3,)]) is None
+    with pytest.raises(sqlite3.OperationalError):
+        with db_manager.transaction():
+            pass
+
+    assert service.sync()
+    assert db_manager.execute_query("INSERT INTO t VALUES (4)")
+    assert db_manager.execute_query("SELECT value FROM t ORDER BY value", fetch_all=True) == [(1,), (4,)]
+
+
+class ImmediateWorker:
+    """在调用线程中直接执行任务的BackgroundWorker替身"""
+    def __init__(self):
+        self.keys = []
+
+    def submit(self, key, func, *args, on_success=None, on_error=None):
+        self.keys.append(key)
+        on_success(func(None, *args))
+
+
+def test_reset_time_mode_syncs_in_worker(service):
+    common_utils.force_use_local_time()
+    assert service.using_local_time
+
+    worker = ImmediateWorker()
+    results = []
+    common_utils.reset_time_mode(worker, results.append)
+    assert worker.keys == ["time_sync"]
+    assert results == [False]
+    assert seconds_ahead(service) == pytest.approx(3600, abs=1)
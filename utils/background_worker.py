@@ -0,0 +1,133 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.common_utils import logger
+
+
+class TaskCancelled(Exception):
+    """任务已被取消"""
+
+
+class BackgroundTask:
+    """提交给后台线程的任务句柄，任务函数可通过check_cancelled()响应取消"""
+    def __init__(self, key):
+        self.key = key
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """已取消时抛出TaskCancelled，结束任务"""
+        if self._cancel_event.is_set():
+            raise TaskCancelled(self.key)
+
+
+class BackgroundWorker:
+    """后台任务执行器
+
+    任务在线程池中执行，结果通过队列交回Tk主线程，由root.after轮询后调用回调，
+    回调中可以安全地操作界面控件。同一个key的新任务默认取消尚未完成的旧任务，
+    被取消任务的结果会被丢弃（不检查取消的任务仍会执行完，只是不再调用回调）；
+    备份等结果必须报告的任务以replace=False提交，旧任务未完成时不接受新任务。
+    """
+    def __init__(self, root, max_workers=2, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bg-worker")
+        self._results = queue.Queue()
+        self._current = {}
+        self._lock = threading.Lock()
+        self._polling = False
+        self._closed = False
+
+    def submit(self, key, func, *args, on_success=None, on_error=None, replace=True):
+        """提交任务，func(task, *args)在后台线程执行
+
+        on_success(result) / on_error(exception) 在主线程调用
+        replace为False时，同一个key的任务尚未完成则不提交，返回None
+        """
+        if self._closed:
+            return None
+        task = BackgroundTask(key)
+        with self._lock:
+            previous = self._current.get(key)
+            if previous is not None:
+                if not replace:
+                    logger.info(f"后台任务 {key} 尚未完成，不重复提交")
+                    return None
+                previous.cancel()
+                logger.info(f"后台任务 {key} 被新任务取代，旧任务的结果不再处理")
+            self._current[key] = task
+        self._executor.submit(self._run, task, func, args, on_success, on_error)
+        self._schedule_poll()
+        return task
+
+    def is_pending(self, task):
+        """任务是否尚未完成（已完成、已取消或被同一key的新任务替换时返回False）"""
+        with self._lock:
+            return self._current.get(task.key) is task
+
+    def cancel(self, key):
+        """取消指定key的任务"""
+        with self._lock:
+            task = self._current.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def _run(self, task, func, args, on_success, on_error):
+        try:
+            result = func(task, *args)
+            self._results.put((task, on_success, result, None))
+        except TaskCancelled:
+            logger.debug(f"后台任务已取消: {task.key}")
+        except Exception as e:
+            logger.error(f"后台任务执行失败: {task.key}: {str(e)}")
+            self._results.put((task, on_error, None, e))
+
+    def _schedule_poll(self):
+        # 只在主线程调用
+        if not self._polling and not self._closed:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        """在主线程中处理已完成任务的回调"""
+        self._polling = False
+        while True:
+            try:
+                task, callback, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                if self._current.get(task.key) is task:
+                    del self._current[task.key]
+            if task.cancelled or callback is None:
+                continue
+            try:
+                callback(error if error is not None else result)
+            except Exception as e:
+                logger.error(f"后台任务回调失败: {task.key}: {str(e)}")
+        # 还有未完成的任务时继续轮询
+        with self._lock:
+            pending = bool(self._current)
+        if pending:
+            self._schedule_poll()
+
+    def shutdown(self):
+        """取消所有任务并关闭线程池"""
+        self._closed = True
+        with self._lock:
+            tasks = list(self._current.values())
+            self._current.clear()
+        for task in tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False)
+
+
+__all__ = ['BackgroundWorker', 'BackgroundTask', 'TaskCancelled']
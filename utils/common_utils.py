@@ -1,52 +1,319 @@
 import sqlite3
 import datetime
 import re
+import os
+import time
+import queue
+import atexit
+import threading
+import contextlib
 import tkinter as tk
 from tkinter import messagebox
 import logging
-import sqlite3
 
-# 配置日志
-# 设置文件处理器使用UTF-8编码
-file_handler = logging.FileHandler('salary_system.log', encoding='utf-8')
-# 设置控制台处理器使用UTF-8编码
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        file_handler,
-        stream_handler
-    ]
-)
+# 日志处理器由程序入口调用 log_config.setup_logging 配置，导入本模块时不创建
+# （批量生成工资条的子进程也会导入本模块，不能各自打开日志文件）
 logger = logging.getLogger('salary_system')
 
+def _decode_text(value):
+    """按UTF-8解码文本字段，忽略非法字节"""
+    return str(value, 'utf-8', 'ignore')
+
+
+class PooledConnection:
+    """连接池中借出的连接代理
+
+    与sqlite3.Connection用法一致，调用close()时将连接归还连接池而不是真正关闭。
+    连接只能在借出它的线程中归还：在其他线程中归还会让空闲队列和原线程同时持有该连接。
+    """
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+        self._owner = threading.get_ident()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        """归还连接，重复调用无副作用"""
+        if self._released:
+            return
+        self._released = True
+        if threading.get_ident() != self._owner:
+            # 原线程仍在使用该连接，不能放回空闲队列
+            logger.warning("数据库连接没有在借出它的线程中归还，已忽略")
+            return
+        self._pool.release(self._conn)
+
+    def __del__(self):
+        # 调用方未显式close时（如异常分支），在借出连接的线程中回收时自动归还；
+        # 垃圾回收可能发生在任意线程，其他线程中不归还
+        if self._released or threading.get_ident() != self._owner:
+            return
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """SQLite连接池
+
+    同一线程内嵌套获取复用同一个连接，线程用完后连接回到空闲队列供其他线程复用；
+    总连接数不超过max_size，取出空闲连接时做健康检查。
+    """
+    def __init__(self, db_path, max_size=5, timeout=10.0):
+        self.db_path = db_path
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._all = set()
+        self._closed = False
+
+    def _create(self):
+        """创建新的底层连接"""
+        # 连接会在不同线程之间复用，由连接池保证同一时刻只被一个线程持有
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        # 设置连接的编码为UTF-8
+        conn.text_factory = _decode_text
+        self._apply_pragmas(conn)
+        return conn
+
+    @staticmethod
+    def _apply_pragmas(conn):
+        """设置连接参数：WAL模式下读写互不阻塞，其余参数兼顾移动设备的内存和IO"""
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL模式下NORMAL即可保证数据库一致性，且避免每次提交都fsync
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # 页缓存约8MB（负数表示KB）
+            conn.execute("PRAGMA cache_size=-8000")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA mmap_size=67108864")
+        except sqlite3.Error as e:
+            logger.warning(f"设置数据库参数失败: {str(e)}")
+
+    @staticmethod
+    def _is_healthy(conn):
+        """健康检查：连接仍可执行语句"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        """丢弃失效连接"""
+        with self._lock:
+            self._all.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self):
+        """获取连接，返回PooledConnection"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("连接池已关闭")
+
+        # 同一线程嵌套获取时直接复用当前连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            return PooledConnection(self, conn)
+
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    if len(self._all) < self.max_size:
+                        conn = self._create()
+                        self._all.add(conn)
+                if conn is None:
+                    # 连接数已达上限，等待其他线程归还
+                    try:
+                        conn = self._idle.get(timeout=self.timeout)
+                    except queue.Empty:
+                        raise sqlite3.OperationalError("等待数据库连接超时")
+                else:
+                    break
+            if self._is_healthy(conn):
+                break
+            logger.warning("数据库连接健康检查失败，重新创建连接")
+            self._discard(conn)
+
+        self._local.conn = conn
+        self._local.depth = 1
+        self._local.tx_depth = 0
+        return PooledConnection(self, conn)
+
+    def in_transaction(self):
+        """当前线程是否处于transaction()上下文中"""
+        return getattr(self._local, 'tx_depth', 0) > 0
+
+    def release(self, conn):
+        """归还连接"""
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+        try:
+            # 回滚调用方未提交的事务，避免残留锁
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def close_all(self):
+        """关闭连接池中的所有连接"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        with self._lock:
+            remaining = list(self._all)
+            self._all.clear()
+        for conn in remaining:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+# 按数据库文件共享连接池
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, max_size=5):
+    """获取（或创建）指定数据库文件的连接池"""
+    key = db_path if db_path == ':memory:' else os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, max_size=max_size)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """关闭所有连接池，程序退出时调用"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+atexit.register(close_all_pools)
+
+
+# 当前线程是否在维护数据库结构（建表、迁移），见DatabaseManager.schema_setup
+_schema_setup = threading.local()
+
+
+def _writes_blocked():
+    """使用本地时间时禁止写数据库，维护数据库结构时除外"""
+    return is_using_local_time() and not getattr(_schema_setup, 'depth', 0)
+
+
 class DatabaseManager:
     """数据库管理类，封装通用的数据库操作"""
-    def __init__(self, db_path):
+    def __init__(self, db_path, pool_size=5):
         self.db_path = db_path
+        self.pool = get_pool(db_path, pool_size)
 
     def get_connection(self):
-        """获取数据库连接"""
+        """从连接池获取数据库连接，使用完毕后调用close()归还
+
+        连接失败时提示错误并抛出sqlite3.Error，不返回None
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            # 设置连接的编码为UTF-8
-            conn.text_factory = lambda x: str(x, 'utf-8', 'ignore')
-            return conn
+            return self.pool.acquire()
         except sqlite3.Error as e:
             logger.error(f"数据库连接失败: {str(e)}")
             messagebox.showerror("错误", f"数据库连接失败: {str(e)}")
-            return None
+            raise
+
+    def close(self):
+        """关闭当前数据库的连接池"""
+        self.pool.close_all()
+
+    @contextlib.contextmanager
+    def schema_setup(self):
+        """建表、初始数据和结构迁移的上下文
+
+        程序启动时网络时间通常还没有同步，块内的写操作不受本地时间写保护的限制，
+        只用于维护数据库结构，不要在块内写业务数据。
+        """
+        _schema_setup.depth = getattr(_schema_setup, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            _schema_setup.depth -= 1
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """写事务上下文，块内所有语句（包括execute_query）在同一连接上执行，退出时只提交一次
+
+        用法:
+            with db.transaction() as conn:
+                conn.execute(...)
+        块内抛出异常时整体回滚并继续抛出；可以嵌套，由最外层负责提交。
+        """
+        if _writes_blocked():
+            logger.warning("使用本地时间时禁止执行写事务")
+            raise sqlite3.OperationalError("当前使用的是本地时间，为了数据安全，禁止执行数据库写操作！")
+
+        conn = self.pool.acquire()
+        local = self.pool._local
+        outermost = local.tx_depth == 0
+        try:
+            if outermost and not conn.in_transaction:
+                # 立即获取写锁，避免事务中途升级锁失败
+                conn.execute("BEGIN IMMEDIATE")
+            local.tx_depth += 1
+            try:
+                yield conn
+            finally:
+                local.tx_depth -= 1
+            if outermost:
+                conn.commit()
+        except BaseException:
+            if outermost:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
 
     def execute_query(self, query, params=None, fetch_one=False, fetch_all=False):
         """执行SQL查询
         
         在使用本地时间时，只允许读操作（SELECT），限制写操作（INSERT、UPDATE、DELETE）
         """
-        conn = self.get_connection()
-        if not conn:
+        try:
+            conn = self.get_connection()
+        except sqlite3.Error:
             return None
 
         try:
@@ -61,9 +328,7 @@ class DatabaseManager:
                                 query_upper.startswith('DROP') or \
                                 query_upper.startswith('ALTER')
             
-            # 直接访问全局变量
-            global using_local_time
-            if using_local_time and is_write_operation:
+            if is_write_operation and _writes_blocked():
                 logger.warning(f"使用本地时间时禁止执行写操作: {query[:100]}...")
                 messagebox.showwarning("警告", "当前使用的是本地时间，为了数据安全，禁止执行数据库写操作！\n请检查网络连接后重试。")
                 return None
@@ -73,7 +338,9 @@ class DatabaseManager:
             else:
                 cursor.execute(query)
 
-            conn.commit()
+            # 只读语句不提交；处于transaction()中时由事务统一提交
+            if conn.in_transaction and not self.pool.in_transaction():
+                conn.commit()
 
             if fetch_one:
                 return cursor.fetchone()
@@ -82,6 +349,44 @@ class DatabaseManager:
             return True
         except sqlite3.Error as e:
             logger.error(f"查询执行失败: {str(e)}")
+            if self.pool.in_transaction():
+                # 交给外层事务回滚
+                raise
+            messagebox.showerror("错误", f"数据库操作失败: {str(e)}")
+            return None
+        finally:
+            conn.close()
+
+    def execute_many(self, query, params_list):
+        """批量执行同一条写语句，所有参数在一个事务中提交
+
+        返回受影响的行数，失败返回None
+        """
+        params_list = list(params_list)
+        if not params_list:
+            return 0
+
+        if _writes_blocked():
+            logger.warning(f"使用本地时间时禁止执行写操作: {query[:100]}...")
+            messagebox.showwarning("警告", "当前使用的是本地时间，为了数据安全，禁止执行数据库写操作！\n请检查网络连接后重试。")
+            return None
+
+        try:
+            conn = self.get_connection()
+        except sqlite3.Error:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(query, params_list)
+            if not self.pool.in_transaction():
+                conn.commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"批量执行失败: {str(e)}")
+            if self.pool.in_transaction():
+                raise
+            conn.rollback()
             messagebox.showerror("错误", f"数据库操作失败: {str(e)}")
             return None
         finally:
@@ -141,78 +446,164 @@ def generate_emp_id():
     """生成唯一员工ID"""
     return f"EMP{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-# 全局变量，用于标记是否使用的是本地时间
-using_local_time = False
+NTP_SERVERS = ['pool.ntp.org', 'time.nist.gov', 'ntp.aliyun.com']
 
-def get_network_time():
-    """获取网络时间，若失败则返回本地时间，并设置using_local_time标志"""
-    global using_local_time
-    try:
-        # 尝试从多个NTP服务器获取时间，增加成功率
+
+class NetworkTimeService:
+    """网络时间服务
+
+    在后台线程中向NTP服务器同步时间，记录网络时间与time.monotonic()的对应关系，
+    now()直接由单调时钟推算当前网络时间，不等待网络；之后按固定间隔重新同步。
+    尚未同步成功（刚启动、离线、ntplib未安装）时使用本地时间，并标记using_local_time，
+    此时禁止写数据库。
+    """
+    def __init__(self, servers=None, port=123, timeout=2, refresh_interval=3600, retry_interval=300):
+        self.servers = list(servers or NTP_SERVERS)
+        self.port = port
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._anchor = None          # (monotonic时间, 对应的网络时间戳)
+        self._sync_failed = True     # 还没有可用的网络时间（尚未同步或同步失败）
+        self._forced_local = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    @property
+    def using_local_time(self):
+        with self._lock:
+            return self._forced_local or self._sync_failed
+
+    def sync(self):
+        """同步一次网络时间（阻塞），返回是否成功"""
         try:
             import ntplib
-            ntp_servers = ['pool.ntp.org', 'time.nist.gov', 'ntp.aliyun.com']
-            
-            for server in ntp_servers:
-                try:
-                    client = ntplib.NTPClient()
-                    response = client.request(server, timeout=2)
-                    # 计算网络时间
-                    ntp_time = datetime.datetime.fromtimestamp(response.tx_time)
-                    using_local_time = False
-                    logger.info(f"成功获取网络时间: {ntp_time} from {server}")
-                    return ntp_time
-                except:
-                    continue
-            
-            # 所有NTP服务器都失败
-            local_time = datetime.datetime.now()
-            using_local_time = True
-            logger.warning(f"无法获取网络时间，使用本地时间: {local_time}")
-            return local_time
         except ImportError:
-            # ntplib库未安装
-            local_time = datetime.datetime.now()
-            using_local_time = True
-            logger.warning(f"ntplib库未安装，使用本地时间: {local_time}")
-            return local_time
-    except Exception as e:
-        # 其他错误
-        local_time = datetime.datetime.now()
-        using_local_time = True
-        logger.error(f"获取网络时间异常: {str(e)}, 使用本地时间: {local_time}")
-        return local_time
+            self._mark_failed("ntplib库未安装")
+            return False
+
+        client = ntplib.NTPClient()
+        # 尝试多个NTP服务器，增加成功率
+        for server in self.servers:
+            try:
+                response = client.request(server, port=self.port, timeout=self.timeout)
+            except Exception:
+                continue
+            with self._lock:
+                # offset为网络时间与本机时钟之差，换算到单调时钟上保存
+                self._anchor = (time.monotonic(), time.time() + response.offset)
+                self._sync_failed = False
+            logger.info(f"成功同步网络时间 from {server}，与本地时间相差 {response.offset:.3f} 秒")
+            return True
+
+        self._mark_failed("所有NTP服务器都无法连接")
+        return False
+
+    def _mark_failed(self, reason):
+        with self._lock:
+            # 之前同步成功过时继续使用缓存的网络时间
+            self._sync_failed = self._anchor is None
+            cached = self._anchor is not None
+        if cached:
+            logger.warning(f"重新同步网络时间失败（{reason}），继续使用上次同步的网络时间")
+        else:
+            logger.warning(f"无法获取网络时间（{reason}），使用本地时间")
+
+    def start(self):
+        """启动后台同步线程，重复调用不会启动多个线程"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ntp-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台同步"""
+        self._stop.set()
+        self._wakeup.set()
+
+    def request_sync(self):
+        """让后台线程立即重新同步"""
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            success = self.sync()
+            self._wakeup.wait(self.refresh_interval if success else self.retry_interval)
+            self._wakeup.clear()
+
+    def now(self):
+        """当前时间（datetime，精确到微秒），不会阻塞"""
+        with self._lock:
+            anchor = None if self._forced_local else self._anchor
+        if anchor is None:
+            return datetime.datetime.now()
+        monotonic_base, network_base = anchor
+        return datetime.datetime.fromtimestamp(network_base + (time.monotonic() - monotonic_base))
+
+    def force_local(self, enabled=True):
+        with self._lock:
+            self._forced_local = enabled
+
+
+time_service = NetworkTimeService()
+
+
+def get_network_time():
+    """获取网络时间
+
+    由后台同步的网络时间推算，不等待网络；尚未同步成功时返回本地时间。
+    """
+    time_service.start()
+    return time_service.now()
 
 def is_using_local_time():
     """检查当前是否使用的是本地时间"""
-    global using_local_time
-    return using_local_time
+    return time_service.using_local_time
 
 # 添加一个函数来手动切换到本地时间（用于测试）
 def force_use_local_time():
     """强制使用本地时间（用于测试）"""
-    global using_local_time
-    using_local_time = True
+    time_service.force_local(True)
     logger.info("已强制切换到本地时间模式")
-    return using_local_time
+    return is_using_local_time()
 
 # 添加一个函数来重置时间模式
-def reset_time_mode():
-    """重置时间模式，重新尝试获取网络时间"""
-    global using_local_time
-    using_local_time = False
+def reset_time_mode(worker=None, on_done=None):
+    """重置时间模式，在后台重新尝试获取网络时间，不阻塞界面线程
+
+    传入BackgroundWorker时在其线程池中同步，完成后在主线程调用on_done(是否使用本地时间)；
+    否则由时间服务的后台线程立即重新同步。返回提交的任务（没有worker时为None）。
+    """
+    time_service.force_local(False)
     logger.info("已重置时间模式，将重新尝试获取网络时间")
-    # 立即尝试获取网络时间
-    get_network_time()
-    # 检查最新状态
-    logger.info(f"重置后时间模式状态: {'本地时间' if using_local_time else '网络时间'}")
-    return using_local_time
+    if worker is None:
+        time_service.request_sync()
+        return None
+
+    def finished(_):
+        # 检查最新状态
+        using_local_time = is_using_local_time()
+        logger.info(f"重置后时间模式状态: {'本地时间' if using_local_time else '网络时间'}")
+        if on_done is not None:
+            on_done(using_local_time)
+
+    return worker.submit("time_sync", lambda task: time_service.sync(), on_success=finished, on_error=finished)
 
 # 导出常用函数和类
 __all__ = [
     'DatabaseManager',
+    'ConnectionPool',
+    'get_pool',
+    'close_all_pools',
     'Validator',
     'generate_emp_id',
+    'NetworkTimeService',
+    'time_service',
     'get_network_time',
     'is_using_local_time',
     'force_use_local_time',
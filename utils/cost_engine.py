@@ -0,0 +1,208 @@
+import collections
+import itertools
+
+from utils.common_utils import logger
+from utils.stock_ledger import OPENING_NOTE
+
+# 销售成本计算
+# 每条销售记录的成本（sales.cost）在记录进货、销售时计算并保存，利润报表直接按日期范围汇总，
+# 不再用产品当前的进价估算。支持两种方法：
+#   先进先出：销售依次消耗最早的进货批次，成本为所消耗批次的进价；
+#   移动加权平均：每次进货后重新计算平均进价，销售按当时的平均进价计算成本。
+# 进货、销售可以补录到以前的日期，也可以累加到同一天的记录中，因此任一记录变化时
+# 按日期重放该产品的全部进货、销售和库存调整（同一天依次为进货、销售、调整），只更新成本有变化的销售记录。
+# 库存调整按记录时的产品进价作为批次：增加的数量作为新批次，减少的数量从结存中扣除。
+# 期初库存中没有进货记录的部分早于所有进货，作为第一个批次。
+# 批次仍不足以覆盖的销售数量按记录销售时的产品进价（sales.fallback_price）计算。
+
+FIFO = 'fifo'
+MOVING_AVERAGE = 'average'
+COST_METHODS = {FIFO: "先进先出", MOVING_AVERAGE: "移动加权平均"}
+DEFAULT_METHOD = FIFO
+
+# 重放事件的类型，同一天按此顺序处理
+_PURCHASE, _SALE, _ADJUSTMENT = 0, 1, 2
+
+
+class _FifoCost:
+    """先进先出：未消耗完的批次 [数量, 单价]"""
+    def __init__(self):
+        self.lots = collections.deque()
+
+    def purchase(self, quantity, unit_price):
+        if quantity > 0:
+            self.lots.append([quantity, unit_price])
+
+    def sale(self, quantity, fallback_price):
+        cost = 0
+        while quantity > 0 and self.lots:
+            lot = self.lots[0]
+            used = min(quantity, lot[0])
+            cost += used * lot[1]
+            quantity -= used
+            lot[0] -= used
+            if lot[0] <= 0:
+                self.lots.popleft()
+        return cost + quantity * fallback_price
+
+
+class _AverageCost:
+    """移动加权平均：当前结存数量和平均单价"""
+    def __init__(self):
+        self.quantity = 0
+        self.unit_cost = None
+
+    def purchase(self, quantity, unit_price):
+        if quantity <= 0:
+            return
+        if self.quantity <= 0:
+            # 没有结存（或已超卖）时以本次进价为平均价
+            self.unit_cost = unit_price
+        else:
+            self.unit_cost = (self.quantity * self.unit_cost + quantity * unit_price) / (self.quantity + quantity)
+        self.quantity += quantity
+
+    def sale(self, quantity, fallback_price):
+        self.quantity -= quantity
+        return quantity * (fallback_price if self.unit_cost is None else self.unit_cost)
+
+
+_COSTERS = {FIFO: _FifoCost, MOVING_AVERAGE: _AverageCost}
+
+
+def get_cost_method(conn):
+    """当前的成本计算方法"""
+    row = conn.execute("SELECT value FROM inventory_settings WHERE key = 'cost_method'").fetchone()
+    return row[0] if row and row[0] in COST_METHODS else DEFAULT_METHOD
+
+
+def _product_filter(product_ids):
+    """产品ID条件，返回 (条件模板, 参数)，模板用字段名format；product_ids为None时不限制"""
+    if product_ids is None:
+        return "", ()
+    placeholders = ", ".join(["?"] * len(product_ids))
+    return f" AND {{}} IN ({placeholders})", tuple(product_ids)
+
+
+def _events(conn, product_ids):
+    """按产品、日期排序的进货、销售和库存调整，product_ids为None时取全部产品
+
+    每条为 (产品ID, 类型, 记录ID, 数量, 单价, 已保存的成本, 备注)；
+    销售的单价为进货不足时使用的进价，调整的数量入库为正、出库为负。
+    """
+    condition, params = _product_filter(product_ids)
+    # 流水的创建时间是UTC时间，换算为本地日期后与进货、销售日期比较
+    return conn.execute(f"""
+        SELECT e.product_id, e.kind, e.id, e.quantity, e.unit_price, e.cost, e.note
+        FROM (
+            SELECT product_id, purchase_date AS event_date, {_PURCHASE} AS kind, id, quantity, unit_price,
+                   NULL AS cost, NULL AS note
+            FROM purchases WHERE 1=1{condition.format("product_id")}
+            UNION ALL
+            SELECT s.product_id, s.sale_date, {_SALE}, s.id, s.quantity,
+                   IFNULL(s.fallback_price, IFNULL(pr.purchase_price, 0)), s.cost, NULL
+            FROM sales s LEFT JOIN products pr ON pr.id = s.product_id
+            WHERE 1=1{condition.format("s.product_id")}
+            UNION ALL
+            SELECT product_id, date(created_at, 'localtime'), {_ADJUSTMENT}, id, quantity, unit_cost, NULL, note
+            FROM stock_movements WHERE kind = 'adjustment'{condition.format("product_id")}
+        ) e
+        ORDER BY e.product_id, e.event_date, e.kind, e.id
+    """, params * 3)
+
+
+def _ledger_balances(conn, product_ids):
+    """各产品的流水汇总 {产品ID: 数量}，调整只计入期初库存"""
+    condition, params = _product_filter(product_ids)
+    rows = conn.execute(f"""
+        SELECT product_id, SUM(quantity) FROM stock_movements
+        WHERE (kind != 'adjustment' OR note = ?){condition.format("product_id")}
+        GROUP BY product_id
+    """, (OPENING_NOTE,) + params)
+    return dict(rows.fetchall())
+
+
+def _opening_lot(events, ledger_balance):
+    """期初库存中没有进货记录的数量和单价，没有期初库存时返回None
+
+    期初库存是启用库存流水时的库存数量，已经包含了此前记录的进货和销售，
+    此后的进货、销售和删除记录都记入了流水，因此流水汇总（不含其他调整）
+    与现有进货减销售记录的差就是期初库存中没有进货记录的部分，与记录的日期无关。
+    """
+    recorded = 0
+    opening_price = None
+    for _, kind, _, quantity, unit_price, _, note in events:
+        if kind == _PURCHASE:
+            recorded += quantity or 0
+        elif kind == _SALE:
+            recorded -= quantity or 0
+        elif note == OPENING_NOTE and opening_price is None:
+            opening_price = unit_price or 0
+    if opening_price is None:
+        return None
+    return ledger_balance - recorded, opening_price
+
+
+def _recost(conn, product_ids, method):
+    coster_class = _COSTERS[method]
+    ledger_balances = _ledger_balances(conn, product_ids)
+    updates = []
+    for product_id, product_events in itertools.groupby(_events(conn, product_ids), key=lambda event: event[0]):
+        product_events = list(product_events)
+        coster = coster_class()
+        opening = _opening_lot(product_events, ledger_balances.get(product_id, 0))
+        # 没有进货记录的期初库存早于所有进货，作为第一个批次
+        if opening and opening[0] > 0:
+            coster.purchase(*opening)
+        for _, kind, record_id, quantity, unit_price, stored_cost, note in product_events:
+            quantity = quantity or 0
+            if kind == _PURCHASE:
+                coster.purchase(quantity, unit_price or 0)
+            elif kind == _SALE:
+                cost = round(coster.sale(quantity, unit_price), 2)
+                if stored_cost is None or abs(stored_cost - cost) >= 0.005:
+                    updates.append((cost, record_id))
+            elif note == OPENING_NOTE:
+                # 记录的进货、销售比期初库存多出的部分（如未记录的损耗）在此时扣除
+                if opening[0] < 0:
+                    coster.sale(-opening[0], 0)
+            elif quantity > 0:
+                coster.purchase(quantity, unit_price or 0)
+            else:
+                coster.sale(-quantity, 0)
+    if updates:
+        conn.executemany("UPDATE sales SET cost = ? WHERE id = ?", updates)
+    return len(updates)
+
+
+def update_costs(conn, product_ids):
+    """在conn的当前事务中重新计算这些产品的销售成本，返回更新的销售记录数"""
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return 0
+    return _recost(conn, product_ids, get_cost_method(conn))
+
+
+def recost_all(conn, method=None):
+    """重新计算全部销售记录的成本（如切换计算方法后），返回更新的销售记录数"""
+    method = method or get_cost_method(conn)
+    updated = _recost(conn, None, method)
+    logger.info(f"已按{COST_METHODS[method]}重新计算销售成本，更新 {updated} 条销售记录")
+    return updated
+
+
+def set_cost_method(db_manager, method):
+    """切换成本计算方法并重新计算全部销售成本，返回更新的销售记录数"""
+    if method not in COST_METHODS:
+        raise ValueError(f"未知的成本计算方法: {method}")
+    with db_manager.transaction() as conn:
+        conn.execute(
+            "INSERT INTO inventory_settings (key, value) VALUES ('cost_method', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (method,)
+        )
+        return recost_all(conn, method)
+
+
+__all__ = ['FIFO', 'MOVING_AVERAGE', 'COST_METHODS', 'get_cost_method', 'update_costs', 'recost_all',
+           'set_cost_method']
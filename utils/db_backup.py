@@ -0,0 +1,303 @@
+import os
+import json
+import gzip
+import zlib
+import shutil
+import sqlite3
+import hashlib
+import datetime
+import tempfile
+import pathlib
+import threading
+
+from utils.common_utils import logger
+
+# 数据库在线备份
+# 使用SQLite的backup API分段复制页面：每复制一批页面就释放读锁并短暂等待，
+# 其他连接的写操作可以穿插进行，得到的是一致的快照（复制期间数据库被修改时SQLite会自动重新复制）。
+# 快照做 PRAGMA integrity_check 后按页对齐切成固定大小的块，以块内容的SHA-256为文件名
+# 压缩保存在块存储中，已经存在的块不再写入：未修改的页面在所有备份之间只保存一份，
+# 每次备份新写入的数据量与两次备份之间修改的页数成正比。每个备份的清单（块列表）记录在backups表中。
+# 恢复时按清单拼出数据库文件并校验，再在一个事务中整体写入当前数据库，要么全部替换，要么保持原样。
+
+BACKUP_DIR = 'backups'
+CHUNK_DIR = os.path.join(BACKUP_DIR, 'chunks')
+# 每一步复制的页数（默认页大小4KB时约1MB）和每步之间的等待时间（秒）
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+# 每个块包含的页数
+CHUNK_PAGES = 16
+COMPRESS_LEVEL = 6
+MANIFEST_VERSION = 1
+
+
+class BackupError(Exception):
+    """备份或恢复失败"""
+
+
+def _readonly_uri(db_file):
+    return pathlib.Path(db_file).absolute().as_uri() + "?mode=ro"
+
+
+def integrity_check(db_file):
+    """校验数据库文件，返回 (是否通过, 检查结果)"""
+    try:
+        conn = sqlite3.connect(_readonly_uri(db_file), uri=True)
+        try:
+            rows = conn.execute("PRAGMA integrity_check").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return False, str(e)
+    result = "; ".join(str(row[0]) for row in rows)
+    return result == "ok", result
+
+
+def _copy_database(source, target_conn, pages=-1, sleep=0, progress=None):
+    """把source连接的数据库复制到target_conn"""
+    def report(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+    source.backup(target_conn, pages=pages, progress=report, sleep=sleep)
+
+
+def _remove_files(*paths):
+    for path in paths:
+        for name in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(name):
+                os.remove(name)
+
+
+class ChunkStore:
+    """按内容寻址的块存储，块文件名为内容的SHA-256，写入一次后不再修改"""
+    def __init__(self, root=CHUNK_DIR):
+        self.root = root
+        # 写入块与清理块互斥，避免清理掉正在备份、尚未登记清单的块
+        self.lock = threading.RLock()
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        """保存块，返回 (摘要, 新写入的字节数)；块已存在时不写入"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        partial = path + '.tmp'
+        with open(partial, 'wb') as f:
+            f.write(compressed)
+        os.replace(partial, path)
+        return digest, len(compressed)
+
+    def get(self, digest):
+        """读取块并校验内容"""
+        try:
+            with open(self._path(digest), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            raise BackupError(f"读取备份块失败 {digest}: {e}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"备份块内容已损坏: {digest}")
+        return data
+
+    def digests(self):
+        """存储中所有块的摘要"""
+        if not os.path.isdir(self.root):
+            return set()
+        found = set()
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if os.path.isdir(folder):
+                found.update(name for name in os.listdir(folder) if not name.endswith('.tmp'))
+        return found
+
+    def collect_garbage(self, manifests):
+        """删除不被任何清单引用的块，返回 (删除的块数, 释放的字节数)
+
+        调用方需持有lock，并在持有期间读取清单，保证清单是最新的
+        """
+        with self.lock:
+            referenced = set()
+            for manifest in manifests:
+                referenced.update(load_manifest(manifest)['chunks'])
+            removed = freed = 0
+            for digest in self.digests() - referenced:
+                path = self._path(digest)
+                try:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"删除备份块失败 {digest}: {e}")
+        if removed:
+            logger.info(f"清理了 {removed} 个不再使用的备份块，释放 {freed} 字节")
+        return removed, freed
+
+
+def load_manifest(manifest):
+    """解析清单（JSON字符串或字典）"""
+    if isinstance(manifest, str):
+        manifest = json.loads(manifest)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise BackupError(f"不支持的备份清单版本: {manifest.get('version')}")
+    return manifest
+
+
+def create_backup(db_path, store, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, progress=None):
+    """在线备份db_path到块存储，返回 (清单JSON, 数据库大小, 新写入的字节数)
+
+    progress(已复制页数, 总页数) 在复制过程中调用（在调用线程中）
+    调用方需持有store.lock直到清单登记完成，避免新写入的块被清理
+    """
+    os.makedirs(store.root, exist_ok=True)
+    fd, snapshot = tempfile.mkstemp(suffix='.snapshot', dir=store.root)
+    os.close(fd)
+    try:
+        source = sqlite3.connect(db_path, timeout=30)
+        target = sqlite3.connect(snapshot)
+        try:
+            _copy_database(source, target, pages=pages, sleep=sleep, progress=progress)
+            # 快照会沿用源库的WAL模式，切换回普通日志模式把WAL中的页面写回主文件，保证单个文件完整
+            target.execute("PRAGMA journal_mode=DELETE")
+            page_size = target.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+        ok, result = integrity_check(snapshot)
+        if not ok:
+            raise BackupError(f"备份校验失败: {result}")
+
+        chunk_size = page_size * CHUNK_PAGES
+        chunks = []
+        written = 0
+        with open(snapshot, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                digest, size = store.put(data)
+                chunks.append(digest)
+                written += size
+        db_size = os.path.getsize(snapshot)
+    finally:
+        _remove_files(snapshot)
+
+    manifest = json.dumps({
+        'version': MANIFEST_VERSION,
+        'page_size': page_size,
+        'chunk_size': chunk_size,
+        'size': db_size,
+        'chunks': chunks,
+    })
+    logger.info(f"数据库在线备份完成: {len(chunks)} 个块，数据库 {db_size} 字节，新写入 {written} 字节")
+    return manifest, db_size, written
+
+
+def _restore_from_file(source_file, db_path):
+    """校验source_file后整体写入db_path"""
+    ok, result = integrity_check(source_file)
+    if not ok:
+        raise BackupError(f"备份文件校验失败: {result}")
+
+    source = sqlite3.connect(_readonly_uri(source_file), uri=True)
+    target = sqlite3.connect(db_path, timeout=30)
+    try:
+        # pages=-1 一步复制全部页面，在一个事务中完成替换
+        _copy_database(source, target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _temp_restore_file(db_path):
+    fd, path = tempfile.mkstemp(suffix='.restore', dir=os.path.dirname(os.path.abspath(db_path)))
+    return os.fdopen(fd, 'wb'), path
+
+
+def restore_snapshot(manifest, store, db_path):
+    """按清单从块存储恢复db_path"""
+    manifest = load_manifest(manifest)
+    restore_file = None
+    try:
+        f, restore_file = _temp_restore_file(db_path)
+        with f:
+            for digest in manifest['chunks']:
+                f.write(store.get(digest))
+        if os.path.getsize(restore_file) != manifest['size']:
+            raise BackupError("备份数据大小与清单不一致")
+        _restore_from_file(restore_file, db_path)
+    except (OSError, sqlite3.Error) as e:
+        raise BackupError(str(e)) from e
+    finally:
+        if restore_file:
+            _remove_files(restore_file)
+    logger.info(f"数据库已从备份恢复: {len(manifest['chunks'])} 个块")
+
+
+def restore_backup(backup_file, db_path):
+    """用单文件备份（旧版本的.db或.db.gz）替换db_path的内容"""
+    if not os.path.exists(backup_file):
+        raise BackupError(f"备份文件不存在：{backup_file}")
+
+    restore_file = None
+    try:
+        if backup_file.endswith('.gz'):
+            f, restore_file = _temp_restore_file(db_path)
+            with f, gzip.open(backup_file, 'rb') as src:
+                shutil.copyfileobj(src, f, 1024 * 1024)
+            source_file = restore_file
+        else:
+            source_file = backup_file
+        _restore_from_file(source_file, db_path)
+    except (OSError, sqlite3.Error) as e:
+        raise BackupError(str(e)) from e
+    finally:
+        if restore_file:
+            _remove_files(restore_file)
+    logger.info(f"数据库已从备份恢复: {backup_file}")
+
+
+class RetentionPolicy:
+    """备份保留策略
+
+    保留最近keep_last个备份，以及最近keep_daily天、keep_weekly周、keep_monthly个月中
+    每天/每周/每月最新的一个备份，其余的备份过期。
+    """
+    def __init__(self, keep_last=3, keep_daily=7, keep_weekly=4, keep_monthly=12):
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self.keep_monthly = keep_monthly
+
+    def expired(self, backups):
+        """backups: [(备份ID, 'YYYY-MM-DD HH:MM:SS'), ...]，返回过期的备份ID列表"""
+        # 备份时间只精确到秒，同一秒内的备份按ID区分先后
+        ordered = sorted(backups, key=lambda b: (b[1], b[0]), reverse=True)
+        keep = set(backup_id for backup_id, _ in ordered[:self.keep_last])
+
+        rules = (
+            (self.keep_daily, lambda t: t.date()),
+            (self.keep_weekly, lambda t: t.isocalendar()[:2]),
+            (self.keep_monthly, lambda t: (t.year, t.month)),
+        )
+        for count, period in rules:
+            seen = set()
+            for backup_id, backup_time in ordered:
+                if len(seen) >= count:
+                    break
+                try:
+                    key = period(datetime.datetime.strptime(backup_time, '%Y-%m-%d %H:%M:%S'))
+                except (TypeError, ValueError):
+                    continue
+                if key not in seen:
+                    seen.add(key)
+                    keep.add(backup_id)
+        return [backup_id for backup_id, _ in ordered if backup_id not in keep]
+
+
+__all__ = ['BackupError', 'ChunkStore', 'RetentionPolicy', 'create_backup', 'restore_snapshot',
+           'restore_backup', 'integrity_check', 'load_manifest']
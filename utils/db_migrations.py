@@ -0,0 +1,306 @@
+import datetime
+import sqlite3
+
+from utils.common_utils import logger
+
+# 数据库结构迁移
+# 每个模块（工资、进销存）维护自己的有序迁移列表，已执行的版本记录在schema_version表中，
+# 启动时只执行尚未执行过的迁移。迁移一旦发布不要修改，新的结构变更追加新版本。
+
+
+def _column_exists(conn, table, column):
+    """检查表中是否存在指定字段"""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_column(conn, table, column, definition):
+    """字段不存在时添加字段"""
+    if not _column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _salary_add_employee_contact(conn):
+    # 原先在add_employee中每次插入前检查并添加
+    _add_column(conn, "employees", "contact", "TEXT")
+
+
+def _salary_add_indexes(conn):
+    # 考勤：同一员工同一天只保留最早一条记录（add_attendance更新的正是这一条），再建立唯一索引
+    conn.execute("""DELETE FROM attendance WHERE id NOT IN
+                    (SELECT MIN(id) FROM attendance GROUP BY emp_id, date)""")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_emp_date ON attendance(emp_id, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date)")
+    # 工资：同一员工同一月份只保留最早一条记录（与工资表读取时的取值一致）
+    conn.execute("""DELETE FROM salaries WHERE id NOT IN
+                    (SELECT MIN(id) FROM salaries GROUP BY emp_id, month)""")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_salaries_emp_month ON salaries(emp_id, month)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salaries_month ON salaries(month)")
+    # 收入
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_revenue_date ON revenue(date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_revenue_emp_date ON revenue(emp_id, date)")
+    # 支出
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)")
+
+
+def _salary_add_dirty_tracking(conn):
+    # 待重算的工资记录：考勤、奖金、扣款、基本工资变化后标记，重算后删除
+    conn.execute("""CREATE TABLE IF NOT EXISTS salary_dirty (
+                        emp_id TEXT NOT NULL,
+                        month TEXT NOT NULL,
+                        PRIMARY KEY (emp_id, month)
+                    )""")
+    # 扣款是否为手工设置，手工扣款不随考勤变化重算
+    _add_column(conn, "salaries", "deduction_manual", "INTEGER NOT NULL DEFAULT 0")
+    # 已有记录：扣款与按考勤计算的结果（缺勤和请假每次50元）不一致的视为手工扣款
+    conn.execute("""UPDATE salaries SET deduction_manual = (
+                        IFNULL(deduction, 0) != 50 * (
+                            SELECT COUNT(*) FROM attendance a
+                            WHERE a.emp_id = salaries.emp_id
+                              AND a.date BETWEEN salaries.month || '-01' AND salaries.month || '-31'
+                              AND a.status IN ('absent', 'leave')))""")
+
+
+def _salary_add_backup_manifest(conn):
+    # 按块保存的备份：清单（JSON格式的块列表），旧的单文件备份为空
+    _add_column(conn, "backups", "manifest", "TEXT")
+
+
+def _inventory_add_customer_name(conn):
+    # 新建的客户表缺少name字段，而添加/修改客户时会写入该字段
+    _add_column(conn, "customers", "name", "TEXT")
+
+
+def _inventory_add_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_product_date ON sales(product_id, sale_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchases_date ON purchases(purchase_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchases_product_date ON purchases(product_id, purchase_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_contact ON customers(contact_person)")
+
+
+# 库存流水只追加：禁止修改已有流水的触发器
+_STOCK_MOVEMENTS_NO_UPDATE = """CREATE TRIGGER IF NOT EXISTS trg_stock_movements_no_update
+                    BEFORE UPDATE ON stock_movements
+                    BEGIN
+                        SELECT RAISE(ABORT, '库存流水不能修改');
+                    END"""
+
+
+def _inventory_add_stock_ledger(conn):
+    # 库存流水：只追加不修改，库存表的数量由触发器按流水维护
+    conn.execute("""CREATE TABLE IF NOT EXISTS stock_movements (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        product_id INTEGER NOT NULL,
+                        quantity INTEGER NOT NULL,
+                        kind TEXT NOT NULL,
+                        ref_table TEXT,
+                        ref_id INTEGER,
+                        note TEXT,
+                        created_by TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements(product_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_ref ON stock_movements(ref_table, ref_id)")
+    # 库存：同一产品只保留最早一条记录（原来的更新语句对重复记录的数量改动相同），再建立唯一索引
+    conn.execute("""DELETE FROM inventory WHERE id NOT IN
+                    (SELECT MIN(id) FROM inventory GROUP BY product_id)""")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_product ON inventory(product_id)")
+    # 已有库存作为期初调整记入流水，在建立触发器之前写入，不会重复计入库存
+    conn.execute("""INSERT INTO stock_movements (product_id, quantity, kind, note)
+                    SELECT product_id, quantity, 'adjustment', '期初库存' FROM inventory
+                    WHERE product_id IS NOT NULL AND IFNULL(quantity, 0) != 0""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_stock_movements_apply
+                    AFTER INSERT ON stock_movements
+                    BEGIN
+                        INSERT INTO inventory (product_id, quantity, updated_at)
+                        VALUES (NEW.product_id, NEW.quantity, CURRENT_TIMESTAMP)
+                        ON CONFLICT(product_id) DO UPDATE
+                        SET quantity = IFNULL(quantity, 0) + excluded.quantity, updated_at = CURRENT_TIMESTAMP;
+                    END""")
+    conn.execute(_STOCK_MOVEMENTS_NO_UPDATE)
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_stock_movements_no_delete
+                    BEFORE DELETE ON stock_movements
+                    BEGIN
+                        SELECT RAISE(ABORT, '库存流水不能删除');
+                    END""")
+
+
+def _inventory_add_sale_cost(conn):
+    # 进销存设置（成本计算方法等）
+    conn.execute("""CREATE TABLE IF NOT EXISTS inventory_settings (
+                        key TEXT PRIMARY KEY,
+                        value TEXT
+                    )""")
+    # 每条销售记录的成本，利润报表按日期范围汇总，覆盖索引避免回表
+    _add_column(conn, "sales", "cost", "REAL")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_sales_date_cost
+                    ON sales(sale_date, product_id, quantity, total_amount, cost)""")
+    # 已有销售记录的成本在 v6 补充计算所需的字段后计算
+
+
+def _inventory_add_customer_totals(conn):
+    # 销售记录按客户ID关联客户，已有记录按客户名称（联系人）匹配，同名客户取最早的一个
+    _add_column(conn, "sales", "customer_id", "INTEGER")
+    conn.execute("""UPDATE sales SET customer_id = (
+                        SELECT MIN(c.id) FROM customers c WHERE c.contact_person = sales.customer)
+                    WHERE IFNULL(customer, '') != ''""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_customer_id ON sales(customer_id)")
+    # 每个客户的销售汇总，由触发器维护；按总销售金额排序时使用索引
+    conn.execute("""CREATE TABLE IF NOT EXISTS customer_sales_totals (
+                        customer_id INTEGER PRIMARY KEY,
+                        total_sales REAL NOT NULL DEFAULT 0,
+                        sale_count INTEGER NOT NULL DEFAULT 0
+                    )""")
+    conn.execute("DELETE FROM customer_sales_totals")
+    conn.execute("""INSERT INTO customer_sales_totals (customer_id, total_sales, sale_count)
+                    SELECT c.id, IFNULL(SUM(s.total_amount), 0), COUNT(s.id)
+                    FROM customers c LEFT JOIN sales s ON s.customer_id = c.id
+                    GROUP BY c.id""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_customer_sales_totals_sales
+                    ON customer_sales_totals(total_sales, customer_id)""")
+    # 销售记录增加、删除、修改金额或客户时更新汇总
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_sales_customer_insert
+                    AFTER INSERT ON sales WHEN NEW.customer_id IS NOT NULL
+                    BEGIN
+                        UPDATE customer_sales_totals
+                        SET total_sales = total_sales + IFNULL(NEW.total_amount, 0), sale_count = sale_count + 1
+                        WHERE customer_id = NEW.customer_id;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_sales_customer_delete
+                    AFTER DELETE ON sales WHEN OLD.customer_id IS NOT NULL
+                    BEGIN
+                        UPDATE customer_sales_totals
+                        SET total_sales = total_sales - IFNULL(OLD.total_amount, 0), sale_count = sale_count - 1
+                        WHERE customer_id = OLD.customer_id;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_sales_customer_update
+                    AFTER UPDATE OF total_amount, customer_id ON sales
+                    BEGIN
+                        UPDATE customer_sales_totals
+                        SET total_sales = total_sales - IFNULL(OLD.total_amount, 0), sale_count = sale_count - 1
+                        WHERE customer_id = OLD.customer_id;
+                        UPDATE customer_sales_totals
+                        SET total_sales = total_sales + IFNULL(NEW.total_amount, 0), sale_count = sale_count + 1
+                        WHERE customer_id = NEW.customer_id;
+                    END""")
+    # 新增客户（或修改联系人）时建立汇总记录，并关联以前按该名称记录、尚未关联客户的销售
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_customers_insert
+                    AFTER INSERT ON customers
+                    BEGIN
+                        INSERT OR IGNORE INTO customer_sales_totals (customer_id) VALUES (NEW.id);
+                        UPDATE sales SET customer_id = NEW.id
+                        WHERE customer = NEW.contact_person AND customer_id IS NULL;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_customers_update_contact
+                    AFTER UPDATE OF contact_person ON customers
+                    BEGIN
+                        UPDATE sales SET customer_id = NEW.id
+                        WHERE customer = NEW.contact_person AND customer_id IS NULL;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_customers_delete
+                    AFTER DELETE ON customers
+                    BEGIN
+                        UPDATE sales SET customer_id = NULL WHERE customer_id = OLD.id;
+                        DELETE FROM customer_sales_totals WHERE customer_id = OLD.id;
+                    END""")
+
+
+def _inventory_freeze_cost_prices(conn):
+    # 进货不足以覆盖的销售数量按记录销售时的产品进价计算成本，之后修改进价不影响已有销售
+    _add_column(conn, "sales", "fallback_price", "REAL")
+    conn.execute("""UPDATE sales SET fallback_price = (
+                        SELECT pr.purchase_price FROM products pr WHERE pr.id = sales.product_id)
+                    WHERE fallback_price IS NULL""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_sales_fallback_price
+                    AFTER INSERT ON sales WHEN NEW.fallback_price IS NULL
+                    BEGIN
+                        UPDATE sales SET fallback_price = (
+                            SELECT purchase_price FROM products WHERE id = NEW.product_id)
+                        WHERE id = NEW.id;
+                    END""")
+    # 调整记录（期初库存等）没有进货批次，按记录时的产品进价作为批次单价；
+    # 已有调整记录补充单价时临时去掉禁止修改流水的触发器
+    _add_column(conn, "stock_movements", "unit_cost", "REAL")
+    conn.execute("DROP TRIGGER IF EXISTS trg_stock_movements_no_update")
+    conn.execute("""UPDATE stock_movements SET unit_cost = (
+                        SELECT pr.purchase_price FROM products pr WHERE pr.id = stock_movements.product_id)
+                    WHERE kind = 'adjustment' AND unit_cost IS NULL""")
+    conn.execute(_STOCK_MOVEMENTS_NO_UPDATE)
+    # 已有销售记录按当前的成本计算方法（默认先进先出）重新计算成本
+    from utils.cost_engine import recost_all
+    recost_all(conn)
+
+
+# (版本号, 说明, 迁移函数)
+SALARY_MIGRATIONS = [
+    (1, "员工表增加联系方式字段", _salary_add_employee_contact),
+    (2, "考勤、工资、收入、支出表索引", _salary_add_indexes),
+    (3, "工资增量重算：待重算记录表和手工扣款标记", _salary_add_dirty_tracking),
+    (4, "备份记录增加块清单字段", _salary_add_backup_manifest),
+]
+
+INVENTORY_MIGRATIONS = [
+    (1, "客户表增加名称字段", _inventory_add_customer_name),
+    (2, "销售、进货、客户表索引", _inventory_add_indexes),
+    (3, "库存流水表、库存唯一索引和维护触发器", _inventory_add_stock_ledger),
+    (4, "销售成本字段、进销存设置表", _inventory_add_sale_cost),
+    (5, "销售关联客户ID、客户销售汇总表", _inventory_add_customer_totals),
+    (6, "销售记录和库存调整保存计算成本用的进价", _inventory_freeze_cost_prices),
+]
+
+
+def get_schema_version(db_manager, component):
+    """获取模块当前的结构版本，未执行过迁移时返回0"""
+    db_manager.execute_query('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        component TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        description TEXT,
+        applied_at TEXT NOT NULL,
+        PRIMARY KEY (component, version)
+    )
+    ''')
+    result = db_manager.execute_query(
+        "SELECT MAX(version) FROM schema_version WHERE component=?",
+        (component,),
+        fetch_one=True
+    )
+    return result[0] if result and result[0] is not None else 0
+
+
+def run_migrations(db_manager, component, migrations):
+    """按版本顺序执行尚未执行的迁移，每个迁移在独立事务中执行
+
+    迁移只维护数据库结构，不受本地时间写保护的限制（程序启动时网络时间通常还没有同步）。
+    返回 (是否全部执行成功, 说明)，失败时说明中包含失败的版本和原因，由调用方提示用户。
+    """
+    with db_manager.schema_setup():
+        current_version = get_schema_version(db_manager, component)
+        applied = 0
+        for version, description, migrate in sorted(migrations, key=lambda m: m[0]):
+            if version <= current_version:
+                continue
+            try:
+                with db_manager.transaction() as conn:
+                    migrate(conn)
+                    conn.execute(
+                        "INSERT INTO schema_version (component, version, description, applied_at) VALUES (?, ?, ?, ?)",
+                        (component, version, description, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                    )
+            except Exception as e:
+                # 不只是数据库错误，迁移函数中的任何异常都要报告，不能静默跳过
+                message = f"数据库迁移失败: {component} v{version} {description}: {type(e).__name__}: {str(e)}"
+                logger.error(message)
+                return False, message
+            applied += 1
+            logger.info(f"数据库迁移完成: {component} v{version} {description}")
+    return True, f"已执行 {applied} 个数据库迁移" if applied else "数据库结构已是最新版本"
+
+
+__all__ = [
+    'SALARY_MIGRATIONS',
+    'INVENTORY_MIGRATIONS',
+    'get_schema_version',
+    'run_migrations'
+]
@@ -0,0 +1,261 @@
+import os
+import calendar
+import tempfile
+import contextlib
+
+from utils.common_utils import logger
+
+# Excel流式导出
+# 直接从SQL游标分批读取记录写入openpyxl的只写（write_only）工作簿，已写入的行不再保留在内存中，
+# 导出的内存占用与记录数无关。合计在读取过程中累加，写在每个工作表的最后。
+# 一个工作簿可以包含多个工作表；导出在后台线程执行，定期报告进度并响应取消，
+# 先写入临时文件，完成后再替换目标文件，中途失败或取消不会留下不完整的文件。
+# 读取记录的生成器占用连接池中的连接，导出结束（包括失败、取消）时在导出线程中显式关闭，
+# 不留给垃圾回收在其他线程中归还连接。
+
+FETCH_SIZE = 500
+# 每写入多少行报告一次进度、检查一次是否取消
+PROGRESS_ROWS = 200
+
+
+class Sheet:
+    """一个待导出的工作表
+
+    rows: 可迭代的行（包括最后的合计行），在导出时才逐行读取
+    row_count: 预计的行数，用于计算进度，未知时为None
+    """
+    def __init__(self, title, headers, rows, row_count=None):
+        self.title = title
+        self.headers = list(headers)
+        self.rows = rows
+        self.row_count = row_count
+
+
+def iter_query(db_manager, query, params=(), size=FETCH_SIZE):
+    """逐批读取查询结果，每次只在内存中保留size行"""
+    conn = db_manager.pool.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def _count(db_manager, query, params=()):
+    row = db_manager.execute_query(f"SELECT COUNT(*) FROM ({query})", tuple(params), fetch_one=True)
+    return row[0] if row else None
+
+
+def export_workbook(filename, sheets, progress=None, task=None):
+    """把sheets依次写入filename，返回写入的数据行数（不含表头）
+
+    progress(已写入行数, 预计总行数) 在调用线程中调用；task为BackgroundTask时定期检查是否取消
+    """
+    from openpyxl import Workbook
+
+    counts = [sheet.row_count for sheet in sheets]
+    expected = sum(counts) if None not in counts else None
+
+    wb = Workbook(write_only=True)
+    written = 0
+    try:
+        for sheet in sheets:
+            ws = wb.create_sheet(title=sheet.title)
+            ws.append(sheet.headers)
+            for row in sheet.rows:
+                ws.append(list(row))
+                written += 1
+                if written % PROGRESS_ROWS == 0:
+                    if task is not None:
+                        task.check_cancelled()
+                    if progress is not None:
+                        progress(written, expected)
+    except BaseException:
+        # 中途失败或取消时结束已创建的工作表，关闭openpyxl的临时文件
+        for ws in wb.worksheets:
+            ws.close()
+        raise
+    finally:
+        # 归还尚未读完（或尚未开始读取）的工作表占用的数据库连接
+        for sheet in sheets:
+            close = getattr(sheet.rows, 'close', None)
+            if close is not None:
+                close()
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, partial = tempfile.mkstemp(suffix='.xlsx', dir=directory)
+    os.close(fd)
+    try:
+        wb.save(partial)
+        os.replace(partial, filename)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    if progress is not None:
+        progress(written, written)
+    logger.info(f"已导出 {filename}：{len(sheets)} 个工作表，{written} 行")
+    return written
+
+
+def payroll_sheet(calculator, month):
+    """月度工资表，表头和合计行与界面上的工资表一致"""
+    def rows():
+        total_salary = total_tax = total_bonus = total_deduction = 0
+        with contextlib.closing(calculator.iter_salary_sheet(month, FETCH_SIZE)) as salaries:
+            for salary in salaries:
+                total_salary += salary['final_salary']
+                total_tax += salary['tax']
+                total_bonus += salary['bonus']
+                total_deduction += salary['deduction']
+                yield (salary['emp_id'], salary['name'], round(salary['base_salary'], 2), round(salary['bonus'], 2),
+                       round(salary['deduction'], 2), round(salary['tax'], 2), round(salary['final_salary'], 2),
+                       "已发放" if salary['status'] == "paid" else "未发放", salary['payment_date'] or "")
+
+        # 界面工资表的合计行，以及原导出功能追加的合计行
+        yield ("", "总计", "", round(total_bonus, 2), round(total_deduction, 2),
+               round(total_tax, 2), round(total_salary, 2), "", "")
+        yield ("", "总计", "", "", "", round(total_tax, 2), round(total_salary, 2), "", "")
+
+    return Sheet(f"{month}工资表", ["员工ID", "姓名", "基本工资", "奖金", "扣款", "个人所得税", "实发工资", "状态", "发放日期"],
+                 rows(), calculator.count_salary_sheet() + 2)
+
+
+def attendance_sheet(db_manager, month):
+    """月度考勤汇总：每名在职员工当月的出勤、缺勤、请假天数"""
+    year, month_num = map(int, month.split('-'))
+    start_date = f"{year}-{month_num:02d}-01"
+    end_date = f"{year}-{month_num:02d}-{calendar.monthrange(year, month_num)[1]}"
+    query = """SELECT e.emp_id, e.name, e.department, e.position,
+                      SUM(CASE WHEN a.status='present' THEN 1 ELSE 0 END),
+                      SUM(CASE WHEN a.status='absent' THEN 1 ELSE 0 END),
+                      SUM(CASE WHEN a.status='leave' THEN 1 ELSE 0 END)
+               FROM employees e
+               LEFT JOIN attendance a ON a.emp_id = e.emp_id AND a.date BETWEEN ? AND ?
+               WHERE e.status='active'
+               GROUP BY e.emp_id
+               ORDER BY MIN(e.rowid)"""
+    params = (start_date, end_date)
+
+    def rows():
+        present_total = absent_total = leave_total = 0
+        with contextlib.closing(iter_query(db_manager, query, params)) as records:
+            for emp_id, name, department, position, present, absent, leave in records:
+                present_total += present
+                absent_total += absent
+                leave_total += leave
+                yield (emp_id, name, department or "", position or "", present, absent, leave)
+        yield ("", "总计", "", "", present_total, absent_total, leave_total)
+
+    count = _count(db_manager, query, params)
+    return Sheet(f"{month}考勤", ["员工ID", "姓名", "部门", "职位", "出勤天数", "缺勤天数", "请假天数"],
+                 rows(), None if count is None else count + 1)
+
+
+def revenue_sheets(db_manager, start_date, end_date):
+    """日期范围内的收入明细和按员工统计两个工作表，列和合计行与收入列表的两种统计方式一致"""
+    detail_query = """SELECT r.date, r.emp_id, e.name, r.amount, r.description, r.added_by
+                      FROM revenue r
+                      LEFT JOIN employees e ON r.emp_id = e.emp_id
+                      WHERE r.date BETWEEN ? AND ?
+                      ORDER BY r.date DESC, r.id"""
+    by_employee_query = """SELECT r.emp_id, e.name, SUM(r.amount) AS total_amount, COUNT(*)
+                           FROM revenue r
+                           LEFT JOIN employees e ON r.emp_id = e.emp_id
+                           WHERE r.date BETWEEN ? AND ?
+                           GROUP BY r.emp_id, e.name
+                           ORDER BY total_amount DESC, r.emp_id"""
+    params = (start_date, end_date)
+
+    def detail_rows():
+        total = 0
+        with contextlib.closing(iter_query(db_manager, detail_query, params)) as records:
+            for date, emp_id, name, amount, description, added_by in records:
+                total += amount or 0
+                yield (date, emp_id or "", name or "", amount, description, added_by)
+        yield ("总计", "", "", total, "", "")
+
+    def by_employee_rows():
+        total = records = 0
+        with contextlib.closing(iter_query(db_manager, by_employee_query, params)) as employees:
+            for emp_id, name, amount, count in employees:
+                total += amount or 0
+                records += count
+                yield (emp_id or "", name or "", amount, count)
+        yield ("总计", "", total, records)
+
+    detail_count = _count(db_manager, detail_query, params)
+    by_employee_count = _count(db_manager, by_employee_query, params)
+    return [
+        Sheet("收入明细", ["日期", "员工ID", "员工姓名", "金额", "描述", "添加人"],
+              detail_rows(), None if detail_count is None else detail_count + 1),
+        Sheet("按员工统计", ["员工ID", "员工姓名", "总收入", "记录数"],
+              by_employee_rows(), None if by_employee_count is None else by_employee_count + 1),
+    ]
+
+
+def inventory_sheet(db_manager):
+    """当前库存，列和合计行（库存的进价、售价总额）与库存列表一致"""
+    query = """SELECT pr.product_code, pr.name, pr.category, pr.unit, i.quantity,
+                      pr.purchase_price, pr.selling_price, i.updated_at
+               FROM products pr
+               JOIN inventory i ON pr.id = i.product_id
+               ORDER BY pr.name, pr.id"""
+
+    def rows():
+        purchase_total = selling_total = 0
+        with contextlib.closing(iter_query(db_manager, query)) as records:
+            for row in records:
+                quantity, purchase_price, selling_price = row[4], row[5], row[6]
+                purchase_total += (quantity or 0) * (purchase_price or 0)
+                selling_total += (quantity or 0) * (selling_price or 0)
+                yield row
+        yield ("", "总计", "", "", "", purchase_total, selling_total, "")
+
+    count = _count(db_manager, query)
+    return Sheet("库存", ["产品编码", "产品名称", "类别", "单位", "库存数量", "进价", "售价", "更新时间"],
+                 rows(), None if count is None else count + 1)
+
+
+def yearly_report_sheet(report, report_type, year):
+    """全年报表（ReportEngine.yearly_report的结果），每月一行"""
+    if report_type == "salary":
+        title, headers = f"{year}年工资报表", ["月份", "工资总额", "部门分布", "备注"]
+    elif report_type == "revenue":
+        title, headers = f"{year}年收入报表", ["月份", "收入总额", "部门分布", "备注"]
+    elif report_type == "profit":
+        title, headers = f"{year}年利润报表", ["月份", "收入", "工资支出", "其他支出", "利润", "备注"]
+    elif report_type == "attendance":
+        title, headers = f"{year}年考勤报表", ["月份", "工作日总数", "员工总数", "出勤总天数", "出勤率", "备注"]
+    else:
+        raise ValueError(f"未知的报表类型: {report_type}")
+
+    def rows():
+        for i in range(12):
+            month = f"{i + 1}月"
+            if report_type in ("salary", "revenue"):
+                dept_str = ", ".join([f"{dept}: {amount:.2f}" for dept, amount in report['department_by_month'][i].items()])
+                yield [month, report['months'][i], dept_str, ""]
+            elif report_type == "profit":
+                # 利润 = 收入 - 工资支出 - 其他支出
+                revenue = report['revenue'][i]
+                salary = report['salary'][i]
+                other_expenses = report['other_expenses'][i]
+                yield [month, revenue, salary, other_expenses, revenue - salary - other_expenses, ""]
+            else:
+                total_employees = report['active_employees']
+                weekdays = report['weekdays'][i]
+                present_days = report['present_days'][i]
+                attendance_rate = (present_days / (total_employees * weekdays)) * 100 if (total_employees * weekdays) > 0 else 0
+                yield [month, weekdays, total_employees, present_days, f"{attendance_rate:.2f}%", ""]
+
+    return Sheet(title, headers, rows(), 12)
+
+
+__all__ = ['Sheet', 'iter_query', 'export_workbook', 'payroll_sheet', 'attendance_sheet',
+           'revenue_sheets', 'inventory_sheet', 'yearly_report_sheet']
@@ -5,10 +5,13 @@ import datetime
 
 # 导入自适应对话框类
 from salary_calculator import AdaptiveDialog
+from utils.common_utils import DatabaseManager
+from utils.paged_tree import PagedTreeModel
 
 class ExpenseManager:
-    def __init__(self, db_path, root, notebook, user_role):
+    def __init__(self, db_path, root, notebook, user_role, lazy_tabs=None):
         self.db_path = db_path
+        self.db_manager = DatabaseManager(db_path)
         self.root = root
         self.notebook = notebook
         self.user_role = user_role
@@ -20,6 +23,9 @@ class ExpenseManager:
         # 如果不是管理员，隐藏支出管理标签页
         if self.user_role != 'admin':
             self.notebook.hide(self.expense_frame)
+        elif lazy_tabs is not None:
+            # 第一次选中时再构建
+            lazy_tabs.register(self.expense_frame, self.init_expense_frame)
         else:
             self.init_expense_frame()
 
@@ -82,6 +88,8 @@ class ExpenseManager:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.expense_tree.yview)
         self.expense_tree.configure(yscroll=scrollbar.set)
+        # 分页加载，滚动到底部时取下一页
+        self.expense_model = PagedTreeModel(self.expense_tree, self.db_manager, scrollbar=scrollbar)
         
         # 布局Treeview和滚动条
         self.expense_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -94,10 +102,6 @@ class ExpenseManager:
         self.refresh_expense_list()
 
     def refresh_expense_list(self):
-        # 清空Treeview
-        for item in self.expense_tree.get_children():
-            self.expense_tree.delete(item)
-        
         # 获取日期范围
         start_date = self.expense_start_date_var.get()
         end_date = self.expense_end_date_var.get()
@@ -110,31 +114,17 @@ class ExpenseManager:
             messagebox.showerror("错误", "日期格式必须是 YYYY-MM-DD！")
             return
         
-        # 连接数据库获取支出记录
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
+        # 分页加载支出记录，总计由SQL计算
+        self.expense_model.load(
             """SELECT id, date, category, amount, description, added_by 
                FROM expenses 
-               WHERE date BETWEEN ? AND ? 
-               ORDER BY date DESC""",
-            (start_date, end_date)
+               WHERE date BETWEEN ? AND ?""",
+            (start_date, end_date),
+            order_by="date DESC",
+            key="id",
+            totals=(["SUM(amount)"], lambda t: ("", "总计", "", t[0] or 0, "", "")),
+            sort_columns={column: column for column in self.expense_tree["columns"]}
         )
-        expense_records = cursor.fetchall()
-        conn.close()
-        
-        # 添加到Treeview
-        total_amount = 0
-        for record in expense_records:
-            id, date, category, amount, description, added_by = record
-            self.expense_tree.insert("", tk.END,
-                values=(id, date, category, amount, description, added_by))
-            total_amount += amount
-        
-        # 显示总计
-        self.expense_tree.insert("", tk.END,
-            values=("", "总计", "", total_amount, "", ""))
 
     def add_expense(self):
         # 创建添加支出对话框 - 使用自适应对话框类
@@ -202,7 +192,7 @@ class ExpenseManager:
                     return
                 
                 # 保存到数据库
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO expenses (date, category, amount, description, added_by) VALUES (?, ?, ?, ?, ?)",
@@ -304,7 +294,7 @@ class ExpenseManager:
                     return
                 
                 # 更新数据库
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 cursor.execute(
                     """UPDATE expenses 
@@ -343,7 +333,7 @@ class ExpenseManager:
         # 确认删除
         if messagebox.askyesno("确认", "确定要删除这条支出记录吗？"):
             try:
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM expenses WHERE id=?", (expense_id,))
                 conn.commit()
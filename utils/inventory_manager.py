@@ -7,11 +7,26 @@ import os
 
 # 导入自适应对话框类
 from salary_calculator import AdaptiveDialog
+from utils.common_utils import DatabaseManager
+from utils.db_migrations import run_migrations, INVENTORY_MIGRATIONS
+from utils.paged_tree import PagedTreeModel
+from utils.tree_binder import TreeBinder
+from utils.lazy_tabs import LazyTabs
+from utils.excel_export import export_workbook, inventory_sheet
+from utils.product_search import ProductSearchIndex, Debouncer
+from utils.product_code import generate_product_code, make_unique_codes
+from utils.stock_ledger import record_movement, check_consistency, rebuild_balances, PURCHASE, SALE, ADJUSTMENT, REVERSAL
+from utils.cost_engine import update_costs, get_cost_method, set_cost_method, COST_METHODS
 
 class InventoryManager:
-    def __init__(self, db_path, root, notebook, user_role, current_user=None):
+    def __init__(self, db_path, root, notebook, user_role, current_user=None, lazy_tabs=None, worker=None):
         self.db_path = db_path
+        self.db_manager = DatabaseManager(db_path)
         self.root = root
+        # 后台任务执行器，导出库存时使用
+        self.worker = worker
+        # 产品搜索索引，第一次打开进货/销售对话框时建立
+        self._product_index = None
         self.notebook = notebook
         self.user_role = user_role
         self.current_user = current_user
@@ -26,12 +41,31 @@ class InventoryManager:
         # 如果不是管理员，隐藏进销存管理标签页
         if self.user_role != 'admin':
             self.notebook.hide(self.inventory_frame)
+        elif lazy_tabs is not None:
+            # 第一次选中时再构建
+            lazy_tabs.register(self.inventory_frame, self.init_inventory_frame)
         else:
             self.init_inventory_frame()
     
+    def operator_name(self):
+        """当前登录用户的用户名，未登录时为None"""
+        if self.current_user and hasattr(self.current_user, 'username'):
+            return self.current_user.username
+        if self.current_user and isinstance(self.current_user, dict):
+            return self.current_user.get('username')
+        return None
+    
     def init_database(self):
         """初始化进销存数据库表"""
-        conn = sqlite3.connect(self.db_path)
+        # 数据库可能已被替换（如恢复备份），搜索索引下次使用时重建
+        self._product_index = None
+        # 建表和迁移不受本地时间写保护的限制
+        with self.db_manager.schema_setup():
+            self._create_tables()
+
+    def _create_tables(self):
+        """创建进销存数据表并执行结构迁移"""
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         
         # 创建产品表
@@ -106,6 +140,11 @@ class InventoryManager:
         
         conn.commit()
         conn.close()
+        
+        # 执行结构迁移（补充字段、索引），已执行过的版本会跳过
+        success, message = run_migrations(self.db_manager, 'inventory', INVENTORY_MIGRATIONS)
+        if not success:
+            messagebox.showerror("数据库升级失败", f"{message}\n进销存功能可能无法正常使用，请联系管理员处理。")
     
     def init_inventory_frame(self):
         """初始化进销存管理界面"""
@@ -133,13 +172,16 @@ class InventoryManager:
         self.inventory_notebook.add(self.customer_frame, text="客户管理")
         self.inventory_notebook.add(self.profit_frame, text="利润报表")
         
-        # 初始化各个子页面
-        self.init_product_frame()
-        self.init_purchase_frame()
-        self.init_sale_frame()
-        self.init_stock_frame()
-        self.init_customer_frame()  # 初始化客户管理页面
-        self.init_profit_frame()    # 初始化利润报表页面
+        # 各个子页面在第一次选中时构建
+        self.inventory_tabs = LazyTabs(self.inventory_notebook)
+        self.inventory_tabs.register(self.product_frame, self.init_product_frame)
+        self.inventory_tabs.register(self.purchase_frame, self.init_purchase_frame)
+        self.inventory_tabs.register(self.sale_frame, self.init_sale_frame)
+        self.inventory_tabs.register(self.stock_frame, self.init_stock_frame)
+        self.inventory_tabs.register(self.customer_frame, self.init_customer_frame)  # 客户管理页面
+        self.inventory_tabs.register(self.profit_frame, self.init_profit_frame)      # 利润报表页面
+        self.inventory_notebook.bind("<<NotebookTabChanged>>", self.inventory_tabs.on_tab_changed)
+        self.inventory_tabs.on_tab_changed()
     
     def init_product_frame(self):
         """初始化产品管理页面"""
@@ -192,6 +234,8 @@ class InventoryManager:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.product_tree.yview)
         self.product_tree.configure(yscroll=scrollbar.set)
+        # 按产品ID差量刷新
+        self.product_binder = TreeBinder(self.product_tree)
         
         # 布局Treeview和滚动条
         self.product_tree.pack(side="left", fill="both", expand=True)
@@ -203,14 +247,31 @@ class InventoryManager:
         # 刷新产品列表
         self.refresh_product_list()
     
+    def get_product_index(self):
+        """产品搜索索引，第一次使用时从数据库建立"""
+        if self._product_index is None:
+            products = self.db_manager.execute_query("SELECT id, name FROM products ORDER BY name", fetch_all=True) or []
+            index = ProductSearchIndex()
+            index.build(products)
+            self._product_index = index
+        return self._product_index
+    
+    def _update_product_index(self, product_id, name=None):
+        """产品增删改后同步搜索索引，name为None表示产品已删除"""
+        if self._product_index is None:
+            return
+        if name is None:
+            self._product_index.remove(int(product_id))
+        else:
+            self._product_index.add(int(product_id), name)
+    
     def refresh_product_list(self):
         """刷新产品列表"""
-        # 清空Treeview
-        for item in self.product_tree.get_children():
-            self.product_tree.delete(item)
-        
+        # 页面尚未打开时不用刷新，第一次打开时会加载
+        if not self.inventory_tabs.is_built(self.product_frame):
+            return
         # 连接数据库获取产品列表
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""SELECT id, product_code, name, category, unit, purchase_price, selling_price, description 
@@ -219,11 +280,8 @@ class InventoryManager:
         products = cursor.fetchall()
         conn.close()
         
-        # 添加到Treeview，将ID作为item的iid，而不是显示在列中
-        for product in products:
-            id, product_code, name, category, unit, purchase_price, selling_price, description = product
-            self.product_tree.insert("", "end", iid=id,
-                values=(product_code, name, category, unit, purchase_price, selling_price, description))
+        # 同步到Treeview，将ID作为item的iid，而不是显示在列中；只更新有变化的行
+        self.product_binder.bind([(product[0], product[1:], ()) for product in products])
     
     def add_product(self):
         """添加产品"""
@@ -247,103 +305,17 @@ class InventoryManager:
         name_var = ttk.Entry(name_frame, font=dialog.fonts['normal'])
         name_var.pack(side="left", padx=5, fill=tk.X, expand=True)
         
-        # 自动生成产品编码的函数
-        def generate_product_code(event=None):
+        # 根据产品名称自动生成产品编码（拼音首字母+时间）
+        def update_product_code(event=None):
             name = name_var.get().strip()
-            if not name:
-                code_var.config(state="normal")
-                code_var.delete(0, tk.END)
-                code_var.config(state="disabled")
-                return
-            
-            # 导入pypinyin库用于获取汉字拼音首字母
-            import pypinyin
-            
-            # 获取产品名称所有中文字符的拼音首字母大写
-            def get_pinyin首字母(text):
-                pinyin首字母 = ''
-                # 汉字拼音首字母映射表（常用字）
-                pinyin_map = {
-                    # 基础汉字
-                    '一':'Y', '乙':'Y', '二':'E', '十':'S', '丁':'D', '厂':'C', '七':'Q', '卜':'B', '人':'R', '入':'R', 
-                    '八':'B', '九':'J', '几':'J', '儿':'E', '了':'L', '力':'L', '乃':'N', '刀':'D', '又':'Y',
-                    # 常用汉字
-                    '大':'D', '小':'X', '多':'D', '少':'S', '上':'S', '下':'X', '左':'Z', '右':'Y', '前':'Q', '后':'H', 
-                    '中':'Z', '天':'T', '地':'D', '日':'R', '月':'Y', '水':'S', '火':'H', '风':'F', '雨':'Y', '雷':'L', 
-                    '电':'D', '金':'J', '木':'M', '土':'T', '东':'D', '南':'N', '西':'X', '北':'B', '春':'C', '夏':'X', 
-                    '秋':'Q', '冬':'D', '子':'Z', '丑':'C', '寅':'Y', '卯':'M', '辰':'C', '巳':'S', '午':'W', '未':'W', 
-                    '申':'S', '酉':'Y', '戌':'X', '亥':'H', '鼠':'S', '牛':'N', '虎':'H', '兔':'T', '龙':'L', '蛇':'S', 
-                    '马':'M', '羊':'Y', '猴':'H', '鸡':'J', '狗':'G', '猪':'Z',
-                    # 数字
-                    '壹':'Y', '贰':'E', '叁':'S', '肆':'S', '伍':'W', '陆':'L', '柒':'Q', '捌':'B', '玖':'J', '拾':'S',
-                    # 常见物品名称
-                    '桌':'Z', '椅':'Y', '书':'S', '笔':'B', '纸':'Z', '杯':'B', '盘':'P', '碗':'W', '刀':'D', '叉':'C',
-                    '打':'D', '印':'Y', '机':'J',
-                    '筷':'K', '勺':'S', '瓶':'P', '箱':'X', '袋':'D', '盒':'H', '包':'B', '柜':'G', '床':'C', '灯':'D',
-                    '门':'M', '窗':'C', '墙':'Q', '地':'D', '天':'T', '车':'C', '船':'C', '机':'J', '手':'S', '脚':'J',
-                    '头':'T', '身':'S', '心':'X', '眼':'Y', '耳':'E', '口':'K', '鼻':'B', '舌':'S', '指':'Z', '掌':'Z',
-                    '杯':'B', '壶':'H', '锅':'G', '铲':'C', '勺':'S', '盘':'P', '碗':'W', '筷':'K', '刀':'D', '叉':'C',
-                    '纸':'Z', '笔':'B', '墨':'M', '砚':'Y', '书':'S', '本':'B', '尺':'C', '规':'G', '盒':'H', '包':'B',
-                    '箱':'X', '袋':'D', '瓶':'P', '罐':'G', '桶':'T', '坛':'T', '缸':'G', '盆':'P', '碗':'W', '杯':'B',
-                    '床':'C', '桌':'Z', '椅':'Y', '凳':'D', '柜':'G', '架':'J', '箱':'X', '盒':'H', '包':'B', '袋':'D',
-                    '衣':'Y', '裤':'K', '鞋':'X', '帽':'M', '袜':'W', '巾':'J', '被':'B', '褥':'R', '枕':'Z', '毯':'T',
-                    '灯':'D', '泡':'P', '管':'G', '座':'Z', '架':'J', '台':'T', '扇':'S', '热':'R', '冷':'L', '暖':'N',
-                    '锅':'G', '铲':'C', '勺':'S', '刀':'D', '叉':'C', '筷':'K', '碗':'W', '盘':'P', '杯':'B', '壶':'H',
-                    '米':'M', '面':'M', '油':'Y', '盐':'Y', '酱':'J', '醋':'C', '茶':'C', '酒':'J', '糖':'T', '果':'G',
-                    '肉':'R', '鱼':'Y', '菜':'C', '蛋':'D', '奶':'N', '豆':'D', '米':'M', '面':'M', '粮':'L', '油':'Y',
-                    '水':'S', '电':'D', '气':'Q', '煤':'M', '柴':'C', '火':'H', '光':'G', '热':'R', '冷':'L', '风':'F',
-                    '雨':'Y', '雪':'X', '雷':'L', '电':'D', '霜':'S', '露':'L', '云':'Y', '雾':'W', '冰':'B', '霜':'S',
-                    # 品牌名称常见字
-                    '华':'H', '美':'M', '丽':'L', '雅':'Y', '佳':'J', '优':'Y', '良':'L', '好':'H', '精':'J', '品':'P',
-                    '高':'G', '端':'D', '新':'X', '奇':'Q', '特':'T', '强':'Q', '大':'D', '小':'X', '多':'D', '少':'S',
-                    '长':'C', '短':'D', '宽':'K', '窄':'Z', '厚':'H', '薄':'B', '重':'Z', '轻':'Q', '快':'K', '慢':'M',
-                    '上':'S', '下':'X', '左':'Z', '右':'Y', '前':'Q', '后':'H', '里':'L', '外':'W', '东':'D', '南':'N',
-                    '西':'X', '北':'B', '中':'Z', '内':'N', '外':'W', '里':'L', '表':'B', '正':'Z', '反':'F', '方':'F',
-                    '圆':'Y', '直':'Z', '弯':'W', '高':'G', '低':'D', '矮':'A', '胖':'P', '瘦':'S', '美':'M', '丑':'C',
-                    '好':'H', '坏':'H', '优':'Y', '劣':'L', '善':'S', '恶':'E', '是':'S', '非':'F', '对':'D', '错':'C',
-                    '真':'Z', '假':'J', '实':'S', '虚':'X', '有':'Y', '无':'W', '多':'D', '少':'S', '大':'D', '小':'X',
-                    '长':'C', '短':'D', '粗':'C', '细':'X', '厚':'H', '薄':'B', '深':'S', '浅':'Q', '远':'Y', '近':'J',
-                    '快':'K', '慢':'M', '强':'Q', '弱':'R', '硬':'Y', '软':'R', '冷':'L', '热':'R', '干':'G', '湿':'S',
-                    '饱':'B', '饿':'E', '渴':'K', '困':'K', '醒':'X', '睡':'S', '生':'S', '死':'S', '病':'B', '痛':'T',
-                    '康':'K', '乐':'L', '悲':'B', '喜':'X', '怒':'N', '哀':'A', '惧':'J', '爱':'A', '恨':'H', '情':'Q',
-                    '仇':'C', '恩':'E', '怨':'Y', '愁':'C', '苦':'K', '甜':'T', '酸':'S', '辣':'L', '咸':'X', '淡':'D',
-                    '香':'X', '臭':'C', '浓':'N', '淡':'D', '清':'Q', '浊':'Z', '明':'M', '暗':'A', '亮':'L', '黑':'H',
-                    '白':'B', '红':'H', '黄':'H', '绿':'L', '蓝':'L', '紫':'Z', '青':'Q', '灰':'H', '粉':'F', '橙':'C',
-                    '金':'J', '银':'Y', '铜':'T', '铁':'T', '铝':'L', '锡':'X', '铅':'Q', '锌':'X', '镁':'M', '钛':'T'
-                }
-                
-                for char in text:
-                    if '\u4e00' <= char <= '\u9fff':  # 中文字符
-                        # 使用pypinyin获取拼音首字母，并转换为大写
-                        # errors='ignore'表示忽略无法转换的字符
-                        # strict=False表示更宽松的拼音匹配
-                        pinyin = pypinyin.lazy_pinyin(char, errors='ignore', strict=False)
-                        if pinyin and pinyin[0]:
-                            pinyin首字母 += pinyin[0][0].upper()
-                        else:
-                            pinyin首字母 += 'Z'  # 默认使用Z
-                    else:
-                        # 非中文字符直接转为大写
-                        pinyin首字母 += char.upper()
-                return pinyin首字母
-            
-            # 提取产品名称中所有中文的拼音首字母大写
-            prefix = get_pinyin首字母(name)
-            
-            # 获取当前时间，格式为年月日时分秒
-            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            
-            # 组合生成产品编码
-            product_code = prefix + timestamp
-            
-            # 更新产品编码输入框
             code_var.config(state="normal")
             code_var.delete(0, tk.END)
-            code_var.insert(0, product_code)
+            if name:
+                code_var.insert(0, generate_product_code(name))
             code_var.config(state="disabled")
         
         # 绑定产品名称输入事件，自动生成产品编码
-        name_var.bind("<KeyRelease>", generate_product_code)
+        name_var.bind("<KeyRelease>", update_product_code)
         
         # 类别
         category_frame = ttk.Frame(dialog.main_frame)
@@ -354,7 +326,7 @@ class InventoryManager:
         category_var['validatecommand'] = (category_var.register(lambda s: True), '%P')
         
         # 获取所有产品类别及其使用次数，并按使用次数排序
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT category, COUNT(*) as count FROM products GROUP BY category ORDER BY count DESC")
         category_counts = cursor.fetchall()
@@ -386,7 +358,7 @@ class InventoryManager:
         unit_var['validatecommand'] = (unit_var.register(lambda s: True), '%P')
         
         # 获取所有产品单位及其使用次数，并按使用次数排序
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT unit, COUNT(*) as count FROM products GROUP BY unit ORDER BY count DESC")
         unit_counts = cursor.fetchall()
@@ -449,12 +421,7 @@ class InventoryManager:
                 description = desc_var.get().strip()
                 
                 # 自动添加操作者信息
-                if self.current_user and hasattr(self.current_user, 'username'):
-                    operator_info = f"[操作者: {self.current_user.username}]"
-                elif self.current_user and isinstance(self.current_user, dict) and 'username' in self.current_user:
-                    operator_info = f"[操作者: {self.current_user['username']}]"
-                else:
-                    operator_info = "[操作者: 未知]"
+                operator_info = f"[操作者: {self.operator_name() or '未知'}]"
                 
                 # 在描述末尾添加操作者信息
                 if description:
@@ -475,8 +442,11 @@ class InventoryManager:
                     messagebox.showerror("错误", "价格不能为负数！")
                     return
                 
+                # 编码与已有产品重复时追加序号
+                product_code = make_unique_codes(self.db_manager, [product_code])[0]
+                
                 # 连接数据库添加产品
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 
                 try:
@@ -547,6 +517,7 @@ class InventoryManager:
                     
                     conn.commit()
                     conn.close()
+                    self._update_product_index(product_id, name)
                     
                     messagebox.showinfo("成功", "产品添加成功！")
                     dialog.destroy()
@@ -575,7 +546,7 @@ class InventoryManager:
         product_id = selected_item[0]
         
         # 连接数据库获取产品详细信息
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute(
             "SELECT product_code, name, category, unit, purchase_price, selling_price, description FROM products WHERE id=?",
@@ -600,10 +571,24 @@ class InventoryManager:
         code_frame = ttk.Frame(dialog.main_frame)
         code_frame.pack(fill="x", padx=10, pady=8)
         ttk.Label(code_frame, text="产品编码: ", width=label_width, font=dialog.fonts['normal']).pack(side="left")
-        code_var = ttk.Entry(code_frame, state="disabled", font=dialog.fonts['normal'])
+        code_var = ttk.Entry(code_frame, font=dialog.fonts['normal'])
         code_var.insert(0, product_code)
+        code_var.config(state="disabled")
         code_var.pack(side="left", padx=5, fill=tk.X, expand=True)
         
+        # 按修改后的名称重新生成产品编码
+        def regenerate_product_code():
+            new_name = name_var.get().strip()
+            if not new_name:
+                messagebox.showerror("错误", "产品名称不能为空！")
+                return
+            code_var.config(state="normal")
+            code_var.delete(0, tk.END)
+            code_var.insert(0, generate_product_code(new_name))
+            code_var.config(state="disabled")
+        
+        ttk.Button(code_frame, text="重新生成", command=regenerate_product_code).pack(side="left", padx=5)
+        
         # 产品名称
         name_frame = ttk.Frame(dialog.main_frame)
         name_frame.pack(fill="x", padx=10, pady=8)
@@ -618,7 +603,7 @@ class InventoryManager:
         ttk.Label(category_frame, text="类别: ", width=label_width, font=dialog.fonts['normal']).pack(side="left")
         
         # 从数据库获取类别使用次数并排序
-        conn_category = sqlite3.connect(self.db_path)
+        conn_category = self.db_manager.get_connection()
         cursor_category = conn_category.cursor()
         cursor_category.execute("SELECT category, COUNT(*) as count FROM products GROUP BY category ORDER BY count DESC")
         category_results = cursor_category.fetchall()
@@ -644,7 +629,7 @@ class InventoryManager:
         ttk.Label(unit_frame, text="单位: ", width=label_width, font=dialog.fonts['normal']).pack(side="left")
         
         # 从数据库获取单位使用次数并排序
-        conn_unit = sqlite3.connect(self.db_path)
+        conn_unit = self.db_manager.get_connection()
         cursor_unit = conn_unit.cursor()
         cursor_unit.execute("SELECT unit, COUNT(*) as count FROM products GROUP BY unit ORDER BY count DESC")
         unit_results = cursor_unit.fetchall()
@@ -704,12 +689,7 @@ class InventoryManager:
                 new_description = desc_var.get().strip()
                 
                 # 自动添加操作者信息
-                if self.current_user and hasattr(self.current_user, 'username'):
-                    operator_info = f"[操作者: {self.current_user.username}]"
-                elif self.current_user and isinstance(self.current_user, dict) and 'username' in self.current_user:
-                    operator_info = f"[操作者: {self.current_user['username']}]"
-                else:
-                    operator_info = "[操作者: 未知]"
+                operator_info = f"[操作者: {self.operator_name() or '未知'}]"
                 
                 # 检查描述中是否已包含操作者信息
                 if not any(keyword in new_description for keyword in ['[操作者:', '【操作者:']):
@@ -728,18 +708,23 @@ class InventoryManager:
                     messagebox.showerror("错误", "价格不能为负数！")
                     return
                 
+                # 重新生成的编码与已有产品重复时追加序号
+                if new_product_code != product_code:
+                    new_product_code = make_unique_codes(self.db_manager, [new_product_code])[0]
+                
                 # 连接数据库更新产品
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 
                 try:
                     cursor.execute(
-                        "UPDATE products SET name=?, category=?, unit=?, purchase_price=?, selling_price=?, description=? WHERE id=?",
-                        (new_name, new_category, new_unit, new_purchase_price, new_selling_price, new_description, product_id)
+                        "UPDATE products SET product_code=?, name=?, category=?, unit=?, purchase_price=?, selling_price=?, description=? WHERE id=?",
+                        (new_product_code, new_name, new_category, new_unit, new_purchase_price, new_selling_price, new_description, product_id)
                     )
                     
                     conn.commit()
                     conn.close()
+                    self._update_product_index(product_id, new_name)
                     
                     messagebox.showinfo("成功", "产品更新成功！")
                     dialog.destroy()
@@ -776,7 +761,7 @@ class InventoryManager:
         
         try:
             # 连接数据库删除产品
-            conn = sqlite3.connect(self.db_path)
+            conn = self.db_manager.get_connection()
             cursor = conn.cursor()
             
             # 删除产品（级联删除相关记录）
@@ -784,6 +769,7 @@ class InventoryManager:
             
             conn.commit()
             conn.close()
+            self._update_product_index(product_id)
             
             messagebox.showinfo("成功", "产品删除成功！")
             self.refresh_product_list()
@@ -855,6 +841,8 @@ class InventoryManager:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.purchase_tree.yview)
         self.purchase_tree.configure(yscroll=scrollbar.set)
+        # 分页加载，滚动到底部时取下一页
+        self.purchase_model = PagedTreeModel(self.purchase_tree, self.db_manager, scrollbar=scrollbar)
         
         # 布局Treeview和滚动条
         self.purchase_tree.pack(side="left", fill="both", expand=True)
@@ -865,10 +853,9 @@ class InventoryManager:
     
     def refresh_purchase_list(self):
         """刷新进货列表"""
-        # 清空Treeview
-        for item in self.purchase_tree.get_children():
-            self.purchase_tree.delete(item)
-        
+        # 页面尚未打开时不用刷新，第一次打开时会加载
+        if not self.inventory_tabs.is_built(self.purchase_frame):
+            return
         # 获取日期范围
         start_date = self.purchase_start_date_var.get()
         end_date = self.purchase_end_date_var.get()
@@ -881,37 +868,27 @@ class InventoryManager:
             messagebox.showerror("错误", "日期格式必须是 YYYY-MM-DD！")
             return
         
-        # 连接数据库获取进货记录
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """SELECT p.id, pr.name, p.quantity, p.unit_price, p.total_amount, p.purchase_date, p.supplier, p.created_by 
+        # 分页加载进货记录 - 将ID作为iid，不显示在列中
+        # 总计由SQL计算，放在总金额列下方
+        self.purchase_model.load(
+            """SELECT p.id AS id, pr.name AS product_name, p.quantity AS quantity, p.unit_price AS unit_price,
+                      p.total_amount AS total_amount, p.purchase_date AS purchase_date, p.supplier AS supplier,
+                      p.created_by AS created_by 
                FROM purchases p 
                JOIN products pr ON p.product_id = pr.id 
-               WHERE p.purchase_date BETWEEN ? AND ? 
-               ORDER BY p.purchase_date DESC""",
-            (start_date, end_date)
+               WHERE p.purchase_date BETWEEN ? AND ?""",
+            (start_date, end_date),
+            order_by="purchase_date DESC",
+            key="id",
+            row_factory=lambda row: (row[0], row[1:], ()),
+            totals=(["SUM(total_amount)"], lambda t: ("总计", "", "", t[0] or 0, "", "", "")),
+            sort_columns={column: column for column in self.purchase_tree["columns"]}
         )
-        purchase_records = cursor.fetchall()
-        conn.close()
-        
-        # 添加到Treeview - 将ID作为iid，不显示在列中
-        total_amount = 0
-        for record in purchase_records:
-            id, product_name, quantity, unit_price, total, purchase_date, supplier, created_by = record
-            self.purchase_tree.insert("", "end", iid=id,
-                values=(product_name, quantity, unit_price, total, purchase_date, supplier, created_by))
-            total_amount += total
-        
-        # 显示总计 - 将总计金额放在总金额列下方
-        self.purchase_tree.insert("", "end",
-            values=("总计", "", "", total_amount, "", "", ""))
     
     def add_purchase(self):
         """添加进货记录"""
         # 连接数据库获取产品列表
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT id, name FROM products ORDER BY name")
         products = cursor.fetchall()
@@ -941,52 +918,26 @@ class InventoryManager:
             product_combo.current(0)
         product_combo.pack(side="left", padx=5, fill=tk.X, expand=True)
         
-        # 产品搜索功能
-        def on_product_input(event):
-            try:
-                from pypinyin import lazy_pinyin
-                
-                input_text = product_var.get().lower()
-                if not input_text:
-                    product_combo['values'] = product_names
-                    return
-                
-                # 模糊匹配并按相似度排序
-                matched_products = []
-                for product_name in product_names:
-                    # 原始名称匹配
-                    if input_text in product_name.lower():
-                        # 计算匹配度（包含位置越靠前，匹配度越高）
-                        match_position = product_name.lower().find(input_text)
-                        # 将匹配度和产品名称一起保存
-                        matched_products.append((match_position, product_name))
-                    else:
-                        # 拼音首字母匹配
-                        try:
-                            # 获取产品名称的拼音首字母
-                            pinyin_initials = ''.join([s[0] for s in lazy_pinyin(product_name) if s])
-                            if input_text in pinyin_initials.lower():
-                                # 对于拼音首字母匹配，给一个较高的匹配位置值，表示优先级稍低
-                                match_position = 100 + pinyin_initials.lower().find(input_text)
-                                matched_products.append((match_position, product_name))
-                        except:
-                            # 如果拼音转换失败，忽略此匹配
-                            pass
-                
-                # 按匹配度排序（匹配位置越靠前，排序越靠前）
-                matched_products.sort(key=lambda x: x[0])
-                # 提取排序后的产品列表
-                sorted_products = [product for _, product in matched_products]
-                
-                # 更新下拉菜单
-                product_combo['values'] = sorted_products
-                if sorted_products:
-                    product_combo.event_generate('<Down>')  # 触发下拉菜单显示
-            except Exception as e:
-                pass
+        # 产品搜索功能：按名称和拼音首字母查找，输入停顿后再搜索
+        product_index = self.get_product_index()
+        product_ids = {product[0] for product in products}
+        names_by_id = {product[0]: product[1] for product in products}
+        
+        def on_product_input():
+            input_text = product_var.get()
+            if not input_text:
+                product_combo['values'] = product_names
+                return
+            
+            sorted_products = [names_by_id[product_id] for product_id in product_index.search(input_text, product_ids)]
+            
+            # 更新下拉菜单
+            product_combo['values'] = sorted_products
+            if sorted_products:
+                product_combo.event_generate('<Down>')  # 触发下拉菜单显示
         
         # 绑定输入事件
-        product_combo.bind('<KeyRelease>', on_product_input)
+        product_combo.bind('<KeyRelease>', Debouncer(product_combo, on_product_input))
         
         # 类别
         category_frame = ttk.Frame(dialog.main_frame)
@@ -997,7 +948,7 @@ class InventoryManager:
         category_combo.pack(side="left", padx=5, fill=tk.X, expand=True)
         
         # 获取所有产品类别
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT DISTINCT category FROM products WHERE category IS NOT NULL AND category != ''")
         all_categories = [row[0] for row in cursor.fetchall()]
@@ -1055,7 +1006,7 @@ class InventoryManager:
             if selected_product:
                 try:
                     # 连接数据库获取所选产品的类别和进价
-                    conn = sqlite3.connect(self.db_path)
+                    conn = self.db_manager.get_connection()
                     cursor = conn.cursor()
                     cursor.execute("SELECT category, purchase_price FROM products WHERE name = ?", (selected_product,))
                     result = cursor.fetchone()
@@ -1129,7 +1080,7 @@ class InventoryManager:
                 created_by = "admin"  # 这里应该从当前登录用户获取
                 
                 # 获取产品原始进价
-                conn_get_price = sqlite3.connect(self.db_path)
+                conn_get_price = self.db_manager.get_connection()
                 cursor_get_price = conn_get_price.cursor()
                 cursor_get_price.execute("SELECT purchase_price FROM products WHERE id = ?", (product_id,))
                 original_price = cursor_get_price.fetchone()[0]
@@ -1166,59 +1117,53 @@ class InventoryManager:
                 # 计算总金额
                 total_amount = quantity * unit_price
                 
-                # 连接数据库添加进货记录
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
                 try:
-                    # 检查是否已存在同一天相同产品的进货记录
-                    cursor.execute(
-                        "SELECT id, quantity, unit_price FROM purchases WHERE product_id = ? AND purchase_date = ?",
-                        (product_id, purchase_date)
-                    )
-                    existing_record = cursor.fetchone()
-                    
-                    if existing_record:
-                        # 存在相同记录，累加数量
-                        existing_id, existing_quantity, existing_price = existing_record
-                        new_quantity = existing_quantity + quantity
-                        # 如果单价有变化，使用新的单价重新计算总金额
-                        new_unit_price = unit_price if abs(unit_price - existing_price) > 0.01 else existing_price
-                        new_total_amount = new_quantity * new_unit_price
+                    # 进货记录、库存和产品进价在同一事务中提交
+                    with self.db_manager.transaction() as conn:
+                        cursor = conn.cursor()
                         
-                        # 更新现有记录
+                        # 检查是否已存在同一天相同产品的进货记录
                         cursor.execute(
-                            "UPDATE purchases SET quantity = ?, unit_price = ?, total_amount = ?, supplier = ? WHERE id = ?",
-                            (new_quantity, new_unit_price, new_total_amount, supplier, existing_id)
+                            "SELECT id, quantity, unit_price FROM purchases WHERE product_id = ? AND purchase_date = ?",
+                            (product_id, purchase_date)
                         )
+                        existing_record = cursor.fetchone()
                         
-                        # 更新库存（注意：这里只需要增加新的数量，因为库存已经包含了原有的数量）
-                        cursor.execute(
-                            "UPDATE inventory SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP WHERE product_id = ?",
-                            (quantity, product_id)
-                        )
-                    else:
-                        # 不存在相同记录，插入新记录
-                        cursor.execute(
-                            "INSERT INTO purchases (product_id, quantity, unit_price, total_amount, purchase_date, supplier, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (product_id, quantity, unit_price, total_amount, purchase_date, supplier, created_by)
-                        )
+                        if existing_record:
+                            # 存在相同记录，累加数量
+                            existing_id, existing_quantity, existing_price = existing_record
+                            new_quantity = existing_quantity + quantity
+                            # 如果单价有变化，使用新的单价重新计算总金额
+                            new_unit_price = unit_price if abs(unit_price - existing_price) > 0.01 else existing_price
+                            new_total_amount = new_quantity * new_unit_price
+                            
+                            # 更新现有记录
+                            cursor.execute(
+                                "UPDATE purchases SET quantity = ?, unit_price = ?, total_amount = ?, supplier = ? WHERE id = ?",
+                                (new_quantity, new_unit_price, new_total_amount, supplier, existing_id)
+                            )
+                            purchase_id = existing_id
+                        else:
+                            # 不存在相同记录，插入新记录
+                            cursor.execute(
+                                "INSERT INTO purchases (product_id, quantity, unit_price, total_amount, purchase_date, supplier, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (product_id, quantity, unit_price, total_amount, purchase_date, supplier, created_by)
+                            )
+                            purchase_id = cursor.lastrowid
                         
-                        # 更新库存
-                        cursor.execute(
-                            "UPDATE inventory SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP WHERE product_id = ?",
-                            (quantity, product_id)
-                        )
-                    
-                    # 如果用户确认，同步更新产品管理中的单价
-                    if update_product_price:
-                        cursor.execute(
-                            "UPDATE products SET purchase_price = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                            (unit_price, product_id)
-                        )
-                    
-                    conn.commit()
-                    conn.close()
+                        # 记入库存流水（已有记录时只记新增的数量，库存已经包含了原有的数量）
+                        record_movement(conn, product_id, quantity, PURCHASE, 'purchases', purchase_id,
+                                        created_by=created_by)
+                        
+                        # 如果用户确认，同步更新产品管理中的单价
+                        if update_product_price:
+                            cursor.execute(
+                                "UPDATE products SET purchase_price = ? WHERE id = ?",
+                                (unit_price, product_id)
+                            )
+                        
+                        # 重新计算该产品的销售成本（进货可能补录在已有销售之前）
+                        update_costs(conn, [product_id])
                     
                     # 根据操作类型显示不同的成功消息
                     if existing_record:
@@ -1230,7 +1175,6 @@ class InventoryManager:
                     self.refresh_purchase_list()
                     self.refresh_stock_list()
                 except Exception as e:
-                    conn.close()
                     messagebox.showerror("错误", f"添加进货记录失败：{str(e)}")
             except ValueError:
                 messagebox.showerror("错误", "请输入有效的数字！")
@@ -1261,39 +1205,35 @@ class InventoryManager:
             return
         
         try:
-            # 连接数据库
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 获取进货记录的产品ID和数量
-            cursor.execute(
-                "SELECT product_id, quantity FROM purchases WHERE id=?",
-                (purchase_id,)
-            )
-            purchase_info = cursor.fetchone()
+            # 删除记录和冲销库存在同一事务中提交
+            with self.db_manager.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # 获取进货记录的产品ID和数量
+                cursor.execute(
+                    "SELECT product_id, quantity FROM purchases WHERE id=?",
+                    (purchase_id,)
+                )
+                purchase_info = cursor.fetchone()
+                
+                if purchase_info:
+                    product_id, quantity = purchase_info
+                    
+                    # 删除进货记录
+                    cursor.execute(
+                        "DELETE FROM purchases WHERE id=?",
+                        (purchase_id,)
+                    )
+                    
+                    # 冲销库存
+                    record_movement(conn, product_id, -quantity, REVERSAL, 'purchases', purchase_id,
+                                    note="删除进货记录", created_by=self.operator_name())
+                    update_costs(conn, [product_id])
             
             if not purchase_info:
-                conn.close()
                 messagebox.showerror("错误", "找不到指定的进货记录！")
                 return
             
-            product_id, quantity = purchase_info
-            
-            # 删除进货记录
-            cursor.execute(
-                "DELETE FROM purchases WHERE id=?",
-                (purchase_id,)
-            )
-            
-            # 更新库存
-            cursor.execute(
-                "UPDATE inventory SET quantity = quantity - ?, updated_at = CURRENT_TIMESTAMP WHERE product_id = ?",
-                (quantity, product_id)
-            )
-            
-            conn.commit()
-            conn.close()
-            
             messagebox.showinfo("成功", "进货记录删除成功！")
             self.refresh_purchase_list()
             self.refresh_stock_list()
@@ -1372,6 +1312,9 @@ class InventoryManager:
     
     def refresh_sale_list(self):
         """刷新销售列表"""
+        # 页面尚未打开时不用刷新，第一次打开时会加载
+        if not self.inventory_tabs.is_built(self.sale_frame):
+            return
         # 清空Treeview
         for item in self.sale_tree.get_children():
             self.sale_tree.delete(item)
@@ -1389,7 +1332,7 @@ class InventoryManager:
             return
         
         # 连接数据库获取销售记录
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -1418,7 +1361,7 @@ class InventoryManager:
     def add_sale(self):
         """添加销售记录"""
         # 连接数据库获取有库存的产品列表及售价
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute(
             """SELECT pr.id, pr.name, pr.product_code, i.quantity, pr.selling_price FROM products pr 
@@ -1463,53 +1406,25 @@ class InventoryManager:
         
         product_combo.pack(side="left", padx=5, fill=tk.X, expand=True)
         
-        # 产品搜索功能
-        def on_product_input(event):
-            try:
-                from pypinyin import lazy_pinyin
-                
-                input_text = product_var.get().lower()
-                if not input_text:
-                    product_combo['values'] = product_display_list
-                    return
-                
-                # 模糊匹配并按相似度排序
-                matched_products = []
-                for i, product_name in enumerate(product_names):
-                    # 原始名称匹配
-                    if input_text in product_name.lower():
-                        # 计算匹配度（包含位置越靠前，匹配度越高）
-                        match_position = product_name.lower().find(input_text)
-                        # 将匹配度和产品显示文本一起保存
-                        matched_products.append((match_position, product_display_list[i]))
-                    else:
-                        # 拼音首字母匹配
-                        try:
-                            # 获取产品名称的拼音首字母
-                            pinyin_initials = ''.join([s[0] for s in lazy_pinyin(product_name) if s])
-                            if input_text in pinyin_initials.lower():
-                                # 对于拼音首字母匹配，给一个较高的匹配位置值，表示优先级稍低
-                                match_position = 100 + pinyin_initials.lower().find(input_text)
-                                matched_products.append((match_position, product_display_list[i]))
-                        except:
-                            # 如果拼音转换失败，忽略此匹配
-                            pass
-                
-                # 按匹配度排序（匹配位置越靠前，排序越靠前）
-                matched_products.sort(key=lambda x: x[0])
-                # 提取排序后的产品列表
-                sorted_products = [product for _, product in matched_products]
-                
-                # 更新下拉菜单
-                product_combo['values'] = sorted_products
-                if sorted_products:
-                    product_combo.event_generate('<Down>')  # 触发下拉菜单显示
-            except Exception as e:
-                # 如果发生任何错误，回退到原始列表
+        # 产品搜索功能：按名称和拼音首字母查找，输入停顿后再搜索
+        product_index = self.get_product_index()
+        display_by_id = {product[0]: product_display_list[i] for i, product in enumerate(products)}
+        
+        def on_product_input():
+            input_text = product_var.get()
+            if not input_text:
                 product_combo['values'] = product_display_list
+                return
+            
+            sorted_products = [display_by_id[product_id] for product_id in product_index.search(input_text, display_by_id)]
+            
+            # 更新下拉菜单
+            product_combo['values'] = sorted_products
+            if sorted_products:
+                product_combo.event_generate('<Down>')  # 触发下拉菜单显示
         
         # 绑定输入事件
-        product_combo.bind('<KeyRelease>', on_product_input)
+        product_combo.bind('<KeyRelease>', Debouncer(product_combo, on_product_input))
         
         # 数量
         quantity_frame = ttk.Frame(dialog.main_frame)
@@ -1637,7 +1552,7 @@ class InventoryManager:
                 total_amount = quantity * unit_price
                 
                 # 连接数据库添加销售记录
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 
                 try:
@@ -1659,22 +1574,25 @@ class InventoryManager:
                             "UPDATE sales SET quantity = ?, total_amount = ? WHERE id = ?",
                             (new_quantity, new_total, record_id)
                         )
+                        sale_id = record_id
                         
                         message = "销售记录已更新，数量已累加！"
                     else:
                         # 不存在相同记录，插入新记录
+                        # 按名称关联已有客户；客户尚未添加时，添加客户后自动关联
                         cursor.execute(
-                            "INSERT INTO sales (product_id, quantity, unit_price, total_amount, sale_date, customer, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (product_id, quantity, unit_price, total_amount, sale_date, customer, created_by)
+                            """INSERT INTO sales (product_id, quantity, unit_price, total_amount, sale_date, customer, customer_id, created_by)
+                               VALUES (?, ?, ?, ?, ?, ?, (SELECT MIN(id) FROM customers WHERE contact_person = ?), ?)""",
+                            (product_id, quantity, unit_price, total_amount, sale_date, customer, customer, created_by)
                         )
+                        sale_id = cursor.lastrowid
                         
                         message = "销售记录添加成功！"
                     
-                    # 更新库存
-                    cursor.execute(
-                        "UPDATE inventory SET quantity = quantity - ?, updated_at = CURRENT_TIMESTAMP WHERE product_id = ?",
-                        (quantity, product_id)
-                    )
+                    # 记入库存流水
+                    record_movement(conn, product_id, -quantity, SALE, 'sales', sale_id, created_by=created_by)
+                    # 计算并保存销售成本
+                    update_costs(conn, [product_id])
                     
                     conn.commit()
                     conn.close()
@@ -1694,7 +1612,7 @@ class InventoryManager:
                                 # 检查是否有客户名称
                                 if customer:
                                     # 连接数据库检查客户是否已存在
-                                    check_conn = sqlite3.connect(self.db_path)
+                                    check_conn = self.db_manager.get_connection()
                                     check_cursor = check_conn.cursor()
                                     check_cursor.execute("SELECT contact_person FROM customers WHERE contact_person = ?", (customer,))
                                     existing_customer = check_cursor.fetchone()
@@ -1745,39 +1663,36 @@ class InventoryManager:
             return
         
         try:
-            # 连接数据库
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 获取销售记录的产品ID和数量
-            cursor.execute(
-                "SELECT product_id, quantity FROM sales WHERE id=?",
-                (sale_id,)
-            )
-            sale_info = cursor.fetchone()
+            # 删除记录和冲销库存在同一事务中提交
+            with self.db_manager.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # 获取销售记录的产品ID和数量
+                cursor.execute(
+                    "SELECT product_id, quantity FROM sales WHERE id=?",
+                    (sale_id,)
+                )
+                sale_info = cursor.fetchone()
+                
+                if sale_info:
+                    product_id, quantity = sale_info
+                    
+                    # 删除销售记录
+                    cursor.execute(
+                        "DELETE FROM sales WHERE id=?",
+                        (sale_id,)
+                    )
+                    
+                    # 冲销库存
+                    record_movement(conn, product_id, quantity, REVERSAL, 'sales', sale_id,
+                                    note="删除销售记录", created_by=self.operator_name())
+                    # 之后的销售消耗的进货批次随之变化
+                    update_costs(conn, [product_id])
             
             if not sale_info:
-                conn.close()
                 messagebox.showerror("错误", "找不到指定的销售记录！")
                 return
             
-            product_id, quantity = sale_info
-            
-            # 删除销售记录
-            cursor.execute(
-                "DELETE FROM sales WHERE id=?",
-                (sale_id,)
-            )
-            
-            # 更新库存
-            cursor.execute(
-                "UPDATE inventory SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP WHERE product_id = ?",
-                (quantity, product_id)
-            )
-            
-            conn.commit()
-            conn.close()
-            
             messagebox.showinfo("成功", "销售记录删除成功！")
             self.refresh_sale_list()
             self.refresh_stock_list()
@@ -1800,6 +1715,12 @@ class InventoryManager:
         # 删除库存按钮
         ttk.Button(control_frame, text="删除库存", command=self.delete_stock).pack(side="left", padx=5)
         
+        # 导出按钮
+        ttk.Button(control_frame, text="导出Excel", command=self.export_stock).pack(side="left", padx=5)
+        
+        # 库存校对按钮
+        ttk.Button(control_frame, text="库存校对", command=self.check_stock).pack(side="left", padx=5)
+        
         # 低库存提醒阈值设置
         threshold_frame = ttk.Frame(control_frame)
         threshold_frame.pack(side="right", padx=5)
@@ -1839,6 +1760,10 @@ class InventoryManager:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.stock_tree.yview)
         self.stock_tree.configure(yscroll=scrollbar.set)
+        # 分页加载，滚动到底部时取下一页
+        self.stock_model = PagedTreeModel(self.stock_tree, self.db_manager, scrollbar=scrollbar)
+        # 设置低库存行的样式
+        self.stock_tree.tag_configure("low_stock", foreground="red")
         
         # 布局Treeview和滚动条
         self.stock_tree.pack(side="left", fill="both", expand=True)
@@ -1849,10 +1774,9 @@ class InventoryManager:
     
     def refresh_stock_list(self):
         """刷新库存列表"""
-        # 清空Treeview
-        for item in self.stock_tree.get_children():
-            self.stock_tree.delete(item)
-        
+        # 页面尚未打开时不用刷新，第一次打开时会加载
+        if not self.inventory_tabs.is_built(self.stock_frame):
+            return
         # 获取低库存阈值
         try:
             low_stock_threshold = int(self.low_stock_threshold_var.get().strip())
@@ -1860,53 +1784,94 @@ class InventoryManager:
             low_stock_threshold = 10
             self.low_stock_threshold_var.set("10")
         
-        # 连接数据库获取库存信息
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """SELECT pr.id, pr.product_code, pr.name, pr.category, pr.unit, i.quantity, pr.purchase_price, pr.selling_price, i.updated_at 
+        def row_factory(row):
+            # 将ID作为iid，不显示在列中；库存低于阈值的行标记为红色
+            quantity = row[5]
+            tags = ("low_stock",) if quantity <= low_stock_threshold else ()
+            return row[0], row[1:], tags
+        
+        # 分页加载库存信息，总计同时显示进价和售价的累计
+        self.stock_model.load(
+            """SELECT pr.id AS id, pr.product_code AS product_code, pr.name AS product_name, pr.category AS category,
+                      pr.unit AS unit, i.quantity AS quantity, pr.purchase_price AS purchase_price,
+                      pr.selling_price AS selling_price, i.updated_at AS updated_at 
                FROM products pr 
-               JOIN inventory i ON pr.id = i.product_id 
-               ORDER BY pr.name"""
+               JOIN inventory i ON pr.id = i.product_id""",
+            order_by="product_name",
+            key="id",
+            row_factory=row_factory,
+            totals=(["SUM(quantity * purchase_price)", "SUM(quantity * selling_price)"],
+                    lambda t: ("", "总计", "", "", "", t[0] or 0, t[1] or 0, "")),
+            sort_columns={column: column for column in self.stock_tree["columns"]}
         )
-        stock_info = cursor.fetchall()
-        conn.close()
-        
-        # 检查低库存产品
-        low_stock_products = []
         
-        # 添加到Treeview - 将ID作为iid，不显示在列中
-        total_purchase_value = 0
-        total_selling_value = 0
-        for stock in stock_info:
-            id, product_code, product_name, category, unit, quantity, purchase_price, selling_price, updated_at = stock
-            
-            # 计算库存价值 - 进价和售价
-            total_purchase_value += quantity * purchase_price
-            total_selling_value += quantity * selling_price
-            
-            # 添加到Treeview
-            item = self.stock_tree.insert("", "end", iid=id,
-                values=(product_code, product_name, category, unit, quantity, purchase_price, selling_price, updated_at))
-            
-            # 如果库存低于阈值，标记为低库存
-            if quantity <= low_stock_threshold:
-                low_stock_products.append(product_name)
-                # 设置行颜色为红色
-                self.stock_tree.item(item, tags=("low_stock",))
-        
-        # 设置低库存行的样式
-        self.stock_tree.tag_configure("low_stock", foreground="red")
-        
-        # 显示总计 - 同时显示进价和售价的累计
-        self.stock_tree.insert("", "end",
-            values=("", "总计", "", "", "", total_purchase_value, total_selling_value, ""))
+        # 低库存产品由SQL直接查询，不依赖已加载的页
+        low_stock_products = self.db_manager.execute_query(
+            """SELECT pr.name FROM products pr 
+               JOIN inventory i ON pr.id = i.product_id 
+               WHERE i.quantity <= ? 
+               ORDER BY pr.name""",
+            (low_stock_threshold,),
+            fetch_all=True
+        ) or []
         
         # 如果有低库存产品，显示提醒
         if low_stock_products:
-                messagebox.showinfo("低库存提醒", f"以下产品库存不足：\n{', '.join(low_stock_products)}")
+                messagebox.showinfo("低库存提醒", f"以下产品库存不足：\n{', '.join(row[0] for row in low_stock_products)}")
 
+    def export_stock(self):
+        """导出当前库存，在后台线程中从数据库流式写入"""
+        filename = f"库存_{datetime.date.today().strftime('%Y-%m-%d')}.xlsx"
+        
+        def work(task):
+            return export_workbook(filename, [inventory_sheet(self.db_manager)], task=task)
+        
+        def on_success(rows):
+            messagebox.showinfo("成功", f"库存已导出至 {filename}！")
+        
+        def on_error(error):
+            messagebox.showerror("错误", f"导出库存失败：{str(error)}")
+        
+        if self.worker is None:
+            # 没有后台执行器时直接导出
+            try:
+                on_success(work(None))
+            except Exception as e:
+                on_error(e)
+            return
+        self.worker.submit("export_stock", work, on_success=on_success, on_error=on_error)
+    
+    def check_stock(self):
+        """比较库存与库存流水，不一致时询问是否按流水修正"""
+        try:
+            mismatches = check_consistency(self.db_manager)
+        except Exception as e:
+            messagebox.showerror("错误", f"库存校对失败：{str(e)}")
+            return
+        if not mismatches:
+            messagebox.showinfo("库存校对", "库存与库存流水一致。")
+            return
+        
+        shown = mismatches[:10]
+        names = dict(self.db_manager.execute_query(
+            f"SELECT id, name FROM products WHERE id IN ({', '.join(['?'] * len(shown))})",
+            tuple(product_id for product_id, _, _ in shown),
+            fetch_all=True
+        ) or [])
+        lines = [f"{names.get(product_id, product_id)}：库存 {'无记录' if recorded is None else recorded}，流水 {ledger}"
+                 for product_id, recorded, ledger in shown]
+        if len(mismatches) > 10:
+            lines.append(f"……共 {len(mismatches)} 个产品")
+        if not messagebox.askyesno("库存校对", "以下产品的库存与流水不一致：\n" + "\n".join(lines) + "\n\n是否按流水修正库存？"):
+            return
+        try:
+            fixed = rebuild_balances(self.db_manager)
+        except Exception as e:
+            messagebox.showerror("错误", f"修正库存失败：{str(e)}")
+            return
+        messagebox.showinfo("成功", f"已修正 {len(fixed)} 个产品的库存！")
+        self.refresh_stock_list()
+    
     def delete_stock(self):
         """删除库存"""
         # 获取选中的库存项目
@@ -1926,15 +1891,13 @@ class InventoryManager:
             return
         
         try:
-            # 连接数据库删除库存
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 删除库存记录
-            cursor.execute("DELETE FROM inventory WHERE product_id = ?", (product_id,))
-            
-            conn.commit()
-            conn.close()
+            with self.db_manager.transaction() as conn:
+                # 剩余库存作为调整记入流水后再删除库存记录，流水汇总与库存保持一致
+                row = conn.execute("SELECT quantity FROM inventory WHERE product_id = ?", (product_id,)).fetchone()
+                if row and row[0]:
+                    record_movement(conn, product_id, -row[0], ADJUSTMENT, note="删除库存",
+                                    created_by=self.operator_name())
+                conn.execute("DELETE FROM inventory WHERE product_id = ?", (product_id,))
             
             messagebox.showinfo("成功", "库存记录删除成功！")
             self.refresh_stock_list()
@@ -1997,6 +1960,8 @@ class InventoryManager:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.customer_tree.yview)
         self.customer_tree.configure(yscroll=scrollbar.set)
+        # 按客户ID差量刷新
+        self.customer_binder = TreeBinder(self.customer_tree)
         
         # 布局Treeview和滚动条
         self.customer_tree.pack(side="left", fill="both", expand=True)
@@ -2010,65 +1975,47 @@ class InventoryManager:
     
     def refresh_customer_list(self):
         """刷新客户列表 - 增强版"""
+        # 页面尚未打开时不用刷新，第一次打开时会加载
+        if not self.inventory_tabs.is_built(self.customer_frame):
+            return
         try:
-            # 强制刷新前先隐藏Treeview，避免闪烁
-            self.customer_tree.pack_forget()
-            
-            # 清空Treeview
-            for item in self.customer_tree.get_children():
-                self.customer_tree.delete(item)
-            
             # 连接数据库获取客户列表，并计算总销售金额
-            conn = sqlite3.connect(self.db_path)
+            conn = self.db_manager.get_connection()
             cursor = conn.cursor()
             
-            # 根据排序状态选择不同的SQL查询
+            # 总销售金额取自客户销售汇总表（由触发器维护），两种排序都按索引顺序读取，不用汇总销售记录
             if self.sort_by_sales:
                 # 按总销售金额降序排序
-                cursor.execute("""SELECT c.id, c.customer_code, c.name, c.contact_person, c.phone, c.email, 
-                                  COALESCE(SUM(s.total_amount), 0) as total_sales, c.description 
-                                  FROM customers c 
-                                  LEFT JOIN sales s ON c.contact_person = s.customer 
-                                  GROUP BY c.id, c.customer_code, c.name, c.contact_person, c.phone, c.email, c.description 
-                                  ORDER BY total_sales DESC""")
+                cursor.execute("""SELECT c.id, c.customer_code, c.contact_person, c.phone, c.email, 
+                                  t.total_sales, c.description 
+                                  FROM customer_sales_totals t 
+                                  JOIN customers c ON c.id = t.customer_id 
+                                  ORDER BY t.total_sales DESC, t.customer_id DESC""")
             else:
                 # 按客户编码排序
-                cursor.execute("""SELECT c.id, c.customer_code, c.name, c.contact_person, c.phone, c.email, 
-                                  COALESCE(SUM(s.total_amount), 0) as total_sales, c.description 
+                cursor.execute("""SELECT c.id, c.customer_code, c.contact_person, c.phone, c.email, 
+                                  COALESCE(t.total_sales, 0) as total_sales, c.description 
                                   FROM customers c 
-                                  LEFT JOIN sales s ON c.contact_person = s.customer 
-                                  GROUP BY c.id, c.customer_code, c.name, c.contact_person, c.phone, c.email, c.description 
-                                  ORDER BY customer_code""")
+                                  LEFT JOIN customer_sales_totals t ON t.customer_id = c.id 
+                                  ORDER BY c.customer_code""")
             customers = cursor.fetchall()
             conn.close()
             
-            # 打印调试信息，确认数据已从数据库获取
-            print(f"刷新客户列表：共获取到{len(customers)}个客户")
-            
-            # 添加到Treeview - 将ID作为iid，不显示在列中
+            # 同步到Treeview - 将ID作为iid，不显示在列中；只更新有变化的行
+            rows = []
             for customer in customers:
-                id, customer_code, name, contact_person, phone, email, total_sales, description = customer
+                id, customer_code, contact_person, phone, email, total_sales, description = customer
                 # 确保所有值都不为None，避免Treeview显示问题
                 values = (
                     customer_code or "",
                     contact_person or "",
                     phone or "",
                     email or "",
-                    "" or "",  # 地址字段，根据之前的查询修改
-                    total_sales or 0,
+                    "",  # 地址字段，根据之前的查询修改
+                    round(total_sales or 0, 2),
                     description or "")
-                self.customer_tree.insert("", "end", iid=id, values=values)
-            
-            # 重新显示Treeview
-            self.customer_tree.pack(side="left", fill="both", expand=True)
-            
-            # 多重强制更新UI
-            self.customer_tree.update_idletasks()
-            self.customer_frame.update_idletasks()  # 刷新整个客户框架
-            self.root.update_idletasks()            # 刷新整个应用
-            
-            # 添加短暂延迟后再次刷新，确保彻底更新
-            self.root.after(50, self.customer_tree.update_idletasks)
+                rows.append((id, values, ()))
+            self.customer_binder.bind(rows)
             
         except Exception as e:
             # 添加更详细的错误日志，有助于排查问题
@@ -2179,7 +2126,7 @@ class InventoryManager:
                     return
                 
                 # 连接数据库添加客户
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 
                 try:
@@ -2203,10 +2150,7 @@ class InventoryManager:
                             conn.commit()
                             conn.close()
                             
-                            # 先刷新客户列表，确保数据已写入
                             self.refresh_customer_list()
-                            # 添加短暂延迟确保刷新完成
-                            self.root.update_idletasks()
                             
                             dialog.destroy()
                     else:
@@ -2218,10 +2162,7 @@ class InventoryManager:
                         conn.commit()
                         conn.close()
                         
-                        # 先刷新客户列表，确保数据已写入
                         self.refresh_customer_list()
-                        # 添加短暂延迟确保刷新完成
-                        self.root.update_idletasks()
                         
                         messagebox.showinfo("成功", "客户添加成功！")
                         dialog.destroy()
@@ -2237,7 +2178,7 @@ class InventoryManager:
                         if messagebox.askyesno("提示", "客户编码已存在，是否更新该客户的信息？"):
                             try:
                                 # 连接数据库更新客户信息
-                                conn = sqlite3.connect(self.db_path)
+                                conn = self.db_manager.get_connection()
                                 cursor = conn.cursor()
                                 # 修复：添加name字段的更新，移除不存在的address字段
                                 cursor.execute(
@@ -2247,10 +2188,7 @@ class InventoryManager:
                                 conn.commit()
                                 conn.close()
                                 
-                                # 先刷新客户列表，确保数据已更新
                                 self.refresh_customer_list()
-                                # 添加短暂延迟确保刷新完成
-                                self.root.update_idletasks()
                                 
                                 messagebox.showinfo("成功", "客户信息更新成功！")
                                 dialog.destroy()
@@ -2278,7 +2216,7 @@ class InventoryManager:
         customer_id = selected_item[0]
         
         # 连接数据库获取客户详情
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute(
             "SELECT customer_code, contact_person, phone, email, address, description FROM customers WHERE id=?",
@@ -2370,7 +2308,7 @@ class InventoryManager:
                     return
 
                 # 连接数据库更新客户
-                conn = sqlite3.connect(self.db_path)
+                conn = self.db_manager.get_connection()
                 cursor = conn.cursor()
                 
                 try:
@@ -2420,7 +2358,7 @@ class InventoryManager:
         
         try:
             # 连接数据库
-            conn = sqlite3.connect(self.db_path)
+            conn = self.db_manager.get_connection()
             cursor = conn.cursor()
             
             # 删除客户
@@ -2461,6 +2399,22 @@ class InventoryManager:
         
         ttk.Button(date_frame, text="查询利润", command=self.query_profit).pack(side="left", padx=5)
         
+        # 成本计算方法
+        method_frame = ttk.Frame(control_frame)
+        method_frame.pack(side="right", padx=5)
+        
+        ttk.Label(method_frame, text="成本计算: ").pack(side="left")
+        conn = self.db_manager.get_connection()
+        try:
+            method = get_cost_method(conn)
+        finally:
+            conn.close()
+        self.cost_method_var = tk.StringVar(value=COST_METHODS[method])
+        method_combo = ttk.Combobox(method_frame, textvariable=self.cost_method_var,
+                                    values=list(COST_METHODS.values()), state="readonly", width=12)
+        method_combo.pack(side="left", padx=5)
+        method_combo.bind("<<ComboboxSelected>>", self.change_cost_method)
+        
         # 产品利润明细
         detail_frame = ttk.LabelFrame(main_frame, text="产品利润明细")
         detail_frame.pack(fill="both", expand=True, padx=5, pady=5)
@@ -2496,6 +2450,16 @@ class InventoryManager:
         # 初始查询利润数据
         self.query_profit()
     
+    def change_cost_method(self, event=None):
+        """切换成本计算方法，重新计算全部销售成本后刷新利润"""
+        method = next(key for key, label in COST_METHODS.items() if label == self.cost_method_var.get())
+        try:
+            set_cost_method(self.db_manager, method)
+        except Exception as e:
+            messagebox.showerror("错误", f"切换成本计算方法失败：{str(e)}")
+            return
+        self.query_profit()
+    
     def query_profit(self):
         """查询利润数据"""
         # 获取日期范围
@@ -2511,7 +2475,7 @@ class InventoryManager:
             return
         
         # 连接数据库查询利润数据
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db_manager.get_connection()
         cursor = conn.cursor()
         
         try:
@@ -2522,18 +2486,23 @@ class InventoryManager:
             # 连接数据库查询利润数据 - 仅用于产品利润明细
             
             # 查询产品利润明细
-            # 这里我们需要计算每个产品的销售数量、销售金额、进货成本和利润
-            # 由于销售记录中可能没有直接关联进货成本，我们使用产品表中的进货价格作为参考
+            # 销售成本在记录销售时已按进货批次计算并保存（见 utils.cost_engine），这里只按日期范围汇总
             cursor.execute("""
                 SELECT pr.name, 
-                       SUM(s.quantity) as sale_quantity,
-                       SUM(s.quantity * pr.purchase_price) as purchase_cost,
-                       SUM(s.total_amount) as sale_revenue,
-                       (SUM(s.total_amount) - SUM(s.quantity * pr.purchase_price)) as product_profit
-                FROM sales s
+                       s.sale_quantity,
+                       s.purchase_cost,
+                       s.sale_revenue,
+                       (s.sale_revenue - s.purchase_cost) as product_profit
+                FROM (
+                    SELECT product_id,
+                           SUM(quantity) as sale_quantity,
+                           IFNULL(SUM(cost), 0) as purchase_cost,
+                           SUM(total_amount) as sale_revenue
+                    FROM sales
+                    WHERE sale_date BETWEEN ? AND ?
+                    GROUP BY product_id
+                ) s
                 JOIN products pr ON s.product_id = pr.id
-                WHERE s.sale_date BETWEEN ? AND ?
-                GROUP BY pr.id
                 ORDER BY product_profit DESC
             """, (start_date, end_date))
             
@@ -0,0 +1,91 @@
+from utils.common_utils import logger
+
+# Notebook标签页延迟构建
+# 标签页先以空Frame占位，第一次选中时才创建控件并加载数据，登录后进入主界面的时间
+# 不再随模块数量增加。选中某个标签页后，在空闲时预先构建下一个可见的标签页，
+# 切换过去时不用再等待。控件只能在Tk主线程创建，预构建通过after在主线程空闲时执行。
+
+
+class LazyTabs:
+    """管理一个Notebook中延迟构建的标签页"""
+    def __init__(self, notebook, prefetch_delay=500):
+        self.notebook = notebook
+        self.prefetch_delay = prefetch_delay
+        self._builders = {}       # 标签页路径 -> 构建函数
+        self._refreshers = {}     # 标签页路径 -> (刷新函数, 构建后是否立即刷新)
+        self._built = set()
+        self._prefetch_job = None
+
+    def register(self, frame, builder, refresh=None, refresh_after_build=False):
+        """登记标签页
+
+        builder: 第一次选中时调用，创建控件（可以同时加载数据）
+        refresh: 以后每次选中时调用；refresh_after_build为True时构建完成后也立即调用一次
+        """
+        tab = str(frame)
+        self._builders[tab] = builder
+        if refresh is not None:
+            self._refreshers[tab] = (refresh, refresh_after_build)
+
+    def is_built(self, frame):
+        """标签页是否已经构建（未登记的标签页视为已构建）"""
+        tab = str(frame)
+        return tab not in self._builders or tab in self._built
+
+    def ensure_built(self, frame):
+        """标签页尚未构建时立即构建，返回本次是否执行了构建"""
+        tab = str(frame)
+        if tab not in self._builders or tab in self._built:
+            return False
+        # 先标记为已构建，构建函数中调用的刷新方法才会执行
+        self._built.add(tab)
+        try:
+            self._builders[tab]()
+        except Exception as e:
+            self._built.discard(tab)
+            logger.error(f"构建标签页失败: {self.notebook.tab(tab, 'text')}: {str(e)}")
+            raise
+        return True
+
+    def on_tab_changed(self, event=None):
+        """处理<<NotebookTabChanged>>：构建或刷新当前标签页，并安排预构建下一个"""
+        tab = self.notebook.select()
+        if not tab:
+            return
+        try:
+            just_built = self.ensure_built(tab)
+        except Exception:
+            # 错误已记录，再次选中时会重新尝试构建
+            return
+        refresh, refresh_after_build = self._refreshers.get(tab, (None, False))
+        if refresh is not None and (not just_built or refresh_after_build):
+            refresh()
+        self.schedule_prefetch(tab)
+
+    def schedule_prefetch(self, current):
+        """空闲时构建current之后第一个未构建的可见标签页"""
+        if self._prefetch_job is not None:
+            self.notebook.after_cancel(self._prefetch_job)
+            self._prefetch_job = None
+        tabs = list(self.notebook.tabs())
+        if current not in tabs:
+            return
+        index = tabs.index(current)
+        for tab in tabs[index + 1:] + tabs[:index]:
+            if not self.is_built(tab) and self.notebook.tab(tab, "state") != "hidden":
+                self._prefetch_job = self.notebook.after(self.prefetch_delay, self._prefetch, tab)
+                return
+
+    def _prefetch(self, tab):
+        self._prefetch_job = None
+        # 等待期间用户可能已经切换过去
+        if self.is_built(tab):
+            return
+        try:
+            self.ensure_built(tab)
+        except Exception:
+            # 错误已记录，用户选中该标签页时会再次尝试
+            pass
+
+
+__all__ = ['LazyTabs']
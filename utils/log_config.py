@@ -0,0 +1,144 @@
+import os
+import time
+import queue
+import atexit
+import threading
+import logging
+import logging.handlers
+
+# 日志配置
+# 业务代码通过QueueHandler把日志放入队列后立即返回，由后台QueueListener线程写入
+# 按大小轮转的日志文件和控制台，界面线程不会因为写磁盘而阻塞。
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = 'salary_system.log'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# 各模块（文件名，不含.py）的最低日志级别，未列出的模块使用默认级别
+# 也可以用环境变量 SALARY_LOG_LEVELS 覆盖，如 "salary_calculator=DEBUG,inventory_manager=WARNING"
+DEFAULT_LEVEL = logging.INFO
+MODULE_LEVELS = {}
+
+# 同一行代码在一个时间窗口内最多输出的INFO/DEBUG日志条数，超出的只计数，
+# 在下一个窗口的第一条日志中注明省略了多少条，退出时汇总尚未报告的条数。WARNING及以上不做采样。
+SAMPLE_WINDOW = 1.0
+SAMPLE_LIMIT = 20
+
+
+def _parse_levels(text):
+    """解析 "模块=级别,模块=级别" 形式的配置"""
+    levels = {}
+    for part in (text or "").split(","):
+        if "=" not in part:
+            continue
+        module, level = part.split("=", 1)
+        level = logging.getLevelName(level.strip().upper())
+        if isinstance(level, int):
+            levels[module.strip()] = level
+    return levels
+
+
+class ModuleLevelFilter(logging.Filter):
+    """按产生日志的模块过滤级别"""
+    def __init__(self, levels, default_level):
+        super().__init__()
+        self.levels = dict(levels)
+        self.default_level = default_level
+
+    def filter(self, record):
+        return record.levelno >= self.levels.get(record.module, self.default_level)
+
+
+class SamplingFilter(logging.Filter):
+    """对同一位置高频输出的低级别日志采样"""
+    def __init__(self, window=SAMPLE_WINDOW, limit=SAMPLE_LIMIT):
+        super().__init__()
+        self.window = window
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._counters = {}  # (文件, 行号) -> [窗口开始时间, 已输出条数, 省略条数]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or now - counter[0] >= self.window:
+                suppressed = counter[2] if counter else 0
+                self._counters[key] = [now, 1, 0]
+            elif counter[1] < self.limit:
+                counter[1] += 1
+                return True
+            else:
+                counter[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} （此前省略了 {suppressed} 条同位置的日志）"
+            record.args = None
+        return True
+
+    def pop_suppressed(self):
+        """取出尚未报告的省略条数 {(文件, 行号): 条数}"""
+        with self._lock:
+            suppressed = {key: counter[2] for key, counter in self._counters.items() if counter[2]}
+            for key in suppressed:
+                self._counters[key][2] = 0
+        return suppressed
+
+
+_listener = None
+_sampler = None
+
+
+def setup_logging(log_file=LOG_FILE, level=DEFAULT_LEVEL, module_levels=None):
+    """配置异步日志，重复调用时直接返回"""
+    global _listener, _sampler
+    if _listener is not None:
+        return _listener
+
+    levels = dict(MODULE_LEVELS)
+    levels.update(module_levels or {})
+    levels.update(_parse_levels(os.environ.get('SALARY_LOG_LEVELS')))
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    # 设置文件处理器使用UTF-8编码，按大小轮转
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ModuleLevelFilter(levels, level))
+    _sampler = SamplingFilter()
+    queue_handler.addFilter(_sampler)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    # 级别过滤由ModuleLevelFilter完成，这里放行到模块配置中的最低级别
+    root.setLevel(min([level] + list(levels.values())))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """停止后台日志线程，写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        for (pathname, lineno), count in _sampler.pop_suppressed().items():
+            logging.getLogger('salary_system').info(
+                f"{os.path.basename(pathname)}:{lineno} 共省略了 {count} 条日志")
+        _listener.stop()
+        _listener = None
+
+
+__all__ = ['setup_logging', 'shutdown_logging', 'ModuleLevelFilter', 'SamplingFilter']
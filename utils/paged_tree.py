@@ -0,0 +1,166 @@
+from utils.common_utils import logger
+from utils.tree_binder import TreeBinder
+
+# Treeview分页数据模型
+# 列表查询不再一次取出全部记录：先加载第一页，滚动到接近底部时再按 LIMIT/OFFSET 取下一页。
+# 排序在SQL中完成（点击列标题切换升序/降序），合计行由SQL聚合计算，始终显示在最后一行。
+# 行通过TreeBinder按主键差量更新，重新执行同一查询时保留已加载的页数，只改动变化的行。
+
+
+def like_pattern(text):
+    """把搜索文本转换为LIKE模式（配合 ESCAPE '\\' 使用），转义其中的通配符"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class PagedTreeModel:
+    """为Treeview提供分页加载、SQL排序和合计行"""
+    def __init__(self, tree, db_manager, scrollbar=None, page_size=100):
+        self.tree = tree
+        self.db_manager = db_manager
+        self.scrollbar = scrollbar
+        self.page_size = page_size
+
+        self._query = None
+        self._params = ()
+        self._order_by = ""
+        self._key = None
+        self._row_factory = None
+        self._totals = None
+        self._sort_columns = {}
+        self._sort = None  # (列名, 是否降序)
+        self._rows = []
+        self._totals_values = None
+        self._total_count = 0
+        self._loading = False
+        self._binder = TreeBinder(tree)
+        self._load_scheduled = False
+
+        # 滚动到底部附近时加载下一页
+        self.tree.configure(yscrollcommand=self._on_yscroll)
+        # 点击列标题在SQL中排序
+        for column in self.tree["columns"]:
+            self.tree.heading(column, command=lambda c=column: self.sort(c))
+
+    @property
+    def total_count(self):
+        """查询结果总行数（不含合计行）"""
+        return self._total_count
+
+    @property
+    def has_more(self):
+        return len(self._rows) < self._total_count
+
+    def load(self, query, params=(), order_by="", key=None, row_factory=None,
+             totals=None, sort_columns=None):
+        """执行新的查询并加载第一页
+
+        query: 不含ORDER BY/LIMIT的SELECT语句，排序、合计表达式都引用它的输出列名
+        order_by: 默认排序，如 "date DESC"
+        key: 唯一列名，追加到排序末尾保证分页结果稳定
+        row_factory: row -> (iid或None, values, tags)，默认直接把整行作为values
+        totals: (聚合表达式列表, 格式化函数)，格式化函数接收聚合结果返回合计行values
+        sort_columns: {Treeview列名: 查询输出列名}，只有其中的列可以点击排序
+
+        返回合计查询的结果（聚合值..., 总行数）
+        """
+        # 重新执行同一查询（编辑记录后刷新）时保留已加载的行数
+        same_query = (query, tuple(params)) == (self._query, self._params)
+        window = max(len(self._rows), self.page_size) if same_query else self.page_size
+        
+        self._query = query
+        self._params = tuple(params)
+        self._order_by = order_by
+        self._key = key
+        self._row_factory = row_factory or (lambda row: (None, row, ()))
+        self._totals = totals
+        self._sort_columns = sort_columns or {}
+        if self._sort and self._sort[0] not in self._sort_columns:
+            self._sort = None
+
+        exprs, formatter = totals if totals else ([], None)
+        totals_row = self._query_totals(exprs)
+        self._total_count = totals_row[-1] or 0
+
+        self._totals_values = formatter(totals_row[:-1]) if formatter else None
+        self._rows = []
+        self._fetch(window)
+        return totals_row
+
+    def reload(self):
+        """按当前查询和排序重新加载"""
+        if self._query is None:
+            return
+        self.load(self._query, self._params, self._order_by, self._key, self._row_factory,
+                  self._totals, self._sort_columns)
+
+    def _query_totals(self, exprs):
+        select = ", ".join(list(exprs) + ["COUNT(*)"])
+        row = self.db_manager.execute_query(
+            f"SELECT {select} FROM ({self._query})", self._params, fetch_one=True)
+        return tuple(row) if row else (None,) * len(exprs) + (0,)
+
+    def _order_clause(self):
+        parts = []
+        if self._sort:
+            column, descending = self._sort
+            parts.append(f"{self._sort_columns[column]} {'DESC' if descending else 'ASC'}")
+        elif self._order_by:
+            parts.append(self._order_by)
+        if self._key:
+            parts.append(self._key)
+        return f" ORDER BY {', '.join(parts)}" if parts else ""
+
+    def _fetch(self, limit):
+        """从已加载的行之后再取limit行，并把变化同步到Treeview"""
+        self._loading = True
+        try:
+            rows = self.db_manager.execute_query(
+                f"SELECT * FROM ({self._query}){self._order_clause()} LIMIT ? OFFSET ?",
+                self._params + (limit, len(self._rows)),
+                fetch_all=True
+            ) or []
+            self._rows.extend(self._row_factory(row) for row in rows)
+            if len(rows) < limit:
+                # 实际行数少于预期（期间有删除），不再继续翻页
+                self._total_count = len(self._rows)
+            
+            # 合计行始终在最后；翻页期间数据变化导致的重复行由TreeBinder跳过
+            display = list(self._rows)
+            if self._totals_values is not None:
+                display.append((("totals",), self._totals_values, ()))
+            self._binder.bind(display)
+            return len(rows)
+        except Exception as e:
+            logger.error(f"分页加载列表失败: {str(e)}")
+            return 0
+        finally:
+            self._loading = False
+
+    def load_more(self):
+        """加载下一页，返回本次加载的行数"""
+        if self._query is None or self._loading or not self.has_more:
+            return 0
+        return self._fetch(self.page_size)
+
+    def sort(self, column):
+        """按列排序：第一次点击升序，再次点击降序"""
+        if column not in self._sort_columns:
+            return
+        descending = bool(self._sort and self._sort[0] == column and not self._sort[1])
+        self._sort = (column, descending)
+        self.reload()
+
+    def _on_yscroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if float(last) >= 0.95 and self.has_more and not self._load_scheduled:
+            self._load_scheduled = True
+            self.tree.after_idle(self._scheduled_load)
+
+    def _scheduled_load(self):
+        self._load_scheduled = False
+        self.load_more()
+
+
+__all__ = ['PagedTreeModel', 'like_pattern']
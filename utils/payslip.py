@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 批量生成工资条PDF
+# 用法: python -m utils.payslip 2024-05 [--db salary_system.db] [--out payslips] [--merge] [--workers 4]
+# 工资记录从数据库逐批读取，每批员工交给进程池中的一个进程渲染，每人生成一个PDF；
+# 指定 --merge 时所有员工的工资条合并在一个PDF中（每人一页，在当前进程中渲染）。
+# 字体和段落样式在每个进程中只注册、创建一次，之后渲染的所有文档共用。
+# 进程池不可用时（如部分移动端环境）自动改为在当前进程中逐个渲染。
+
+import os
+import re
+import sys
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.common_utils import logger
+from utils.log_config import setup_logging
+
+PAYSLIP_DIR = 'payslips'
+# 每个任务渲染的工资条数，减少进程间传递数据的次数
+CHUNK_SIZE = 20
+
+# 依次尝试注册的中文字体，都不存在时使用reportlab默认字体
+FONT_NAME = 'PayslipFont'
+FONT_CANDIDATES = [
+    'C:/Windows/Fonts/simhei.ttf',
+    'C:/Windows/Fonts/msyh.ttc',
+    '/system/fonts/NotoSansCJK-Regular.ttc',
+    '/system/fonts/DroidSansFallback.ttf',
+    '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+]
+
+_styles = None
+
+
+def get_styles():
+    """注册字体并创建段落样式，每个进程只执行一次"""
+    global _styles
+    if _styles is not None:
+        return _styles
+
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    font_name = None
+    for path in FONT_CANDIDATES:
+        if not os.path.exists(path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont(FONT_NAME, path))
+            font_name = FONT_NAME
+            break
+        except Exception as e:
+            logger.warning(f"注册字体失败 {path}: {str(e)}")
+
+    styles = getSampleStyleSheet()
+    body_style = styles['BodyText']
+    heading_style = styles['Heading1']
+    heading_style.alignment = 1  # 居中
+    if font_name:
+        body_style.fontName = font_name
+        heading_style.fontName = font_name
+    _styles = (body_style, heading_style)
+    return _styles
+
+
+def payslip_elements(month, salary):
+    """一名员工工资条的内容，与打印个人工资表的格式一致"""
+    from reportlab.platypus import Paragraph, Spacer
+
+    body_style, heading_style = get_styles()
+    return [
+        Paragraph(f"{month}月份工资表", heading_style),
+        Spacer(1, 24),
+        Paragraph("===== 员工信息 ====", body_style),
+        Paragraph(f"员工ID: {salary['emp_id']}", body_style),
+        Paragraph(f"姓名: {salary['name']}", body_style),
+        Paragraph(f"部门: {salary['department']}", body_style),
+        Paragraph(f"职位: {salary['position']}", body_style),
+        Paragraph(f"入职日期: {salary['hire_date']}", body_style),
+        Spacer(1, 24),
+        Paragraph("===== 工资详情 ====", body_style),
+        Paragraph(f"基本工资: {salary['base_salary']:.2f} 元", body_style),
+        Paragraph(f"奖金: {salary['bonus']:.2f} 元", body_style),
+        Paragraph(f"扣款: {salary['deduction']:.2f} 元", body_style),
+        Paragraph(f"个人所得税: {salary['tax']:.2f} 元", body_style),
+        Paragraph(f"实发工资: {salary['final_salary']:.2f} 元", body_style),
+        Spacer(1, 24),
+        Paragraph("===== 发放信息 ====", body_style),
+        Paragraph(f"发放状态: {'已发放' if salary['status'] == 'paid' else '未发放'}", body_style),
+        Paragraph(f"发放日期: {salary['payment_date'] or '未发放'}", body_style),
+    ]
+
+
+def _build(path, elements):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate
+
+    # 先写临时文件再替换，中途失败不会留下不完整的PDF
+    partial = path + '.tmp'
+    SimpleDocTemplate(partial, pagesize=A4).build(elements)
+    os.replace(partial, path)
+
+
+def payslip_filename(salary):
+    """员工工资条的文件名，去掉文件名中不允许的字符"""
+    name = re.sub(r'[\\/:*?"<>|\s]+', '_', f"{salary['emp_id']}_{salary['name']}")
+    return f"{name}.pdf"
+
+
+def render_payslips(month, salaries, out_dir):
+    """每名员工渲染一个PDF，返回生成的文件路径列表（在进程池中执行）"""
+    paths = []
+    for salary in salaries:
+        path = os.path.join(out_dir, payslip_filename(salary))
+        _build(path, payslip_elements(month, salary))
+        paths.append(path)
+    return paths
+
+
+def render_merged(month, salaries, path, progress=None, task=None):
+    """所有员工的工资条合并在一个PDF中，每人一页，返回员工数
+
+    progress(已完成人数) 每加入一名员工调用一次
+    """
+    from reportlab.platypus import PageBreak
+
+    elements = []
+    count = 0
+    for salary in salaries:
+        if task is not None:
+            task.check_cancelled()
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(payslip_elements(month, salary))
+        count += 1
+        if progress is not None:
+            progress(count)
+    _build(path, elements)
+    return count
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _create_pool(workers):
+    # 主进程中有Tk和后台线程，用spawn启动子进程，避免fork复制线程状态
+    try:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    except (OSError, ValueError, NotImplementedError, ImportError) as e:
+        logger.warning(f"无法创建进程池，改为在当前进程中生成工资条: {str(e)}")
+        return None
+
+
+def _render_each(month, salaries, month_dir, workers, progress, task):
+    """每人一个PDF，多个进程时按批交给进程池渲染"""
+    pool = _create_pool(workers) if workers > 1 else None
+    paths = []
+
+    def finished(chunk_paths):
+        paths.extend(chunk_paths)
+        progress(len(paths))
+
+    if pool is None:
+        for chunk in _chunks(salaries, CHUNK_SIZE):
+            if task is not None:
+                task.check_cancelled()
+            finished(render_payslips(month, chunk, month_dir))
+    else:
+        pending = set()
+        try:
+            # 边读取边提交，同时在途的批次数有上限，读取的工资记录不会全部堆积在内存中
+            for chunk in _chunks(salaries, CHUNK_SIZE):
+                if task is not None:
+                    task.check_cancelled()
+                pending.add(pool.submit(render_payslips, month, chunk, month_dir))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished(future.result())
+            while pending:
+                if task is not None:
+                    task.check_cancelled()
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished(future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    return paths
+
+
+def generate_payslips(calculator, month, out_dir=PAYSLIP_DIR, merge=False, workers=None,
+                      progress=None, task=None):
+    """生成指定月份全部在职员工的工资条
+
+    返回生成的文件路径列表；progress(已完成人数, 总人数) 在调用线程中调用，
+    task为BackgroundTask时在每批完成后检查是否取消
+    """
+    month_dir = os.path.join(out_dir, month)
+    os.makedirs(month_dir, exist_ok=True)
+    total = calculator.count_salary_sheet()
+    salaries = calculator.iter_salary_sheet(month)
+
+    def report(done):
+        if progress is not None:
+            progress(done, total)
+
+    try:
+        if merge:
+            path = os.path.join(month_dir, f"{month}工资条.pdf")
+            count = render_merged(month, salaries, path, progress=report, task=task)
+            logger.info(f"已生成 {month} 工资条（合并）: {path}，{count} 人")
+            return [path]
+        paths = _render_each(month, salaries, month_dir, workers or os.cpu_count() or 1, report, task)
+    finally:
+        # 提前结束时释放读取工资记录的数据库连接
+        salaries.close()
+
+    logger.info(f"已生成 {month} 工资条: {len(paths)} 个文件，保存在 {month_dir}")
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量生成工资条PDF")
+    parser.add_argument('month', help="月份，格式 YYYY-MM")
+    parser.add_argument('--db', default='salary_system.db', help="数据库文件")
+    parser.add_argument('--out', default=PAYSLIP_DIR, help="输出目录")
+    parser.add_argument('--merge', action='store_true', help="合并为一个PDF文件")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认为CPU核数")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', args.month):
+        print("月份格式必须是 YYYY-MM")
+        return 2
+    if not os.path.exists(args.db):
+        print(f"数据库文件不存在: {args.db}")
+        return 2
+
+    from src.salary_calculator import SalaryCalculator
+    from utils.common_utils import time_service
+    # 还没有工资记录的员工需要先生成工资记录（写数据库），先同步网络时间
+    if not time_service.sync():
+        print("无法同步网络时间，使用本地时间时不能生成新的工资记录")
+    calculator = SalaryCalculator(args.db)
+
+    def progress(done, total):
+        print(f"\r已生成 {done}/{total}", end='', flush=True)
+
+    try:
+        paths = generate_payslips(calculator, args.month, args.out, merge=args.merge,
+                                  workers=args.workers, progress=progress)
+    except Exception as e:
+        print(f"\n生成工资条失败: {e}")
+        return 1
+    print(f"\n共生成 {len(paths)} 个文件，保存在 {os.path.join(args.out, args.month)}")
+    return 0
+
+
+__all__ = ['generate_payslips', 'render_payslips', 'render_merged', 'payslip_elements', 'get_styles']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
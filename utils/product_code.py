@@ -0,0 +1,134 @@
+import datetime
+import functools
+
+from utils.common_utils import logger
+
+# 产品编码
+# 编码 = 产品名称各字的拼音首字母（非汉字原样转大写）+ 生成时间（年月日时分秒）。
+# 常用汉字（GB2312一级汉字，按拼音排序）的首字母由编码区间直接得到，第一次使用时建表，
+# 表外的汉字才使用pypinyin，结果缓存。生成的编码与products.product_code已有的编码重复时
+# 依次追加 -2、-3……，已有编码通过唯一索引的范围查询一次取出。
+
+# GB2312一级汉字中各拼音首字母的起始编码
+_GB2312_INITIALS = [
+    (0xB0A1, 'A'), (0xB0C5, 'B'), (0xB2C1, 'C'), (0xB4EE, 'D'), (0xB6EA, 'E'), (0xB7A2, 'F'),
+    (0xB8C1, 'G'), (0xB9FE, 'H'), (0xBBF7, 'J'), (0xBFA6, 'K'), (0xC0AC, 'L'), (0xC2E8, 'M'),
+    (0xC4C3, 'N'), (0xC5B6, 'O'), (0xC5BE, 'P'), (0xC6DA, 'Q'), (0xC8BB, 'R'), (0xC8F6, 'S'),
+    (0xCBFA, 'T'), (0xCDDA, 'W'), (0xCEF4, 'X'), (0xD1B9, 'Y'), (0xD4D1, 'Z'),
+]
+_GB2312_LEVEL1_END = 0xD7F9
+# 无法得到拼音的汉字使用的首字母
+DEFAULT_INITIAL = 'Z'
+# 每次查询已有编码的个数
+QUERY_BATCH = 500
+
+_initial_table = None
+
+
+def _load_initial_table():
+    """建立 汉字 -> 拼音首字母 的对照表（GB2312一级汉字）"""
+    global _initial_table
+    if _initial_table is not None:
+        return _initial_table
+    table = {}
+    bounds = _GB2312_INITIALS + [(_GB2312_LEVEL1_END + 1, None)]
+    for (start, initial), (end, _) in zip(bounds, bounds[1:]):
+        for code in range(start, end):
+            low = code & 0xFF
+            if not 0xA1 <= low <= 0xFE:
+                continue
+            try:
+                table[bytes([code >> 8, low]).decode('gb2312')] = initial
+            except (UnicodeDecodeError, LookupError):
+                continue
+    _initial_table = table
+    return table
+
+
+@functools.lru_cache(maxsize=4096)
+def _pinyin_initial(char):
+    """对照表中没有的汉字，用pypinyin获取首字母"""
+    try:
+        import pypinyin
+        pinyin = pypinyin.lazy_pinyin(char, errors='ignore', strict=False)
+    except Exception as e:
+        logger.warning(f"获取拼音失败: {char}: {str(e)}")
+        return DEFAULT_INITIAL
+    return pinyin[0][0].upper() if pinyin and pinyin[0] else DEFAULT_INITIAL
+
+
+def is_hanzi(char):
+    return '\u4e00' <= char <= '\u9fff'
+
+
+def char_initial(char):
+    """单个字符的编码字母：汉字取拼音首字母大写，其他字符转为大写"""
+    if is_hanzi(char):
+        initial = _load_initial_table().get(char)
+        return initial if initial is not None else _pinyin_initial(char)
+    return char.upper()
+
+
+def code_prefix(name):
+    """产品名称对应的编码前缀"""
+    return ''.join(char_initial(char) for char in name.strip())
+
+
+def generate_product_code(name, now=None):
+    """生成产品编码（不检查是否重复）"""
+    now = now or datetime.datetime.now()
+    return code_prefix(name) + now.strftime("%Y%m%d%H%M%S")
+
+
+def _taken_codes(db_manager, codes):
+    """已存在的、以codes中某个编码开头的产品编码"""
+    codes = list(dict.fromkeys(codes))
+    taken = set()
+    # SQLite单条语句的参数个数有限，编码很多时分批查询
+    for start in range(0, len(codes), QUERY_BATCH):
+        batch = codes[start:start + QUERY_BATCH]
+        # 每个编码查询 [编码, 编码+'.') 区间，包括编码本身和追加了 -序号 的编码，可以使用唯一索引
+        values = ", ".join(["(?)"] * len(batch))
+        rows = db_manager.execute_query(
+            f"""WITH candidates(code) AS (VALUES {values})
+                SELECT p.product_code FROM candidates
+                JOIN products p ON p.product_code >= candidates.code AND p.product_code < candidates.code || '.'""",
+            tuple(batch),
+            fetch_all=True
+        )
+        if rows is None:
+            raise RuntimeError("查询已有产品编码失败")
+        taken.update(row[0] for row in rows)
+    return taken
+
+
+def make_unique_codes(db_manager, codes):
+    """把codes调整为互不重复、也不与已有产品重复的编码：重复的编码依次追加 -2、-3……"""
+    taken = _taken_codes(db_manager, codes)
+    unique = []
+    next_suffix = {}  # 编码 -> 下一个要尝试的序号
+    for base in codes:
+        code = base
+        suffix = next_suffix.get(base, 2)
+        while code in taken:
+            code = f"{base}-{suffix}"
+            suffix += 1
+        next_suffix[base] = suffix
+        taken.add(code)
+        unique.append(code)
+    return unique
+
+
+def unique_product_codes(db_manager, names, now=None):
+    """为一批产品名称（如批量导入）生成编码，顺序与names一致"""
+    now = now or datetime.datetime.now()
+    return make_unique_codes(db_manager, [generate_product_code(name, now) for name in names])
+
+
+def unique_product_code(db_manager, name, now=None):
+    """为一个产品名称生成不与已有产品重复的编码"""
+    return unique_product_codes(db_manager, [name], now)[0]
+
+
+__all__ = ['is_hanzi', 'char_initial', 'code_prefix', 'generate_product_code', 'make_unique_codes',
+           'unique_product_code', 'unique_product_codes']
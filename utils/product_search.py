@@ -0,0 +1,145 @@
+import bisect
+
+from utils.common_utils import logger
+from utils.product_code import is_hanzi, char_initial
+
+# 产品搜索索引
+# 产品名称（小写）和拼音首字母在建立索引时计算一次，之后输入搜索词时不再转换拼音。
+# 拼音首字母与产品编码共用 utils.product_code 的汉字首字母表。
+# 每个字段的所有后缀放在一个有序数组中，包含搜索词的名称就是以搜索词开头的那些后缀，
+# 用二分查找定位；匹配位置即后缀的起始位置。排序规则与原来一致：
+# 名称匹配在前（按匹配位置），拼音首字母匹配在后（按匹配位置+100），位置相同时按名称排序。
+# 产品增删改时只更新对应的后缀，不用重建整个索引。
+
+PINYIN_RANK_OFFSET = 100
+# 输入停顿多少毫秒后再搜索
+DEBOUNCE_DELAY = 150
+
+
+def pinyin_initials(name):
+    """名称的拼音首字母（小写）：每个汉字取首字母，连续的非汉字部分取第一个字符"""
+    initials = []
+    previous_hanzi = True
+    for char in name:
+        hanzi = is_hanzi(char)
+        if hanzi or previous_hanzi:
+            initials.append(char_initial(char) if hanzi else char)
+        previous_hanzi = hanzi
+    return ''.join(initials).lower()
+
+
+class _SuffixArray:
+    """字符串集合的有序后缀数组，查找包含某个子串的字符串及其首次出现位置"""
+    def __init__(self):
+        self._suffixes = []  # (后缀, 起始位置, 键)
+
+    @staticmethod
+    def _entries(text, key):
+        return [(text[i:], i, key) for i in range(len(text))]
+
+    def add(self, text, key):
+        for entry in self._entries(text, key):
+            bisect.insort(self._suffixes, entry)
+
+    def remove(self, text, key):
+        for entry in self._entries(text, key):
+            index = bisect.bisect_left(self._suffixes, entry)
+            if index < len(self._suffixes) and self._suffixes[index] == entry:
+                del self._suffixes[index]
+
+    def rebuild(self, items):
+        """items: [(文本, 键)]"""
+        self._suffixes = sorted(entry for text, key in items for entry in self._entries(text, key))
+
+    def find(self, pattern):
+        """返回 {键: 首次出现的位置}"""
+        positions = {}
+        index = bisect.bisect_left(self._suffixes, (pattern,))
+        while index < len(self._suffixes):
+            suffix, position, key = self._suffixes[index]
+            if not suffix.startswith(pattern):
+                break
+            if key not in positions or position < positions[key]:
+                positions[key] = position
+            index += 1
+        return positions
+
+
+class ProductSearchIndex:
+    """按名称和拼音首字母搜索产品"""
+    def __init__(self):
+        self._products = {}  # 产品ID -> (名称, 小写名称, 拼音首字母)
+        self._names = _SuffixArray()
+        self._initials = _SuffixArray()
+
+    def __len__(self):
+        return len(self._products)
+
+    def build(self, products):
+        """用 [(产品ID, 名称)] 重建索引"""
+        self._products = {}
+        for product_id, name in products:
+            self._products[product_id] = (name, name.lower(), pinyin_initials(name))
+        self._names.rebuild((lower, product_id) for product_id, (_, lower, _) in self._products.items())
+        self._initials.rebuild((initials, product_id) for product_id, (_, _, initials) in self._products.items())
+
+    def add(self, product_id, name):
+        """新增或修改产品"""
+        self.remove(product_id)
+        entry = (name, name.lower(), pinyin_initials(name))
+        self._products[product_id] = entry
+        self._names.add(entry[1], product_id)
+        self._initials.add(entry[2], product_id)
+
+    def remove(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if entry is not None:
+            self._names.remove(entry[1], product_id)
+            self._initials.remove(entry[2], product_id)
+
+    def search(self, text, candidates=None):
+        """返回匹配的产品ID列表，按匹配程度排序
+
+        candidates: 只在这些产品ID中查找（如有库存的产品），为None时查找全部
+        """
+        text = text.lower()
+        name_matches = self._names.find(text)
+        initials_matches = self._initials.find(text)
+        ranked = []
+        for product_id in set(name_matches) | set(initials_matches):
+            if candidates is not None and product_id not in candidates:
+                continue
+            if product_id in name_matches:
+                rank = name_matches[product_id]
+            else:
+                rank = PINYIN_RANK_OFFSET + initials_matches[product_id]
+            ranked.append((rank, self._products[product_id][0], product_id))
+        ranked.sort()
+        return [product_id for _, _, product_id in ranked]
+
+
+class Debouncer:
+    """输入停顿delay毫秒后才调用func，停顿前的输入只触发最后一次"""
+    def __init__(self, widget, func, delay=DEBOUNCE_DELAY):
+        self.widget = widget
+        self.func = func
+        self.delay = delay
+        self._job = None
+
+    def __call__(self, event=None):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+        self._job = self.widget.after(self.delay, self._run)
+
+    def _run(self):
+        self._job = None
+        # 等待期间对话框可能已经关闭
+        if not self.widget.winfo_exists():
+            return
+        try:
+            self.func()
+        except Exception as e:
+            logger.error(f"执行搜索失败: {str(e)}")
+
+
+__all__ = ['ProductSearchIndex', 'Debouncer', 'pinyin_initials']
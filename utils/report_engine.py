@@ -0,0 +1,200 @@
+import calendar
+import datetime
+
+# 年度报表数据
+# 每类报表用少量 GROUP BY substr(月份/日期, 1, 7) 查询取出全年按月汇总的数据，
+# 以长度为12的列表（下标0对应1月）返回，图表页和Excel导出共用。
+
+
+def _month_index(month_key):
+    """'YYYY-MM' -> 0..11"""
+    return int(month_key[5:7]) - 1
+
+
+def _date_range(year):
+    """全年日期范围 [起, 止)"""
+    return f"{year}-01-01", f"{year + 1}-01-01"
+
+
+class ReportEngine:
+    """年度报表数据汇总"""
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def _query(self, query, params=()):
+        return self.db_manager.execute_query(query, params, fetch_all=True) or []
+
+    def _monthly_totals(self, query, params):
+        """查询结果为 (月份, 金额) 时，转换为12个月的金额列表"""
+        totals = [0] * 12
+        for month_key, total in self._query(query, params):
+            if month_key:
+                totals[_month_index(month_key)] = total or 0
+        return totals
+
+    def _monthly_groups(self, query, params):
+        """查询结果为 (月份, 分组, 金额) 时，转换为12个月的 {分组: 金额} 列表"""
+        groups = [{} for _ in range(12)]
+        for month_key, group, total in self._query(query, params):
+            if month_key:
+                groups[_month_index(month_key)][group] = total or 0
+        return groups
+
+    def departments(self):
+        """所有员工部门"""
+        return [row[0] for row in self._query("SELECT DISTINCT department FROM employees")]
+
+    # ---------- 工资 ----------
+    def salary_by_month(self, year):
+        """各月已发放工资总额（按工资所属月份）"""
+        return self._monthly_totals(
+            """SELECT substr(month, 1, 7) AS m, SUM(final_salary) FROM salaries
+               WHERE month BETWEEN ? AND ? AND status='paid'
+               GROUP BY m""",
+            (f"{year}-01", f"{year}-12")
+        )
+
+    def salary_by_month_department(self, year):
+        """各月已发放工资按部门汇总"""
+        return self._monthly_groups(
+            """SELECT substr(s.month, 1, 7) AS m, e.department, SUM(s.final_salary)
+               FROM salaries s
+               JOIN employees e ON s.emp_id = e.emp_id
+               WHERE s.month BETWEEN ? AND ? AND s.status='paid'
+               GROUP BY m, e.department
+               ORDER BY m, e.department""",
+            (f"{year}-01", f"{year}-12")
+        )
+
+    def top_employee_salaries(self, year, limit=10):
+        """全年已发放工资最高的员工 [(姓名, 工资总额), ...]"""
+        return self._query(
+            """SELECT e.name, SUM(s.final_salary) AS total_salary
+               FROM salaries s
+               JOIN employees e ON s.emp_id = e.emp_id
+               WHERE s.month BETWEEN ? AND ? AND s.status='paid'
+               GROUP BY e.emp_id
+               ORDER BY total_salary DESC
+               LIMIT ?""",
+            (f"{year}-01", f"{year}-12", limit)
+        )
+
+    def salary_paid_by_month(self, year):
+        """各月实际发放的工资（按发放日期）"""
+        return self._monthly_totals(
+            """SELECT substr(payment_date, 1, 7) AS m, SUM(final_salary) FROM salaries
+               WHERE payment_date >= ? AND payment_date < ?
+               GROUP BY m""",
+            _date_range(year)
+        )
+
+    # ---------- 收入 ----------
+    def revenue_by_month(self, year):
+        """各月收入总额"""
+        return self._monthly_totals(
+            """SELECT substr(date, 1, 7) AS m, SUM(amount) FROM revenue
+               WHERE date >= ? AND date < ?
+               GROUP BY m""",
+            _date_range(year)
+        )
+
+    def revenue_by_month_department(self, year):
+        """各月收入按部门汇总"""
+        return self._monthly_groups(
+            """SELECT substr(r.date, 1, 7) AS m, e.department, SUM(r.amount)
+               FROM revenue r
+               JOIN employees e ON r.emp_id = e.emp_id
+               WHERE r.date >= ? AND r.date < ?
+               GROUP BY m, e.department
+               ORDER BY m, e.department""",
+            _date_range(year)
+        )
+
+    def revenue_by_source(self, year):
+        """全年收入按描述汇总 [(描述, 金额), ...]"""
+        return self._query(
+            """SELECT description, SUM(amount) FROM revenue
+               WHERE date >= ? AND date < ?
+               GROUP BY description""",
+            _date_range(year)
+        )
+
+    # ---------- 考勤 ----------
+    def present_days_by_month(self, year):
+        """各月出勤记录总数"""
+        return self._monthly_totals(
+            """SELECT substr(date, 1, 7) AS m, COUNT(*) FROM attendance
+               WHERE date >= ? AND date < ? AND status='present'
+               GROUP BY m""",
+            _date_range(year)
+        )
+
+    def active_employee_count(self):
+        result = self.db_manager.execute_query(
+            "SELECT COUNT(*) FROM employees WHERE status='active'", fetch_one=True)
+        return result[0] if result and result[0] else 0
+
+    @staticmethod
+    def weekdays_by_month(year):
+        """各月工作日天数（周一到周五）"""
+        weekdays = []
+        for month in range(1, 13):
+            _, days_in_month = calendar.monthrange(year, month)
+            weekdays.append(sum(1 for day in range(1, days_in_month + 1)
+                                if datetime.date(year, month, day).weekday() < 5))
+        return weekdays
+
+    # ---------- 汇总 ----------
+    @staticmethod
+    def _sum_groups(groups, keys=()):
+        """把12个月的分组数据合计为全年 {分组: 金额}，keys中的分组即使没有数据也保留"""
+        totals = {key: 0 for key in keys}
+        for month_groups in groups:
+            for key, value in month_groups.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def yearly_report(self, report_type, year):
+        """按报表类型返回全年数据字典"""
+        if report_type == "salary":
+            by_department = self.salary_by_month_department(year)
+            return {
+                'months': self.salary_by_month(year),
+                'department_by_month': by_department,
+                'departments': self._sum_groups(by_department, self.departments()),
+                'top_employees': self.top_employee_salaries(year),
+            }
+        if report_type == "revenue":
+            by_department = self.revenue_by_month_department(year)
+            return {
+                'months': self.revenue_by_month(year),
+                'department_by_month': by_department,
+                'departments': self._sum_groups(by_department, self.departments()),
+                'sources': self.revenue_by_source(year),
+            }
+        if report_type == "profit":
+            revenue = self.revenue_by_month(year)
+            salary = self.salary_paid_by_month(year)
+            last_revenue = self.revenue_by_month(year - 1)
+            last_salary = self.salary_paid_by_month(year - 1)
+            return {
+                'revenue': revenue,
+                'salary': salary,
+                # 其他支出（按收入的10%估算）
+                'other_expenses': [value * 0.1 for value in revenue],
+                'profit': [r - s for r, s in zip(revenue, salary)],
+                'revenue_total': sum(revenue),
+                'salary_total': sum(salary),
+                'last_revenue_total': sum(last_revenue),
+                'last_salary_total': sum(last_salary),
+            }
+        if report_type == "attendance":
+            return {
+                'weekdays': self.weekdays_by_month(year),
+                'active_employees': self.active_employee_count(),
+                'present_days': self.present_days_by_month(year),
+            }
+        raise ValueError(f"未知的报表类型: {report_type}")
+
+
+__all__ = ['ReportEngine']
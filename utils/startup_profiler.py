@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 启动耗时分析
+# 用法: python -m utils.startup_profiler [--top 20] [--budget 3.0]
+# 1. 在子进程中用 python -X importtime 导入 src.salary_calculator，列出导入最慢的模块；
+# 2. 在当前进程中导入并创建登录窗口，统计到登录窗口完成首次绘制的时间，
+#    同时检查较重的库（matplotlib、pandas等）是否在登录前就被导入。
+# 指定 --budget 时，超出时间预算或提前导入了较重的库都会以返回码1退出，便于在构建脚本中检查。
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULE = 'src.salary_calculator'
+
+# 登录前不应导入的库
+HEAVY_MODULES = ['matplotlib', 'pandas', 'numpy', 'openpyxl', 'reportlab', 'requests', 'pypinyin']
+
+
+def import_times(module=APP_MODULE):
+    """在子进程中导入模块，返回 [(模块名, 自身耗时秒, 累计耗时秒, 嵌套层级)]"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR, capture_output=True, text=True, encoding='utf-8', errors='replace'
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "导入失败")
+
+    times = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, level))
+    return times
+
+
+def time_to_login_window():
+    """导入应用并创建登录窗口，返回各阶段耗时和登录前已导入的较重的库"""
+    sys.path.insert(0, ROOT_DIR)
+    start = time.perf_counter()
+    import importlib
+    app = importlib.import_module(APP_MODULE)
+    imported = time.perf_counter()
+
+    login_root, _ = app.create_login_window()
+    # 处理完待绘制事件，登录窗口此时已显示
+    login_root.update()
+    shown = time.perf_counter()
+
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    login_root.destroy()
+    return {
+        'import': imported - start,
+        'window': shown - imported,
+        'total': shown - start,
+        'heavy_modules': heavy,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分析工资计算系统的启动耗时")
+    parser.add_argument('--top', type=int, default=20, help="列出累计耗时最长的模块数")
+    parser.add_argument('--budget', type=float, default=None, help="到显示登录窗口的时间预算（秒）")
+    args = parser.parse_args(argv)
+
+    print(f"== 导入 {APP_MODULE} 的模块耗时（累计耗时最长的 {args.top} 个顶层模块）==")
+    try:
+        times = import_times()
+    except Exception as e:
+        print(f"统计导入耗时失败: {e}")
+        times = []
+    # 只列出应用直接导入的模块（层级最浅的一层），避免子模块重复计入
+    top_level = sorted((t for t in times if t[3] <= 1), key=lambda t: t[2], reverse=True)
+    for name, self_time, cumulative, level in top_level[:args.top]:
+        print(f"{cumulative * 1000:9.1f} ms  (自身 {self_time * 1000:7.1f} ms)  {name}")
+
+    print("\n== 到显示登录窗口的时间 ==")
+    try:
+        result = time_to_login_window()
+    except Exception as e:
+        # 没有图形界面的环境无法创建窗口
+        print(f"无法创建登录窗口: {e}")
+        return 1 if args.budget is not None else 0
+
+    print(f"导入应用模块: {result['import'] * 1000:.1f} ms")
+    print(f"创建并绘制登录窗口: {result['window'] * 1000:.1f} ms")
+    print(f"合计（不含解释器启动）: {result['total'] * 1000:.1f} ms")
+    if result['heavy_modules']:
+        print(f"登录前已导入的较重的库: {', '.join(result['heavy_modules'])}")
+    else:
+        print("登录前未导入较重的库")
+
+    if args.budget is not None:
+        over_budget = result['total'] > args.budget
+        if over_budget:
+            print(f"超出时间预算 {args.budget:.2f} 秒")
+        if over_budget or result['heavy_modules']:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
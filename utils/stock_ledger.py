@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 库存流水
+# 每次库存变动（进货、销售、调整、删除记录时的冲销）都追加一条流水，流水不能修改或删除。
+# inventory表的数量由stock_movements上的触发器维护（见 db_migrations 进销存 v3），
+# 程序中不再直接更新库存数量，只调用 record_movement 写入流水。
+# 调整记录同时保存当时的产品进价（unit_cost），计算销售成本时作为没有进货记录的库存批次。
+# 校对时按产品汇总一次流水，与库存表比较；重建时把不一致的库存改为流水汇总的结果。
+# 用法: python -m utils.stock_ledger [--db salary_system.db] [--rebuild]
+
+import os
+import sys
+import argparse
+
+from utils.common_utils import logger
+from utils.log_config import setup_logging
+
+PURCHASE = 'purchase'
+SALE = 'sale'
+ADJUSTMENT = 'adjustment'
+REVERSAL = 'reversal'
+MOVEMENT_KINDS = (PURCHASE, SALE, ADJUSTMENT, REVERSAL)
+# 启用库存流水时已有库存记入的调整（见 db_migrations 进销存 v3）
+OPENING_NOTE = '期初库存'
+
+# 库存表与流水汇总不一致的产品：(产品ID, 库存表数量, 流水汇总数量)，库存表中没有记录时数量为None
+_MISMATCH_QUERY = """
+    WITH ledger AS (
+        SELECT product_id, SUM(quantity) AS quantity FROM stock_movements GROUP BY product_id
+    )
+    SELECT i.product_id, i.quantity, IFNULL(l.quantity, 0)
+    FROM inventory i
+    LEFT JOIN ledger l ON l.product_id = i.product_id
+    WHERE i.product_id IS NOT NULL AND IFNULL(i.quantity, 0) != IFNULL(l.quantity, 0)
+    UNION ALL
+    SELECT l.product_id, NULL, l.quantity
+    FROM ledger l
+    WHERE l.quantity != 0 AND NOT EXISTS (SELECT 1 FROM inventory i WHERE i.product_id = l.product_id)
+    ORDER BY 1
+"""
+
+
+def record_movement(conn, product_id, quantity, kind, ref_table=None, ref_id=None, note=None, created_by=None,
+                    unit_cost=None):
+    """在conn的当前事务中记录一笔库存变动，quantity入库为正、出库为负
+
+    调整记录的unit_cost默认取产品当前进价
+    """
+    if kind not in MOVEMENT_KINDS:
+        raise ValueError(f"未知的库存变动类型: {kind}")
+    if not quantity:
+        return
+    if kind == ADJUSTMENT and unit_cost is None:
+        row = conn.execute("SELECT purchase_price FROM products WHERE id = ?", (product_id,)).fetchone()
+        unit_cost = row[0] if row else None
+    conn.execute(
+        """INSERT INTO stock_movements (product_id, quantity, kind, ref_table, ref_id, note, created_by, unit_cost)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (product_id, quantity, kind, ref_table, ref_id, note, created_by, unit_cost)
+    )
+
+
+def check_consistency(db_manager):
+    """返回库存表与流水汇总不一致的产品列表 [(产品ID, 库存表数量, 流水汇总数量)]"""
+    rows = db_manager.execute_query(_MISMATCH_QUERY, fetch_all=True)
+    if rows is None:
+        raise RuntimeError("库存校对查询失败")
+    return rows
+
+
+def rebuild_balances(db_manager):
+    """按流水重新计算库存，返回修正的产品列表（格式同check_consistency）"""
+    with db_manager.transaction() as conn:
+        mismatches = conn.execute(_MISMATCH_QUERY).fetchall()
+        conn.executemany(
+            """INSERT INTO inventory (product_id, quantity, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT(product_id) DO UPDATE SET quantity = excluded.quantity, updated_at = CURRENT_TIMESTAMP""",
+            [(product_id, ledger) for product_id, _, ledger in mismatches]
+        )
+    if mismatches:
+        logger.warning(f"已按库存流水修正 {len(mismatches)} 个产品的库存")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="库存校对：比较库存表与库存流水")
+    parser.add_argument('--db', default='salary_system.db', help="数据库文件")
+    parser.add_argument('--rebuild', action='store_true', help="按流水修正不一致的库存")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if not os.path.exists(args.db):
+        print(f"数据库文件不存在: {args.db}")
+        return 2
+
+    from utils.common_utils import DatabaseManager, time_service
+    from utils.db_migrations import run_migrations, INVENTORY_MIGRATIONS
+    # 修正库存需要写数据库，先同步网络时间
+    if args.rebuild and not time_service.sync():
+        print("无法同步网络时间，不能修正库存")
+        return 1
+    db_manager = DatabaseManager(args.db)
+    success, message = run_migrations(db_manager, 'inventory', INVENTORY_MIGRATIONS)
+    if not success:
+        print(message)
+        return 1
+    try:
+        mismatches = rebuild_balances(db_manager) if args.rebuild else check_consistency(db_manager)
+    except Exception as e:
+        print(f"库存校对失败: {e}")
+        return 1
+
+    for product_id, recorded, ledger in mismatches:
+        recorded = "无记录" if recorded is None else recorded
+        print(f"产品 {product_id}: 库存 {recorded}，流水 {ledger}")
+    if not mismatches:
+        print("库存与流水一致")
+    elif args.rebuild:
+        print(f"已修正 {len(mismatches)} 个产品的库存")
+    else:
+        print(f"{len(mismatches)} 个产品的库存与流水不一致，使用 --rebuild 修正")
+        return 1
+    return 0
+
+
+__all__ = ['PURCHASE', 'SALE', 'ADJUSTMENT', 'REVERSAL', 'OPENING_NOTE', 'record_movement', 'check_consistency',
+           'rebuild_balances']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# Treeview差量刷新
+# 按主键记住上一次显示的行，刷新时只插入新增的行、修改变化的行、删除消失的行，
+# 不再清空后逐行重建，编辑一条记录后刷新列表只会改动这一行，也不会闪烁。
+
+
+class TreeBinder:
+    """按主键把数据行同步到Treeview"""
+    def __init__(self, tree):
+        self.tree = tree
+        self._items = {}   # key -> [item, values, tags]
+        self._order = []   # 当前显示顺序的key
+
+    def clear(self):
+        """清空Treeview和记录的快照"""
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._items = {}
+        self._order = []
+
+    def bind(self, rows):
+        """把Treeview同步为rows
+
+        rows: 按显示顺序排列的 (key, values, tags)。key不是元组时同时作为行的iid，
+        元组形式的key（如合计行）只用于对应，不作为iid；key为None的行按位置对应。
+        返回 (新增行数, 修改行数, 删除行数)
+        """
+        tree = self.tree
+        # Treeview被其他代码改动过时，快照已不可信，重新开始
+        if list(tree.get_children()) != [self._items[key][0] for key in self._order]:
+            self.clear()
+
+        normalized = []
+        seen = set()
+        for index, (key, values, tags) in enumerate(rows):
+            if key is None:
+                key = ("#", index)
+            if key in seen:
+                continue
+            seen.add(key)
+            normalized.append((key, tuple(values), tuple(tags or ())))
+
+        removed = [key for key in self._order if key not in seen]
+        if removed:
+            tree.delete(*[self._items.pop(key)[0] for key in removed])
+
+        # 保留下来的行相对顺序没变时，只需要在对应位置插入新行
+        kept = [key for key in self._order if key in seen]
+        in_order = kept == [key for key, _, _ in normalized if key in self._items]
+
+        inserted = updated = 0
+        order = []
+        for index, (key, values, tags) in enumerate(normalized):
+            entry = self._items.get(key)
+            if entry is None:
+                if isinstance(key, tuple):
+                    item = tree.insert("", index, values=values, tags=tags)
+                else:
+                    item = tree.insert("", index, iid=key, values=values, tags=tags)
+                self._items[key] = [item, values, tags]
+                inserted += 1
+            else:
+                item = entry[0]
+                if entry[1] != values or entry[2] != tags:
+                    tree.item(item, values=values, tags=tags)
+                    entry[1], entry[2] = values, tags
+                    updated += 1
+                if not in_order:
+                    tree.move(item, "", index)
+            order.append(key)
+        self._order = order
+        return inserted, updated, len(removed)
+
+
+__all__ = ['TreeBinder']